@@ -2,4 +2,9 @@
 AI Assistant package for visual/audio detection and OSINT capabilities.
 """
 
+import time
+
 __version__ = "1.0.0"
+
+# Runs before any submodule, so ai_assistant.main can report its full import time
+IMPORT_STARTED = time.perf_counter()
@@ -0,0 +1,353 @@
+"""
+Audio buffering, level metering and sound event detection for the audio
+detection module.
+
+The input callback copies each block into a preallocated ring buffer
+(no allocation, no queue); the UI reads the newest samples once per tick
+and reduces them to RMS, peak and dBFS in a single vectorized pass.
+
+SoundAnalyzer cuts the same samples into overlapping frames and computes
+every feature for a whole block of frames at once: Hann-windowed FFT band
+energies, spectral centroid and flatness, zero-crossing rate and a
+voice-activity decision. Frames are labelled and consecutive labels are
+merged into timestamped events. `python -m ai_assistant.audio benchmark`
+measures how much faster than real time this runs on synthetic signals.
+"""
+import argparse
+import time
+
+from ai_assistant.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+SILENCE_DBFS = -120.0
+
+
+class AudioRingBuffer:
+    """Fixed-size mono float32 ring buffer with a single writer.
+
+    The writer (the audio callback) only copies into the preallocated array
+    and then advances `written`; readers copy out the newest samples.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=np.float32)
+        self.written = 0  # total samples ever written
+
+    def write(self, block):
+        """Append a 1-D block of samples (e.g. indata[:, 0])."""
+        count = len(block)
+        if count >= self.capacity:
+            block = block[count - self.capacity:]
+            start = (self.written + count - self.capacity) % self.capacity
+            first = self.capacity - start
+            self.buffer[start:] = block[:first]
+            self.buffer[:start] = block[first:]
+        else:
+            start = self.written % self.capacity
+            end = start + count
+            if end <= self.capacity:
+                self.buffer[start:end] = block
+            else:
+                first = self.capacity - start
+                self.buffer[start:] = block[:first]
+                self.buffer[:end - self.capacity] = block[first:]
+        self.written += count
+
+    def latest(self, count, out=None):
+        """Copy the newest `count` samples, oldest first, into out (allocated if None)."""
+        count = min(count, self.capacity, self.written)
+        if out is None:
+            out = np.empty(count, dtype=np.float32)
+        else:
+            out = out[:count]
+        end = self.written % self.capacity
+        start = end - count
+        if start >= 0:
+            out[:] = self.buffer[start:end]
+        else:
+            out[:-start] = self.buffer[start:]
+            out[-start:] = self.buffer[:end]
+        return out
+
+
+def levels(samples):
+    """RMS, peak and dBFS (of the RMS) of a block of float samples in [-1, 1]."""
+    if not len(samples):
+        return 0.0, 0.0, SILENCE_DBFS
+    rms = float(np.sqrt(np.dot(samples, samples) / len(samples)))
+    peak = float(max(samples.max(), -samples.min()))
+    dbfs = 20 * np.log10(rms) if rms > 0 else SILENCE_DBFS
+    return rms, peak, max(float(dbfs), SILENCE_DBFS)
+
+
+FRAME_SIZE = 1024
+HOP_SIZE = 512
+
+# Upper edges of the band energies in Hz; the last band runs to Nyquist
+BAND_EDGES_HZ = (150, 300, 600, 1200, 2400, 3400, 6000)
+SPEECH_BAND_HZ = (300, 3400)
+
+SILENCE_THRESHOLD_DBFS = -55.0
+NOISE_FLOOR_MARGIN_DB = 6.0
+NOISE_FLOOR_RISE_DB_PER_SECOND = 2.0
+SPEECH_MIN_BAND_RATIO = 0.6
+SPEECH_MAX_FLATNESS = 0.3
+SPEECH_MAX_ZCR = 0.35
+TONE_MIN_PEAK_RATIO = 0.6
+MIN_EVENT_SECONDS = 0.1
+
+SOUND_CLASSES = ('silence', 'speech', 'tone', 'noise')
+SILENCE, SPEECH, TONE, NOISE = range(len(SOUND_CLASSES))
+
+
+def frame_signal(samples, frame_size=FRAME_SIZE, hop=HOP_SIZE):
+    """Overlapping frames of samples as a (frames, frame_size) view; no copy."""
+    if len(samples) < frame_size:
+        return samples[:0].reshape(0, frame_size)
+    count = 1 + (len(samples) - frame_size) // hop
+    return np.lib.stride_tricks.sliding_window_view(samples, frame_size)[::hop][:count]
+
+
+class FeatureExtractor:
+    """Per-frame spectral features for a 2-D block of frames.
+
+    The window, bin frequencies and band boundaries are computed once;
+    features() then runs one batched rfft and a handful of array reductions
+    however many frames it is given.
+    """
+
+    def __init__(self, sample_rate, frame_size=FRAME_SIZE, band_edges=BAND_EDGES_HZ):
+        self.sample_rate = sample_rate
+        self.frame_size = frame_size
+        self.window = np.hanning(frame_size).astype(np.float32)
+        self.freqs = np.fft.rfftfreq(frame_size, 1.0 / sample_rate).astype(np.float32)
+        # np.add.reduceat sums bins from each start to the next
+        edges = [edge for edge in band_edges if edge < sample_rate / 2]
+        self.band_starts = np.searchsorted(self.freqs, [0] + edges)
+        self.band_names = [f"{low}-{high}" for low, high in zip([0] + edges, edges)] + [f"{edges[-1]}+"]
+        low, high = np.searchsorted(self.freqs, SPEECH_BAND_HZ)
+        self.speech_bins = slice(low, high)
+
+    def features(self, frames):
+        """Dict of per-frame arrays for frames of shape (n, frame_size)."""
+        frames = np.asarray(frames, dtype=np.float32)
+        power = np.abs(np.fft.rfft(frames * self.window, axis=1)) ** 2
+        power += 1e-12
+        total = power.sum(axis=1)
+
+        rms = np.sqrt(np.einsum('ij,ij->i', frames, frames) / self.frame_size)
+        dbfs = np.maximum(20 * np.log10(np.maximum(rms, 1e-6)), SILENCE_DBFS)
+        # A windowed sinusoid spreads over three bins
+        peak = power[:, :-2] + power[:, 1:-1] + power[:, 2:]
+        signs = np.signbit(frames)
+        return {
+            "rms": rms,
+            "dbfs": dbfs,
+            "bands": np.add.reduceat(power, self.band_starts, axis=1) / total[:, None],
+            "centroid": power @ self.freqs / total,
+            "flatness": np.exp(np.log(power).mean(axis=1)) / power.mean(axis=1),
+            "zcr": np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (self.frame_size - 1),
+            "speech_ratio": power[:, self.speech_bins].sum(axis=1) / total,
+            "peak_ratio": peak.max(axis=1) / total
+        }
+
+
+def voice_activity(features, silence_dbfs=SILENCE_THRESHOLD_DBFS):
+    """Boolean per frame: loud enough, speech-band dominated, harmonic but not a pure tone."""
+    return ((features["dbfs"] > silence_dbfs)
+            & (features["speech_ratio"] > SPEECH_MIN_BAND_RATIO)
+            & (features["flatness"] < SPEECH_MAX_FLATNESS)
+            & (features["zcr"] < SPEECH_MAX_ZCR)
+            & (features["peak_ratio"] < TONE_MIN_PEAK_RATIO))
+
+
+def classify(features, silence_dbfs=SILENCE_THRESHOLD_DBFS):
+    """Index into SOUND_CLASSES for every frame."""
+    silent = features["dbfs"] <= silence_dbfs
+    return np.select(
+        [silent, voice_activity(features, silence_dbfs), features["peak_ratio"] >= TONE_MIN_PEAK_RATIO],
+        [SILENCE, SPEECH, TONE],
+        NOISE
+    )
+
+
+class SoundAnalyzer:
+    """Streaming feature extraction and sound event detection.
+
+    process() takes any number of new samples, carries the partial frame
+    over to the next call and returns the events that finished. Labels
+    shorter than MIN_EVENT_SECONDS are treated as part of the surrounding
+    sound; silence ends an event but is not reported as one.
+    """
+
+    def __init__(self, sample_rate, frame_size=FRAME_SIZE, hop=HOP_SIZE,
+                 min_event_seconds=MIN_EVENT_SECONDS):
+        self.sample_rate = sample_rate
+        self.frame_size = frame_size
+        self.hop = hop
+        self.extractor = FeatureExtractor(sample_rate, frame_size)
+        self.min_frames = max(1, int(round(min_event_seconds * sample_rate / hop)))
+        self.reset()
+
+    def reset(self, start_time=None):
+        self.start_time = time.time() if start_time is None else start_time
+        self.pending = np.zeros(0, dtype=np.float32)
+        self.frames_seen = 0
+        self.noise_floor = SILENCE_THRESHOLD_DBFS - NOISE_FLOOR_MARGIN_DB
+        self.label = SILENCE
+        self.event_start = 0
+        self.event_peak = SILENCE_DBFS
+        self.candidate = None  # [label, first frame, frame count, peak dBFS]
+        self.latest = None
+
+    @property
+    def current(self):
+        return SOUND_CLASSES[self.label]
+
+    def process(self, samples):
+        """Analyze new samples; returns the list of events that ended."""
+        buffer = np.concatenate((self.pending, samples)) if len(self.pending) else np.asarray(samples, np.float32)
+        frames = frame_signal(buffer, self.frame_size, self.hop)
+        if not len(frames):
+            # buffer may be the caller's array, which it is free to reuse
+            self.pending = buffer.copy()
+            return []
+        features = self.extractor.features(frames)
+        self.pending = buffer[len(frames) * self.hop:].copy()
+
+        # The floor falls immediately and rises a few dB per second, so steady
+        # background noise stops counting as sound but a long tone does not
+        quietest = float(np.percentile(features["dbfs"], 10))
+        rise = NOISE_FLOOR_RISE_DB_PER_SECOND * len(frames) * self.hop / self.sample_rate
+        self.noise_floor = min(quietest, self.noise_floor + rise)
+        silence_dbfs = max(SILENCE_THRESHOLD_DBFS, self.noise_floor + NOISE_FLOOR_MARGIN_DB)
+        labels = classify(features, silence_dbfs)
+
+        self.latest = {
+            "label": SOUND_CLASSES[int(labels[-1])],
+            "voice": bool(labels[-1] == SPEECH),
+            "dbfs": float(features["dbfs"][-1]),
+            "centroid_hz": float(features["centroid"][-1]),
+            "flatness": float(features["flatness"][-1]),
+            "zcr": float(features["zcr"][-1]),
+            "bands": dict(zip(self.extractor.band_names, np.round(features["bands"][-1].astype(float), 4).tolist())),
+            "noise_floor_dbfs": round(self.noise_floor, 1)
+        }
+
+        # Walk runs of equal labels, not frames
+        first = self.frames_seen
+        self.frames_seen += len(labels)
+        bounds = np.flatnonzero(np.diff(labels)) + 1
+        starts = np.concatenate(([0], bounds))
+        ends = np.concatenate((bounds, [len(labels)]))
+        peaks = np.maximum.reduceat(features["dbfs"], starts)
+        events = []
+        for start, end, peak in zip(starts.tolist(), ends.tolist(), peaks.tolist()):
+            self._run(int(labels[start]), first + start, end - start, peak, events)
+        return events
+
+    def _run(self, label, start, length, peak, events):
+        if label == self.label:
+            self.event_peak = max(self.event_peak, peak)
+            self.candidate = None
+            return
+        if self.candidate is not None and self.candidate[0] == label:
+            self.candidate[2] += length
+            self.candidate[3] = max(self.candidate[3], peak)
+        else:
+            self.candidate = [label, start, length, peak]
+        if self.candidate[2] >= self.min_frames:
+            label, start, _, peak = self.candidate
+            self._finish(start, events)
+            self.label, self.event_start, self.event_peak = label, start, peak
+            self.candidate = None
+
+    def _finish(self, end, events):
+        if self.label == SILENCE:
+            return
+        offset = self.event_start * self.hop / self.sample_rate
+        duration = (end - self.event_start) * self.hop / self.sample_rate
+        events.append({
+            "label": SOUND_CLASSES[self.label],
+            "timestamp": self.start_time + offset,
+            "offset": round(offset, 3),
+            "duration": round(duration, 3),
+            "peak_dbfs": round(self.event_peak, 1)
+        })
+
+    def flush(self):
+        """End the current event, e.g. when recording stops."""
+        events = []
+        self._finish(self.frames_seen, events)
+        self.label = SILENCE
+        self.candidate = None
+        return events
+
+
+def synthetic_signals(sample_rate, seconds, seed=0):
+    """Test signals for the benchmark: silence, tone, noise and a speech-like buzz."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    # Glottal-like harmonics on a gliding pitch, shaped by two formants, in 4 Hz syllables
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voice = np.zeros_like(t)
+    for harmonic in range(1, 25):
+        freq = harmonic * 140
+        gain = np.exp(-((freq - 700) / 300) ** 2) + 0.6 * np.exp(-((freq - 1800) / 400) ** 2) + 0.05 / harmonic
+        voice += gain * np.sin(harmonic * phase)
+    voice *= np.clip(np.sin(2 * np.pi * 2 * t), 0.1, None) / np.abs(voice).max()
+    return {
+        "silence": np.zeros_like(t),
+        "tone": 0.5 * np.sin(2 * np.pi * 1000 * t),
+        "noise": 0.3 * rng.standard_normal(len(t)),
+        "speech": 0.5 * voice + 0.001 * rng.standard_normal(len(t))
+    }
+
+
+def benchmark(sample_rate=44100, seconds=30, chunk=2205):
+    """Run SoundAnalyzer over synthetic signals in UI-tick sized chunks.
+
+    Returns per signal the real-time factor (seconds of audio per second
+    of processing on this one thread) and the share of frames per label.
+    """
+    results = {}
+    for name, signal in synthetic_signals(sample_rate, seconds).items():
+        signal = signal.astype(np.float32)
+        analyzer = SoundAnalyzer(sample_rate)
+        started = time.perf_counter()
+        for offset in range(0, len(signal), chunk):
+            analyzer.process(signal[offset:offset + chunk])
+        elapsed = time.perf_counter() - started
+
+        # Label shares are measured separately so they do not count towards the timing
+        labels = classify(analyzer.extractor.features(frame_signal(signal)))
+        counts = np.bincount(labels, minlength=len(SOUND_CLASSES))
+        results[name] = {
+            "audio_seconds": seconds,
+            "elapsed_seconds": round(elapsed, 4),
+            "realtime_factor": round(seconds / elapsed, 1),
+            "labels": {label: round(count / counts.sum(), 3) for label, count in zip(SOUND_CLASSES, counts)}
+        }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ai_assistant.audio',
+                                     description='Audio analysis tools')
+    commands = parser.add_subparsers(dest='command', required=True)
+    bench_parser = commands.add_parser('benchmark', help='time the sound analyzer on synthetic signals')
+    bench_parser.add_argument('--seconds', type=float, default=30, help='audio per signal (default: 30)')
+    bench_parser.add_argument('--rate', type=int, default=44100, help='sample rate (default: 44100)')
+    args = parser.parse_args(argv)
+
+    results = benchmark(args.rate, args.seconds)
+    for name, result in results.items():
+        labels = ', '.join(f"{label} {share:.0%}" for label, share in result["labels"].items() if share)
+        print(f"{name:8} {result['elapsed_seconds']:8.3f}s  {result['realtime_factor']:8.1f}x real time  ({labels})")
+
+
+if __name__ == '__main__':
+    main()
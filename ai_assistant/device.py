@@ -0,0 +1,244 @@
+"""
+Background sampling of host metrics for /device_status.
+
+A daemon thread collects CPU, memory, disk, network and battery figures
+every DEVICE_SAMPLE_INTERVAL seconds. Static system details (platform, core
+counts, frequency range) are read once. Readers get the latest snapshot
+without touching psutil, so a status request never waits for a sample.
+Each sample is also recorded in a fixed-size TimeSeriesStore for history
+queries, and once /metrics has been scraped the detailed OpenMetrics text is
+rendered alongside it.
+"""
+import json
+import os
+import platform
+import threading
+import time
+from datetime import datetime
+
+from ai_assistant import metrics
+from ai_assistant.lazy import lazy_import
+from ai_assistant.timeseries import TimeSeriesStore
+
+psutil = lazy_import('psutil')
+
+SAMPLE_INTERVAL = float(os.environ.get('DEVICE_SAMPLE_INTERVAL', 1))
+# Shortest span cpu_percent is measured over; a sample taken sooner waits for it
+MIN_CPU_WINDOW = 0.1
+
+# Metrics kept in the history store, and where they come from in a snapshot
+HISTORY_METRICS = {
+    'cpu_percent': ('cpu', 'cpu_percent'),
+    'cpu_frequency': ('cpu', 'frequency', 'current'),
+    'memory_percent': ('memory', 'percent'),
+    'memory_used': ('memory', 'used'),
+    'disk_percent': ('disk', 'percent'),
+    'disk_used': ('disk', 'used'),
+    'battery_percent': ('battery', 'percent')
+}
+# name, bucket seconds (0 = raw samples), buckets kept
+HISTORY_TIERS = [
+    ('raw', 0, int(os.environ.get('DEVICE_HISTORY_RAW', 3600))),
+    ('1m', 60, int(os.environ.get('DEVICE_HISTORY_MINUTES', 24 * 60))),
+    ('1h', 3600, int(os.environ.get('DEVICE_HISTORY_HOURS', 30 * 24)))
+]
+
+
+def static_info():
+    """System details that do not change while the process runs."""
+    freq = psutil.cpu_freq()
+    return {
+        "system": {
+            "system": platform.system(),
+            "version": platform.version(),
+            "machine": platform.machine(),
+            "processor": platform.processor()
+        },
+        "cpu": {
+            "physical_cores": psutil.cpu_count(logical=False),
+            "total_cores": psutil.cpu_count(logical=True),
+            "frequency": {
+                "min": freq.min if freq else None,
+                "max": freq.max if freq else None
+            }
+        }
+    }
+
+
+def history_values(snapshot):
+    """Flatten a snapshot into the numbers recorded in the history store."""
+    values = {}
+    for name, path in HISTORY_METRICS.items():
+        value = snapshot
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        values[name] = value if isinstance(value, (int, float)) else None
+    return values
+
+
+def dynamic_fields(snapshot):
+    """A snapshot without the static fields (sent once per stream)."""
+    dynamic = {key: value for key, value in snapshot.items() if key not in ("success", "system")}
+    dynamic["cpu"] = {
+        "cpu_percent": snapshot["cpu"]["cpu_percent"],
+        "frequency": {"current": snapshot["cpu"]["frequency"]["current"]}
+    }
+    return dynamic
+
+
+def diff(old, new):
+    """Fields of new that differ from old; nested dicts are diffed, removed keys become None."""
+    changes = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested = diff(previous, value)
+            if nested:
+                changes[key] = nested
+        elif key not in old or previous != value:
+            changes[key] = value
+    for key in old.keys() - new.keys():
+        changes[key] = None
+    return changes
+
+
+def battery_info():
+    battery = psutil.sensors_battery()
+    if not battery:
+        return None
+    return {
+        "percent": battery.percent,
+        "power_plugged": battery.power_plugged,
+        "time_left": battery.secsleft if battery.secsleft != -2 else "Calculating..."
+    }
+
+
+class DeviceSampler:
+    """Keeps the latest metrics snapshot fresh from a background thread."""
+
+    def __init__(self, interval=None):
+        self.interval = interval or SAMPLE_INTERVAL
+        self.static = static_info()
+        self.history = TimeSeriesStore(HISTORY_METRICS, HISTORY_TIERS)
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._json = None
+        self._metrics_text = None
+        self._stop = threading.Event()
+        self._thread = None
+        # cpu_percent(interval=None) measures since the previous call; prime it
+        psutil.cpu_percent(interval=None)
+        psutil.cpu_percent(interval=None, percpu=True)
+        self._cpu_since = time.monotonic()
+
+    def sample(self):
+        """Collect one snapshot in the /device_status layout."""
+        freq = psutil.cpu_freq()
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage('/')
+
+        cpu_info = dict(self.static["cpu"])
+        # A first request can arrive right after the constructor primed the counter
+        wait = self._cpu_since + MIN_CPU_WINDOW - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        cpu_info["cpu_percent"] = psutil.cpu_percent(interval=None)
+        self._cpu_since = time.monotonic()
+        cpu_info["frequency"] = dict(cpu_info["frequency"], current=freq.current if freq else None)
+
+        return {
+            "success": True,
+            "timestamp": datetime.now().isoformat(),
+            "system": self.static["system"],
+            "cpu": cpu_info,
+            "memory": {
+                "total": memory.total,
+                "available": memory.available,
+                "used": memory.used,
+                "percent": memory.percent
+            },
+            "disk": {
+                "total": disk.total,
+                "used": disk.used,
+                "free": disk.free,
+                "percent": disk.percent
+            },
+            "network": {
+                interface: {"isup": stats.isup, "speed": stats.speed}
+                for interface, stats in psutil.net_if_stats().items()
+            },
+            "battery": battery_info()
+        }
+
+    def refresh(self):
+        snapshot = self.sample()
+        self.history.record(time.time(), history_values(snapshot))
+        # Only hosts that are scraped pay for the per-disk/per-interface detail
+        metrics_text = self.render_metrics() if self._metrics_text is not None else None
+        with self._lock:
+            self._snapshot = snapshot
+            self._json = None
+            if metrics_text is not None:
+                self._metrics_text = metrics_text
+        return snapshot
+
+    def render_metrics(self):
+        return metrics.render(metrics.collect(psutil.cpu_percent(interval=None, percpu=True)))
+
+    def metrics_text(self):
+        """Latest OpenMetrics text; the first call turns on collection in the background."""
+        with self._lock:
+            text = self._metrics_text
+        if text is None:
+            text = self.render_metrics()
+            with self._lock:
+                self._metrics_text = text
+        return text
+
+    def snapshot(self):
+        """Latest snapshot, sampling synchronously only if none exists yet."""
+        with self._lock:
+            snapshot = self._snapshot
+        return snapshot if snapshot is not None else self.refresh()
+
+    def snapshot_json(self):
+        """Latest snapshot serialized once and shared by every reader."""
+        self.snapshot()  # samples synchronously if nothing has been sampled yet
+        # Serialize whatever is current under the lock, so the cached text always matches _snapshot
+        with self._lock:
+            if self._json is None:
+                self._json = json.dumps(self._snapshot)
+            return self._json
+
+    def _loop(self):
+        # Sleep first: the constructor primed cpu_percent, so the first sample spans one interval
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error sampling device status: {str(e)}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='device-sampler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler():
+    """Process-wide sampler, started on first use."""
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = DeviceSampler().start()
+        return _sampler
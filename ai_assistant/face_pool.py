@@ -0,0 +1,211 @@
+"""
+Process pool for MediaPipe face detection.
+
+Each worker process owns its own FaceDetection graph. Frames are converted
+to RGB straight into a shared memory block, so only the block name and the
+frame shape cross the process boundary.
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from multiprocessing import shared_memory
+
+from ai_assistant import instrumentation
+from ai_assistant.lazy import lazy_import
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+# Per-process detector, created by _init_worker (or lazily for the in-process path)
+_detector = None
+
+
+class PoolBusy(Exception):
+    """Raised when the pool already holds its maximum number of queued frames."""
+
+
+def _create_detector(min_detection_confidence):
+    import mediapipe as mp
+    return mp.solutions.face_detection.FaceDetection(
+        min_detection_confidence=min_detection_confidence)
+
+
+def _init_worker(min_detection_confidence):
+    global _detector
+    _detector = _create_detector(min_detection_confidence)
+
+
+def _to_detections(results):
+    detections = []
+    if results.detections:
+        for detection in results.detections:
+            bbox = detection.location_data.relative_bounding_box
+            detections.append({
+                "confidence": float(detection.score[0]),
+                "bbox": {
+                    "xmin": float(bbox.xmin),
+                    "ymin": float(bbox.ymin),
+                    "width": float(bbox.width),
+                    "height": float(bbox.height)
+                }
+            })
+    return detections
+
+
+def _detect_shared(name, shape):
+    """Detections for the frame in shared memory, plus the seconds spent in MediaPipe."""
+    # Workers share the parent's resource tracker; the parent unlinks the block
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        image_rgb = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        start = time.perf_counter()
+        results = _detector.process(image_rgb)
+        elapsed = time.perf_counter() - start
+        detections = _to_detections(results)
+        del image_rgb
+    finally:
+        shm.close()
+    return detections, elapsed
+
+
+def _worker_pid(delay):
+    # Sleeping spreads warm-up tasks so every worker has to pick one up
+    time.sleep(delay)
+    return os.getpid()
+
+
+class FaceDetectionPool:
+    def __init__(self, processes=None, queue_depth=None, min_detection_confidence=0.5):
+        if processes is None:
+            processes = int(os.environ.get('FACE_POOL_PROCESSES', os.cpu_count() or 1))
+        if queue_depth is None:
+            queue_depth = int(os.environ.get('FACE_POOL_QUEUE_DEPTH', 32))
+
+        self.processes = processes
+        self.queue_depth = queue_depth
+        self.min_detection_confidence = min_detection_confidence
+        self._slots = threading.BoundedSemaphore(max(processes, 1) + queue_depth)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: never fork a parent that may already run MediaPipe threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self.min_detection_confidence,))
+            return self._executor
+
+    def _reset_executor(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def submit(self, image):
+        """Queue face detection for a BGR image and return a Future of the detections list."""
+        if not self._slots.acquire(blocking=False):
+            raise PoolBusy("Face detection queue is full")
+
+        try:
+            if self.processes <= 0:
+                return self._run_inline(image)
+            return self._submit_shared(image)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def detect(self, image, timeout=None):
+        return self.submit(image).result(timeout=timeout)
+
+    def _run_inline(self, image):
+        global _detector
+        future = Future()
+        try:
+            with instrumentation.stage('vision.cvtColor'):
+                image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            # A single graph is not safe for concurrent use
+            with self._lock:
+                if _detector is None:
+                    _detector = _create_detector(self.min_detection_confidence)
+                with instrumentation.stage('vision.mediapipe_process'):
+                    results = _detector.process(image_rgb)
+            future.set_result(_to_detections(results))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            self._slots.release()
+        return future
+
+    def _submit_worker(self, name, shape):
+        executor = self._get_executor()
+        try:
+            return executor, executor.submit(_detect_shared, name, shape)
+        except BrokenProcessPool:
+            # A worker died while the pool was idle, so no future was there to reset it
+            self._reset_executor(executor)
+            executor = self._get_executor()
+            return executor, executor.submit(_detect_shared, name, shape)
+
+    def _submit_shared(self, image):
+        shm = shared_memory.SharedMemory(create=True, size=image.nbytes)
+        try:
+            # Convert BGR to RGB directly into the shared block
+            frame = np.ndarray(image.shape, dtype=np.uint8, buffer=shm.buf)
+            with instrumentation.stage('vision.cvtColor'):
+                cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=frame)
+            del frame
+            executor, worker_future = self._submit_worker(shm.name, image.shape)
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+
+        # Callers get the detections alone; the worker's MediaPipe time goes to the stage stats
+        future = Future()
+
+        def release(done):
+            shm.close()
+            shm.unlink()
+            self._slots.release()
+            if done.cancelled():
+                future.cancel()
+                return
+            error = done.exception()
+            if error is not None:
+                if isinstance(error, BrokenProcessPool):
+                    self._reset_executor(executor)
+                future.set_exception(error)
+                return
+            detections, elapsed = done.result()
+            instrumentation.record_stage('vision.mediapipe_process', elapsed)
+            future.set_result(detections)
+
+        worker_future.add_done_callback(release)
+        return future
+
+    def warm_up(self):
+        """Start every worker so the first requests don't pay for the MediaPipe graph."""
+        if self.processes <= 0:
+            self.detect(np.zeros((64, 64, 3), dtype=np.uint8))
+            return
+        executor = self._get_executor()
+        # A worker only takes tasks once its initializer has built the graph
+        pids = set()
+        for _ in range(10):
+            futures = [executor.submit(_worker_pid, 0.05) for _ in range(self.processes)]
+            pids.update(future.result() for future in futures)
+            if len(pids) >= self.processes:
+                break
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -0,0 +1,300 @@
+"""
+Offline IP geolocation from a local IP-range database.
+
+A CSV of address ranges is compiled once into a compact binary index: sorted
+range starts/ends for IPv4 (uint32) and IPv6 (two uint64 halves) plus a
+deduplicated record table. The index is memory-mapped and searched with a
+binary search, so a lookup touches a handful of pages and no network.
+
+CSV rows are either `start_ip,end_ip,country,region,city,org` or
+`network/prefix,country,region,city,org`; addresses may also be given as
+integers, and a header row is skipped. Other rows that cannot be parsed are
+left out and reported by build(). Overlapping ranges are flattened at build
+time so every address has exactly one range: where ranges nest, the more
+specific one wins.
+
+Rebuild the index with:
+
+    python -m ai_assistant.geoip build ranges.csv [-o ~/ai_assistant_geoip.bin]
+
+A running server picks up the rebuilt file, except on Windows: a file that is
+memory-mapped cannot be replaced there, so stop the server before rebuilding.
+"""
+import argparse
+import csv
+import ipaddress
+import json
+import os
+import struct
+import sys
+import threading
+import time
+
+from ai_assistant.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+DEFAULT_PATH = os.environ.get(
+    'GEOIP_DB',
+    os.path.join(os.path.expanduser("~"), "ai_assistant_geoip.bin"))
+MAGIC = b'AIGEOIP1'
+# magic, IPv4 ranges, IPv6 ranges, record table bytes
+HEADER = struct.Struct('<8sQQQ')
+FIELDS = ('country_name', 'region', 'city', 'org')
+MASK64 = (1 << 64) - 1
+# Seconds between checks for a rebuilt index file
+CHECK_INTERVAL = float(os.environ.get('GEOIP_CHECK_INTERVAL', 5))
+
+
+def _parse_address(value):
+    value = value.strip()
+    if value.isdigit():
+        number = int(value)
+        return ipaddress.IPv4Address(number) if number <= 0xFFFFFFFF else ipaddress.IPv6Address(number)
+    return ipaddress.ip_address(value)
+
+
+def _parse_row(row):
+    """Return (first, last, fields) for a CSV row, or None for a blank row; raises ValueError if malformed."""
+    if not row or not row[0].strip():
+        return None
+    if '/' in row[0]:
+        network = ipaddress.ip_network(row[0].strip(), strict=False)
+        first, last, fields = network[0], network[-1], row[1:]
+    elif len(row) < 2:
+        raise ValueError(f"Expected a network or a start and end address: {row[0]}")
+    else:
+        first, last, fields = _parse_address(row[0]), _parse_address(row[1]), row[2:]
+    if first.version != last.version or int(first) > int(last):
+        raise ValueError(f"Invalid range: {row[0]} - {row[1]}")
+    fields = tuple(field.strip() for field in fields[:len(FIELDS)])
+    return first, last, fields + ('',) * (len(FIELDS) - len(fields))
+
+
+def _flatten(ranges):
+    """Sorted, non-overlapping (first, last, record) ranges.
+
+    Where ranges overlap, the one starting later wins, so a range nested in
+    another punches a hole in it; adjacent pieces of one record are merged.
+    """
+    flat = []
+
+    def emit(first, last, record):
+        if first > last:
+            return
+        if flat and flat[-1][1] + 1 == first and flat[-1][2] == record:
+            flat[-1] = (flat[-1][0], last, record)
+        else:
+            flat.append((first, last, record))
+
+    # Outer ranges before the ranges nested in them
+    open_ranges = []
+    position = 0  # first address not emitted yet
+    for first, last, record in sorted(ranges, key=lambda r: (r[0], -r[1])):
+        while open_ranges and open_ranges[-1][1] < first:
+            _, end, covering = open_ranges.pop()
+            emit(position, end, covering)
+            position = max(position, end + 1)
+        if open_ranges:
+            emit(position, first - 1, open_ranges[-1][2])
+        position = first
+        open_ranges.append((first, last, record))
+    while open_ranges:
+        _, end, covering = open_ranges.pop()
+        emit(position, end, covering)
+        position = max(position, end + 1)
+    return flat
+
+
+def build(csv_path, output_path=None):
+    """Compile csv_path into the binary index.
+
+    Returns (IPv4 ranges, IPv6 ranges, bad rows) where bad rows lists the
+    (line number, error) of every data row that was left out.
+    """
+    output_path = output_path or DEFAULT_PATH
+    records = {}
+    ranges = {4: [], 6: []}
+    bad_rows = []
+    with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        for row in reader:
+            try:
+                parsed = _parse_row(row)
+            except ValueError as e:
+                # Only the first row may be a header
+                if reader.line_num > 1 or ranges[4] or ranges[6]:
+                    bad_rows.append((reader.line_num, str(e)))
+                continue
+            if parsed is None:
+                continue
+            first, last, fields = parsed
+            index = records.setdefault(fields, len(records))
+            ranges[first.version].append((int(first), int(last), index))
+
+    v4 = _flatten(ranges[4])
+    v6 = _flatten(ranges[6])
+    record_table = json.dumps(list(records)).encode('utf-8')
+
+    # Write next to the target and swap in, so running lookups never see a partial file
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(v4), len(v6), len(record_table)))
+        f.write(np.array([r[0] for r in v4], dtype='<u4').tobytes())
+        f.write(np.array([r[1] for r in v4], dtype='<u4').tobytes())
+        f.write(np.array([r[2] for r in v4], dtype='<u4').tobytes())
+        f.write(b'\0' * (-f.tell() % 8))
+        f.write(np.array([r[0] >> 64 for r in v6], dtype='<u8').tobytes())
+        f.write(np.array([r[0] & MASK64 for r in v6], dtype='<u8').tobytes())
+        f.write(np.array([r[1] >> 64 for r in v6], dtype='<u8').tobytes())
+        f.write(np.array([r[1] & MASK64 for r in v6], dtype='<u8').tobytes())
+        f.write(np.array([r[2] for r in v6], dtype='<u4').tobytes())
+        f.write(record_table)
+    try:
+        os.replace(tmp_path, output_path)
+    except PermissionError as e:
+        os.remove(tmp_path)
+        raise PermissionError(
+            f"Cannot replace {output_path}, it is in use; on Windows, stop the server "
+            "that has it open and build again") from e
+    return len(v4), len(v6), bad_rows
+
+
+class GeoIPDatabase:
+    """Memory-mapped range index written by build()."""
+
+    def __init__(self, path):
+        self.path = path
+        self._map = np.memmap(path, dtype='u1', mode='r')
+        magic, v4_count, v6_count, table_size = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a GeoIP index")
+
+        offset = HEADER.size
+
+        def array(dtype, count):
+            nonlocal offset
+            view = np.frombuffer(self._map, dtype=dtype, count=count, offset=offset)
+            offset += view.nbytes
+            return view
+
+        self.v4_start = array('<u4', v4_count)
+        self.v4_end = array('<u4', v4_count)
+        self.v4_record = array('<u4', v4_count)
+        offset += -offset % 8
+        self.v6_start_hi = array('<u8', v6_count)
+        self.v6_start_lo = array('<u8', v6_count)
+        self.v6_end_hi = array('<u8', v6_count)
+        self.v6_end_lo = array('<u8', v6_count)
+        self.v6_record = array('<u4', v6_count)
+        self.records = [tuple(fields) for fields in json.loads(bytes(self._map[offset:offset + table_size]))]
+
+    def __len__(self):
+        return len(self.v4_start) + len(self.v6_start_hi)
+
+    def _find_v4(self, number):
+        i = int(np.searchsorted(self.v4_start, number, side='right')) - 1
+        if i >= 0 and number <= int(self.v4_end[i]):
+            return int(self.v4_record[i])
+        return None
+
+    def _find_v6(self, number):
+        hi, lo = number >> 64, number & MASK64
+        # Last range whose (hi, lo) start is <= the address
+        left = int(np.searchsorted(self.v6_start_hi, hi, side='left'))
+        right = int(np.searchsorted(self.v6_start_hi, hi, side='right'))
+        i = left + int(np.searchsorted(self.v6_start_lo[left:right], lo, side='right')) - 1
+        if i >= 0 and (hi, lo) <= (int(self.v6_end_hi[i]), int(self.v6_end_lo[i])):
+            return int(self.v6_record[i])
+        return None
+
+    def lookup(self, ip):
+        """Geolocation record for ip in ipapi.co field names, or None if not covered."""
+        address = ipaddress.ip_address(ip)
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if address.version == 4:
+            index = self._find_v4(int(address))
+        else:
+            index = self._find_v6(int(address))
+        if index is None:
+            return None
+        record = {field: value for field, value in zip(FIELDS, self.records[index]) if value}
+        record['ip'] = str(address)
+        return record
+
+
+_database = None
+_database_key = None
+_checked_at = None
+_lock = threading.Lock()
+_path = None
+
+
+def configure(path=None):
+    """Point lookups at a different index file (None for GEOIP_DB)."""
+    global _path, _database, _database_key, _checked_at
+    with _lock:
+        _path = path
+        _database = _database_key = _checked_at = None
+
+
+def get_database():
+    """The shared index, reopened when the file is rebuilt; None if there is none.
+
+    The file is checked for changes at most every CHECK_INTERVAL seconds.
+    """
+    global _database, _database_key, _checked_at
+    with _lock:
+        now = time.monotonic()
+        if _checked_at is not None and now - _checked_at < CHECK_INTERVAL:
+            return _database
+        _checked_at = now
+        path = _path or DEFAULT_PATH
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            _database = _database_key = None
+            return None
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        if _database_key != key:
+            _database = GeoIPDatabase(path)
+            _database_key = key
+        return _database
+
+
+def lookup(ip):
+    """Local geolocation record for ip, or None if there is no index or no match."""
+    database = get_database()
+    return database.lookup(ip) if database is not None else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ai_assistant.geoip',
+                                     description='Offline IP geolocation index')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build_parser = commands.add_parser('build', help='compile a CSV of IP ranges into the index')
+    build_parser.add_argument('csv', help='CSV of IP ranges')
+    build_parser.add_argument('-o', '--output', default=DEFAULT_PATH,
+                              help=f'index file to write (default: {DEFAULT_PATH})')
+    lookup_parser = commands.add_parser('lookup', help='look up addresses in the index')
+    lookup_parser.add_argument('ips', nargs='+')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        try:
+            v4_count, v6_count, bad_rows = build(args.csv, args.output)
+        except OSError as e:
+            sys.exit(f"Could not build {args.output}: {e}")
+        print(f"Wrote {args.output}: {v4_count} IPv4 and {v6_count} IPv6 ranges")
+        if bad_rows:
+            print(f"Skipped {len(bad_rows)} malformed rows:", file=sys.stderr)
+            for line, error in bad_rows[:20]:
+                print(f"  line {line}: {error}", file=sys.stderr)
+    else:
+        for ip in args.ips:
+            print(ip, json.dumps(lookup(ip)))
+
+
+if __name__ == '__main__':
+    main()
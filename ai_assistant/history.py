@@ -0,0 +1,172 @@
+"""
+SQLite store for OSINT scan and internet search history.
+
+One database file holds both histories, indexed by target/query, scan
+type/engine and timestamp. Writes are queued and committed in batches;
+anything still queued is written before a read and on close.
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+DEFAULT_PATH = os.environ.get(
+    'AI_ASSISTANT_HISTORY_DB',
+    os.path.join(os.path.expanduser("~"), "ai_assistant_history.db"))
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    target TEXT NOT NULL,
+    type TEXT NOT NULL,
+    results TEXT
+);
+CREATE INDEX IF NOT EXISTS scans_target ON scans (target, timestamp);
+CREATE INDEX IF NOT EXISTS scans_type ON scans (type, timestamp);
+CREATE INDEX IF NOT EXISTS scans_timestamp ON scans (timestamp);
+
+CREATE TABLE IF NOT EXISTS searches (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    query TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    results TEXT
+);
+CREATE INDEX IF NOT EXISTS searches_query ON searches (query, timestamp);
+CREATE INDEX IF NOT EXISTS searches_engine ON searches (engine, timestamp);
+CREATE INDEX IF NOT EXISTS searches_timestamp ON searches (timestamp);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# table -> (key column, kind column)
+TABLES = {
+    'scans': ('target', 'type'),
+    'searches': ('query', 'engine')
+}
+
+
+class HistoryStore:
+    def __init__(self, path=None, batch_size=20):
+        self.path = path or DEFAULT_PATH
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending = {table: [] for table in TABLES}
+        self._closed = False
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def _add(self, table, key, kind, results, timestamp):
+        timestamp = timestamp or datetime.now().strftime(TIMESTAMP_FORMAT)
+        row = (timestamp, key, kind, json.dumps(results) if results is not None else None)
+        with self._lock:
+            self._pending[table].append(row)
+            if len(self._pending[table]) >= self.batch_size:
+                self._flush_locked()
+        return {'timestamp': timestamp, TABLES[table][0]: key, TABLES[table][1]: kind}
+
+    def add_scan(self, target, scan_type, results=None, timestamp=None):
+        return self._add('scans', target, scan_type, results, timestamp)
+
+    def add_search(self, query, engine, results=None, timestamp=None):
+        return self._add('searches', query, engine, results, timestamp)
+
+    def _flush_locked(self):
+        if self._closed or not any(self._pending.values()):
+            return
+        with self._conn:
+            for table, rows in self._pending.items():
+                if rows:
+                    key_column, kind_column = TABLES[table]
+                    self._conn.executemany(
+                        f"INSERT INTO {table} (timestamp, {key_column}, {kind_column}, results) "
+                        "VALUES (?, ?, ?, ?)", rows)
+                    rows.clear()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _query(self, table, key=None, kind=None, since=None, until=None, limit=100):
+        key_column, kind_column = TABLES[table]
+        clauses, params = [], []
+        for column, op, value in ((key_column, '=', key), (kind_column, '=', kind),
+                                  ('timestamp', '>=', since), ('timestamp', '<=', until)):
+            if value is not None:
+                if isinstance(value, datetime):
+                    value = value.strftime(TIMESTAMP_FORMAT)
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self._lock:
+            self._flush_locked()
+            rows = self._conn.execute(
+                f"SELECT timestamp, {key_column}, {kind_column}, results FROM {table} {where} "
+                "ORDER BY timestamp DESC, id DESC LIMIT ?", params + [limit]).fetchall()
+
+        return [{
+            'timestamp': row['timestamp'],
+            key_column: row[key_column],
+            kind_column: row[kind_column],
+            'results': json.loads(row['results']) if row['results'] is not None else None
+        } for row in rows]
+
+    def scans(self, target=None, scan_type=None, since=None, until=None, limit=100):
+        """Scans, newest first, optionally filtered by target, type and time range."""
+        return self._query('scans', target, scan_type, since, until, limit)
+
+    def searches(self, query=None, engine=None, since=None, until=None, limit=100):
+        """Searches, newest first, optionally filtered by query, engine and time range."""
+        return self._query('searches', query, engine, since, until, limit)
+
+    def import_legacy_json(self):
+        """One-time import of the old ~/osint_history.json and ~/search_history.json files."""
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone():
+                return
+            home = os.path.expanduser("~")
+            for table, filename in (('scans', 'osint_history.json'), ('searches', 'search_history.json')):
+                key_column, kind_column = TABLES[table]
+                try:
+                    with open(os.path.join(home, filename), 'r') as f:
+                        items = json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    continue
+                self._pending[table].extend(
+                    (item['timestamp'], item[key_column], item[kind_column], None)
+                    for item in items if key_column in item and kind_column in item)
+            self._flush_locked()
+            with self._conn:
+                self._conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_imported', '1')")
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._closed = True
+            self._conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide store shared by the OSINT and search widgets."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore()
+            _store.import_legacy_json()
+            atexit.register(_store.flush)
+        return _store
@@ -0,0 +1,68 @@
+"""
+Shared HTTP client for outbound lookups (OSINT, internet search).
+
+Every thread gets its own requests.Session, but all sessions mount the same
+HTTPAdapter, so keep-alive connections are pooled per host across threads.
+Idempotent requests are retried with exponential backoff after read errors
+and 429/5xx answers; connection and DNS failures are not retried by default,
+so a dead host fails fast. Every call gets a timeout unless the caller
+passes one.
+"""
+import os
+import threading
+
+from ai_assistant.lazy import lazy_import
+
+requests = lazy_import('requests')
+
+POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', 16))  # hosts kept in the pool
+POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 32))  # connections per host
+RETRIES = int(os.environ.get('HTTP_RETRIES', 2))
+CONNECT_RETRIES = int(os.environ.get('HTTP_CONNECT_RETRIES', 0))
+BACKOFF = float(os.environ.get('HTTP_BACKOFF', 0.3))
+TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', 10))
+
+_lock = threading.Lock()
+_adapter = None
+_local = threading.local()
+
+
+def _get_adapter():
+    global _adapter
+    with _lock:
+        if _adapter is None:
+            from urllib3.util.retry import Retry
+            retry = Retry(
+                total=RETRIES,
+                connect=CONNECT_RETRIES,
+                backoff_factor=BACKOFF,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']),
+                raise_on_status=False)
+            _adapter = requests.adapters.HTTPAdapter(
+                pool_connections=POOL_CONNECTIONS,
+                pool_maxsize=POOL_MAXSIZE,
+                max_retries=retry)
+        return _adapter
+
+
+def session():
+    """The calling thread's Session, backed by the shared connection pool."""
+    current = getattr(_local, 'session', None)
+    if current is None:
+        current = requests.Session()
+        adapter = _get_adapter()
+        current.mount('http://', adapter)
+        current.mount('https://', adapter)
+        _local.session = current
+    return current
+
+
+def get(url, **kwargs):
+    kwargs.setdefault('timeout', TIMEOUT)
+    return session().get(url, **kwargs)
+
+
+def head(url, **kwargs):
+    kwargs.setdefault('timeout', TIMEOUT)
+    return session().head(url, **kwargs)
@@ -0,0 +1,238 @@
+"""
+Request latency histograms, per-stage timings and a slow-request profiler.
+
+Every request is timed into a histogram per endpoint. Code inside a request
+marks its stages with stage()/record_stage(); stage timings get their own
+histograms and are attached to the request, so a slow request can be broken
+down. The sampling profiler is off by default; when enabled it snapshots
+the stack of each request thread every few milliseconds and writes a
+collapsed-stack (flamegraph) file for requests slower than the threshold.
+"""
+import bisect
+import contextvars
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+# Upper bounds in milliseconds; the last bucket catches everything slower
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
+
+class Histogram:
+    """Fixed-bucket latency histogram."""
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+            self.count += 1
+            self.sum += ms
+            self.max = max(self.max, ms)
+
+    def quantile(self, q, counts=None, count=None, maximum=None):
+        """Estimate a quantile by interpolating inside its bucket, never above the largest sample."""
+        counts = counts or self.counts
+        count = count if count is not None else self.count
+        maximum = maximum if maximum is not None else self.max
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for i, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = min(self.buckets[i], maximum)
+                return round(lower + (upper - lower) * (rank - seen) / bucket_count, 2)
+            seen += bucket_count
+        return round(maximum, 2)
+
+    def summary(self):
+        with self._lock:
+            counts, count, total, maximum = list(self.counts), self.count, self.sum, self.max
+        return {
+            "count": count,
+            "mean_ms": round(total / count, 2) if count else None,
+            "p50_ms": self.quantile(0.5, counts, count, maximum),
+            "p95_ms": self.quantile(0.95, counts, count, maximum),
+            "p99_ms": self.quantile(0.99, counts, count, maximum),
+            "max_ms": round(maximum, 2),
+            "buckets": {('+Inf' if bound == float('inf') else str(bound)): n
+                        for bound, n in zip(self.buckets, counts)}
+        }
+
+
+_lock = threading.Lock()
+_endpoints = {}
+_stages = {}
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+def _histogram(table, name):
+    with _lock:
+        histogram = table.get(name)
+        if histogram is None:
+            histogram = table[name] = Histogram()
+        return histogram
+
+
+def record_stage(name, seconds):
+    """Record a stage duration, and attach it to the current request if there is one."""
+    ms = seconds * 1000
+    _histogram(_stages, name).observe(ms)
+    timings = _current.get()
+    if timings is not None:
+        timings.stages.append((name, round(ms, 2)))
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+class RequestTimings:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages = []
+        self.token = None
+
+
+def start_request(endpoint):
+    timings = RequestTimings(endpoint)
+    timings.token = _current.set(timings)
+    profiler.attach()
+    return timings
+
+
+def finish_request(timings):
+    """Record the request's latency; returns it in milliseconds."""
+    ms = (time.perf_counter() - timings.started) * 1000
+    _histogram(_endpoints, timings.endpoint).observe(ms)
+    profiler.detach(timings, ms)
+    _current.reset(timings.token)
+    return ms
+
+
+def stats():
+    with _lock:
+        endpoints = dict(_endpoints)
+        stages = dict(_stages)
+    return {
+        "endpoints": {name: histogram.summary() for name, histogram in sorted(endpoints.items())},
+        "stages": {name: histogram.summary() for name, histogram in sorted(stages.items())},
+        "profiler": profiler.status()
+    }
+
+
+def reset():
+    with _lock:
+        _endpoints.clear()
+        _stages.clear()
+
+
+class SamplingProfiler:
+    """Samples the stacks of in-flight request threads; dumps slow requests."""
+
+    def __init__(self):
+        self.enabled = False
+        self.threshold_ms = float(os.environ.get('PROFILE_SLOW_REQUESTS_MS', 1000))
+        self.interval = float(os.environ.get('PROFILE_INTERVAL_MS', 5)) / 1000
+        self.directory = os.environ.get(
+            'PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'ai_assistant_profiles'))
+        self.dumps = deque(maxlen=50)
+        self._active = {}  # thread id -> Counter of collapsed stacks
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def configure(self, enabled=None, threshold_ms=None, interval_ms=None):
+        if threshold_ms is not None:
+            self.threshold_ms = float(threshold_ms)
+        if interval_ms is not None:
+            self.interval = max(float(interval_ms), 1) / 1000
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        with self._lock:
+            if self.enabled and self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+                self._thread.start()
+            if not self.enabled:
+                self._active.clear()
+
+    def status(self):
+        return {
+            "enabled": self.enabled,
+            "threshold_ms": self.threshold_ms,
+            "interval_ms": self.interval * 1000,
+            "directory": self.directory,
+            "dumps": list(self.dumps)
+        }
+
+    def attach(self):
+        if self.enabled:
+            with self._lock:
+                self._active[threading.get_ident()] = Counter()
+
+    def detach(self, timings, ms):
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if samples and ms >= self.threshold_ms:
+            self._dump(timings, ms, samples)
+
+    @staticmethod
+    def _collapse(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            if not self.enabled:
+                with self._lock:
+                    self._thread = None
+                return
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, samples in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[self._collapse(frame)] += 1
+            del frames
+
+    def _dump(self, timings, ms, samples):
+        os.makedirs(self.directory, exist_ok=True)
+        safe_name = ''.join(c if c.isalnum() else '_' for c in timings.endpoint).strip('_')
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}_{safe_name}_{int(ms)}ms.folded")
+        with open(path, 'w') as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        self.dumps.append({
+            "path": path,
+            "endpoint": timings.endpoint,
+            "elapsed_ms": round(ms, 2),
+            "samples": sum(samples.values()),
+            "stages": timings.stages
+        })
+
+
+profiler = SamplingProfiler()
+if os.environ.get('PROFILE_SLOW_REQUESTS'):
+    profiler.configure(enabled=os.environ['PROFILE_SLOW_REQUESTS'] != '0')
@@ -0,0 +1,152 @@
+"""
+Background jobs for long-running OSINT scans.
+
+Submitting a job returns its id at once; the scan runs on a bounded worker
+pool and callers poll for status, progress and the result, or cancel it.
+Submissions beyond the pool plus the queue-depth limit are refused with
+QueueFull, and finished jobs are forgotten after JOB_RETENTION seconds.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 8))
+JOB_QUEUE_DEPTH = int(os.environ.get('JOB_QUEUE_DEPTH', 64))
+JOB_RETENTION = float(os.environ.get('JOB_RETENTION', 3600))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class QueueFull(Exception):
+    """Raised when the job queue is at its depth limit."""
+
+
+class Cancelled(Exception):
+    """Raised inside a job's progress callback once the job is cancelled."""
+
+
+class Job:
+    def __init__(self, kind, target, func, args):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.target = target
+        self.func = func
+        self.args = args
+        self.status = QUEUED
+        self.progress = 0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.future = None
+        self.cancel_requested = threading.Event()
+
+    def report(self, percent):
+        """Progress callback handed to the scan; stops it once cancelled."""
+        if self.cancel_requested.is_set():
+            raise Cancelled()
+        self.progress = max(self.progress, min(int(percent), 100))
+
+    def to_dict(self, include_result=True):
+        job = {
+            "id": self.id,
+            "type": self.kind,
+            "target": self.target,
+            "status": self.status,
+            "progress": self.progress,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished
+        }
+        if self.error is not None:
+            job["error"] = self.error
+        if include_result and self.status == DONE:
+            job["result"] = self.result
+        return job
+
+
+class JobManager:
+    def __init__(self, workers=None, queue_depth=None, retention=None):
+        self.workers = workers or JOB_WORKERS
+        self.queue_depth = JOB_QUEUE_DEPTH if queue_depth is None else queue_depth
+        self.retention = JOB_RETENTION if retention is None else retention
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _prune_locked(self):
+        cutoff = time.time() - self.retention
+        for job_id in [job.id for job in self._jobs.values()
+                       if job.status in FINISHED and job.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def submit(self, kind, target, func, *args):
+        """Queue func(*args, progress) and return the Job; raises QueueFull at the limit."""
+        job = Job(kind, target, func, args)
+        with self._lock:
+            self._prune_locked()
+            active = sum(1 for existing in self._jobs.values() if existing.status not in FINISHED)
+            if active >= self.workers + self.queue_depth:
+                raise QueueFull(f"Job queue is full ({active} jobs pending), try again later")
+            self._jobs[job.id] = job
+            job.future = self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        with self._lock:
+            if job.status != QUEUED:
+                return
+            job.status = RUNNING
+            job.started = time.time()
+        try:
+            result = job.func(*job.args, job.report)
+            status, error = DONE, None
+        except Exception as e:
+            status, result, error = FAILED, None, str(e)
+        # Scans may wrap Cancelled in their own errors, or finish before noticing it
+        if job.cancel_requested.is_set():
+            status, result, error = CANCELLED, None, None
+        with self._lock:
+            job.status = status
+            job.result = result
+            job.error = error
+            if status == DONE:
+                job.progress = 100
+            job.finished = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            self._prune_locked()
+            return sorted(self._jobs.values(), key=lambda job: job.created, reverse=True)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; returns the Job, or None if unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return job
+            job.cancel_requested.set()
+            if job.status == QUEUED:
+                job.future.cancel()
+                job.status = CANCELLED
+                job.finished = time.time()
+            return job
+
+    def stats(self):
+        with self._lock:
+            counts = {status: 0 for status in (QUEUED, RUNNING) + FINISHED}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        return {"workers": self.workers, "queue_depth": self.queue_depth, "counts": counts}
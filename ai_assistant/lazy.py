@@ -0,0 +1,74 @@
+"""
+Deferred imports and a per-component startup time report.
+"""
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+
+_lock = threading.RLock()
+_timings = {}
+
+
+@contextmanager
+def timed(component):
+    """Record how long a startup component took (first measurement wins)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _lock:
+            _timings.setdefault(component, time.perf_counter() - start)
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access."""
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            with _lock:
+                module = self.__dict__['_module']
+                if module is None:
+                    with timed(f"import {self._name}"):
+                        module = importlib.import_module(self._name)
+                    self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__['_module'] is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+_lazy_modules = {}
+
+
+def lazy_import(name):
+    """Return a shared LazyModule proxy for the named module."""
+    with _lock:
+        if name not in _lazy_modules:
+            _lazy_modules[name] = LazyModule(name)
+        return _lazy_modules[name]
+
+
+def load(*names):
+    """Import the named modules now, recording their import times."""
+    for name in names:
+        lazy_import(name)._load()
+
+
+def startup_report():
+    """Milliseconds spent per startup component."""
+    with _lock:
+        timings = dict(_timings)
+    return {name: round(seconds * 1000, 2) for name, seconds in timings.items()}
@@ -1,24 +1,60 @@
-from flask import Flask, render_template, request, jsonify
+import time
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+from werkzeug.exceptions import RequestEntityTooLarge
+import argparse
 import os
-import cv2
-import numpy as np
 import base64
-import mediapipe as mp
-import whois
-import dns.resolver
-import requests
-from urllib.parse import urlparse
-import socket
+import io
 import json
-import psutil
-import platform
-from datetime import datetime
+import struct
+from ai_assistant import IMPORT_STARTED
+from ai_assistant.cache import LRUCache, content_key
+from ai_assistant.face_pool import FaceDetectionPool, PoolBusy
+from ai_assistant import instrumentation, osint
+from ai_assistant.device import diff, dynamic_fields, get_sampler
+from ai_assistant.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from ai_assistant.jobs import JobManager, QueueFull
+from ai_assistant.lazy import lazy_import, load, startup_report, timed
+
+# Heavy dependencies are imported on first use; see warm_up()
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
 
 app = Flask(__name__)
 
-# Initialize MediaPipe Face Detection
-mp_face_detection = mp.solutions.face_detection
-face_detection = mp_face_detection.FaceDetection(min_detection_confidence=0.5)
+# Hard limit on request bodies; Flask answers 413 past this size
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_BYTES', 10 * 1024 * 1024))
+MAX_BATCH_IMAGES = int(os.environ.get('MAX_BATCH_IMAGES', 32))
+
+# MediaPipe Face Detection runs in worker processes (FACE_POOL_PROCESSES, FACE_POOL_QUEUE_DEPTH)
+MIN_DETECTION_CONFIDENCE = 0.5
+face_pool = FaceDetectionPool(min_detection_confidence=MIN_DETECTION_CONFIDENCE)
+
+# Results keyed by a digest of the uploaded bytes plus everything that shapes the output
+result_cache = LRUCache(int(os.environ.get('RESULT_CACHE_BYTES', 64 * 1024 * 1024)))
+RESULT_CACHE_IMAGES = os.environ.get('RESULT_CACHE_IMAGES', '1') != '0'
+
+# Larger frames are shrunk before inference; MediaPipe resizes internally anyway (0 disables)
+MAX_INFERENCE_SIDE = int(os.environ.get('MAX_INFERENCE_SIDE', 1280))
+REDUCED_DECODE_FLAGS = {
+    8: 'IMREAD_REDUCED_COLOR_8',
+    4: 'IMREAD_REDUCED_COLOR_4',
+    2: 'IMREAD_REDUCED_COLOR_2'
+}
+
+DETECTION_PARAMS = (MIN_DETECTION_CONFIDENCE, MAX_INFERENCE_SIDE)
+
+# Output encodings for annotated images: extension, mimetype, quality flag
+OUTPUT_FORMATS = {
+    'jpeg': ('.jpg', 'image/jpeg', 'IMWRITE_JPEG_QUALITY'),
+    'webp': ('.webp', 'image/webp', 'IMWRITE_WEBP_QUALITY'),
+    'png': ('.png', 'image/png', None)
+}
+
+# Long-running OSINT scans (JOB_WORKERS, JOB_QUEUE_DEPTH, JOB_RETENTION)
+job_manager = JobManager()
+# 'dns_records' -> 'DNS Records'
+JOB_TYPES = {name.lower().replace(' ', '_'): name for name in osint.SCAN_TYPES}
 
 @app.route('/')
 def home():
@@ -28,70 +64,371 @@ def home():
 def test():
     return jsonify({"status": "success", "message": "API is working!"})
 
+# Per-endpoint latency histograms and the opt-in slow request profiler (see /stats)
+@app.before_request
+def start_timing():
+    rule = request.url_rule.rule if request.url_rule else '<unmatched>'
+    request.environ['ai_assistant.timings'] = instrumentation.start_request(f"{request.method} {rule}")
+
+@app.after_request
+def finish_timing(response):
+    # Streaming responses are timed up to the point the stream starts
+    timings = request.environ.pop('ai_assistant.timings', None)
+    if timings is not None:
+        instrumentation.finish_request(timings)
+    return response
+
+@app.teardown_request
+def finish_failed_timing(error=None):
+    # Requests that raised never reach after_request
+    timings = request.environ.pop('ai_assistant.timings', None)
+    if timings is not None:
+        instrumentation.finish_request(timings)
+
+@app.errorhandler(PoolBusy)
+def face_pool_busy(e):
+    return jsonify({"error": str(e)}), 503
+
+@app.errorhandler(QueueFull)
+def job_queue_full(e):
+    return jsonify({"error": str(e)}), 503
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    limit = app.config['MAX_CONTENT_LENGTH']
+    return jsonify({"error": f"Upload exceeds the {limit} byte limit"}), 413
+
+def read_image_bytes():
+    """Return the encoded image from a multipart, raw or base64 JSON upload."""
+    # Multipart form upload
+    if 'image' in request.files:
+        return request.files['image'].read()
+
+    # Raw body (image/jpeg, image/png, application/octet-stream, ...)
+    if request.mimetype.startswith('image/') or request.mimetype == 'application/octet-stream':
+        return request.get_data()
+
+    # Legacy base64 JSON body
+    data = request.get_json(silent=True)
+    if not data or 'image' not in data:
+        return None
+    return decode_base64(data['image'])
+
+def decode_base64(image_data):
+    # Accept both bare base64 and data: URLs
+    if ',' in image_data:
+        image_data = image_data.split(',')[1]
+    with instrumentation.stage('vision.base64_decode'):
+        return base64.b64decode(image_data)
+
+def probe_image_size(image_bytes):
+    """Read (width, height) from a PNG or JPEG header without decoding; None if unknown."""
+    if image_bytes[:8] == b'\x89PNG\r\n\x1a\n' and len(image_bytes) >= 24:
+        return struct.unpack('>II', image_bytes[16:24])
+
+    if image_bytes[:2] != b'\xff\xd8':
+        return None
+
+    # Walk JPEG segments up to the first start-of-frame marker
+    i = 2
+    while i + 9 < len(image_bytes):
+        if image_bytes[i] != 0xFF:
+            return None
+        marker = image_bytes[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if 0xD0 <= marker <= 0xD9 or marker == 0x01:
+            i += 2
+            continue
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', image_bytes[i + 5:i + 9])
+            return width, height
+        i += 2 + struct.unpack('>H', image_bytes[i + 2:i + 4])[0]
+    return None
+
+def shrink_to(image, max_side):
+    h, w = image.shape[:2]
+    if not max_side or max(h, w) <= max_side:
+        return image
+    scale = max_side / max(h, w)
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+def decode_flags(image_bytes, max_side=None):
+    """imdecode flags: the largest reduction that still leaves max_side pixels on the long side."""
+    # Let the decoder drop resolution (JPEG DCT scaling) when the header tells us the size
+    size = probe_image_size(image_bytes) if max_side else None
+    if size:
+        for factor, reduced_flags in REDUCED_DECODE_FLAGS.items():
+            if max(size) // factor >= max_side:
+                return getattr(cv2, reduced_flags)
+    return cv2.IMREAD_COLOR
+
+def decode_image(image_bytes, max_side=None):
+    """Decode an image; with max_side, decode at reduced size and shrink to fit."""
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    flags = decode_flags(image_bytes, max_side)
+
+    with instrumentation.stage('vision.imdecode'):
+        image = cv2.imdecode(nparr, flags)
+    if image is None or not max_side:
+        return image
+    return shrink_to(image, max_side)
+
+def detect_faces_scaled(image):
+    """Detect on a shrunk copy; relative boxes map straight back onto the original."""
+    return detect_faces(shrink_to(image, MAX_INFERENCE_SIDE))
+
+def request_option(name, default=None):
+    """Read an option from the query string, falling back to the JSON body."""
+    value = request.args.get(name)
+    if value is None and request.is_json:
+        value = (request.get_json(silent=True) or {}).get(name)
+    return default if value is None else value
+
+RESPONSE_MODES = ('json', 'image', 'detections')
+
+def response_mode():
+    """Pick the response mode: 'json' (base64 image), 'image' (raw bytes) or 'detections'."""
+    mode = request_option('response', 'json')
+    if mode not in RESPONSE_MODES:
+        raise ValueError(f"Unknown response mode: {mode}")
+    return mode
+
+def output_options():
+    """Annotation and encoding options for the returned image."""
+    image_format = str(request_option('format', 'jpeg')).lower()
+    if image_format == 'jpg':
+        image_format = 'jpeg'
+    if image_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {image_format}")
+
+    quality = int(request_option('quality', 90))
+    if not 1 <= quality <= 100:
+        raise ValueError("Quality must be between 1 and 100")
+
+    max_side = int(request_option('max_side', 0))
+    if max_side < 0:
+        raise ValueError("max_side must not be negative")
+
+    annotate = str(request_option('annotate', 'true')).lower() not in ('0', 'false', 'no')
+    return {"format": image_format, "quality": quality, "max_side": max_side, "annotate": annotate}
+
+def encode_image(image, options):
+    extension, _, quality_flag = OUTPUT_FORMATS[options["format"]]
+    params = [getattr(cv2, quality_flag), options["quality"]] if quality_flag is not None else []
+    with instrumentation.stage('vision.imencode'):
+        ok, buffer = cv2.imencode(extension, image, params)
+    if not ok:
+        raise ValueError(f"Could not encode image as {options['format']}")
+    return buffer.tobytes()
+
+def read_upload():
+    """Response mode, output options and image bytes of a detection request; raises ValueError."""
+    mode = response_mode()
+    options = output_options()
+    image_bytes = read_image_bytes()
+    if not image_bytes:
+        raise ValueError("No image data provided")
+    return mode, options, image_bytes
+
+def cache_detections(key, detections):
+    # Detections are tiny; charge a flat overhead per entry
+    result_cache.put(key, detections, 256 + 128 * len(detections))
+
+def cached_detection(mode, key, image_key, options):
+    """Return (detections, response) from the result cache.
+
+    response is only set when everything the mode needs was cached;
+    detections may be cached on their own when another output variant was asked for before.
+    """
+    detections = result_cache.get(key)
+    if detections is None:
+        return None, None
+    if mode == 'detections':
+        return detections, detection_response(mode, detections)
+    encoded = result_cache.get(image_key)
+    if encoded is None:
+        return detections, None
+    return detections, detection_response(mode, detections, encoded, options["format"])
+
+def decode_for_mode(mode, image_bytes, options):
+    # Decode straight from the request buffer, at reduced size when nothing needs full resolution
+    if mode == 'detections':
+        return decode_image(image_bytes, MAX_INFERENCE_SIDE)
+    if options["max_side"] and MAX_INFERENCE_SIDE:
+        return decode_image(image_bytes, max(options["max_side"], MAX_INFERENCE_SIDE))
+    return decode_image(image_bytes)
+
+def annotated_response(mode, image, detections, image_key, options):
+    """Response for a freshly decoded image; the encoded output is cached under image_key."""
+    if mode == 'detections':
+        return detection_response(mode, detections)
+
+    # Shrink before drawing so annotation and encoding work on the output size
+    image = shrink_to(image, options["max_side"])
+    if options["annotate"]:
+        draw_detections(image, detections)
+    encoded = encode_image(image, options)
+
+    if RESULT_CACHE_IMAGES:
+        result_cache.put(image_key, encoded, len(encoded))
+    return detection_response(mode, detections, encoded, options["format"])
+
+def detect_faces(image):
+    """Run MediaPipe face detection on a BGR image and return the detections list."""
+    # Includes queueing and the hop to the worker; vision.mediapipe_process is the inference alone
+    with instrumentation.stage('vision.detect'):
+        return face_pool.detect(image)
+
+def draw_detections(image, detections):
+    h, w = image.shape[:2]
+    with instrumentation.stage('vision.draw'):
+        for detection in detections:
+            bbox = detection["bbox"]
+            x = int(bbox["xmin"] * w)
+            y = int(bbox["ymin"] * h)
+            width = int(bbox["width"] * w)
+            height = int(bbox["height"] * h)
+            cv2.rectangle(image, (x, y), (x + width, y + height), (0, 255, 0), 2)
+    return image
+
+def detection_response(mode, detections, encoded=None, image_format='jpeg'):
+    # Detections only: no drawing or re-encoding happened
+    if mode == 'detections':
+        return jsonify({
+            "success": True,
+            "detections": detections
+        })
+
+    # Raw image body, detections travel in a header
+    if mode == 'image':
+        response = Response(encoded, mimetype=OUTPUT_FORMATS[image_format][1])
+        response.headers['X-Detections'] = json.dumps(detections)
+        return response
+
+    processed_image = base64.b64encode(encoded).decode('utf-8')
+    return jsonify({
+        "success": True,
+        "processed_image": processed_image,
+        "image_format": image_format,
+        "detections": detections
+    })
+
 @app.route('/visual_detection', methods=['POST'])
 def visual_detection():
     try:
-        data = request.get_json()
-        if not data or 'image' not in data:
-            return jsonify({"error": "No image data provided"})
+        try:
+            mode, options, image_bytes = read_upload()
+        except ValueError as e:
+            return jsonify({"error": str(e)})
+
+        # Repeat uploads skip decode, inference and encode. Detections and each
+        # encoded variant are cached separately so output options share one inference.
+        key = content_key(image_bytes, DETECTION_PARAMS)
+        image_key = "{}:{format}:{quality}:{max_side}:{annotate}".format(key, **options)
+        detections, response = cached_detection(mode, key, image_key, options)
+        if response is not None:
+            return response
+
+        image = decode_for_mode(mode, image_bytes, options)
+        if image is None:
+            return jsonify({"error": "Invalid image data"})
 
-        # Get the base64 image data
-        image_data = data['image']
-        if ',' in image_data:
-            image_data = image_data.split(',')[1]
+        if detections is None:
+            detections = detect_faces_scaled(image)
+            cache_detections(key, detections)
 
-        # Convert base64 to image
-        image_bytes = base64.b64decode(image_data)
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        return annotated_response(mode, image, detections, image_key, options)
 
-        if image is None:
-            return jsonify({"error": "Invalid image data"})
+    except (RequestEntityTooLarge, PoolBusy):
+        raise
+    except Exception as e:
+        print(f"Error in visual detection: {str(e)}")
+        return jsonify({"error": str(e)})
 
-        # Convert BGR to RGB
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
-        # Process the image
-        results = face_detection.process(image_rgb)
-        
-        # Initialize detections list
-        detections = []
-        
-        if results.detections:
-            for detection in results.detections:
-                bbox = detection.location_data.relative_bounding_box
-                detections.append({
-                    "confidence": float(detection.score[0]),
-                    "bbox": {
-                        "xmin": float(bbox.xmin),
-                        "ymin": float(bbox.ymin),
-                        "width": float(bbox.width),
-                        "height": float(bbox.height)
-                    }
-                })
-                
-                # Draw detection on image
-                h, w, _ = image.shape
-                x = int(bbox.xmin * w)
-                y = int(bbox.ymin * h)
-                width = int(bbox.width * w)
-                height = int(bbox.height * h)
-                cv2.rectangle(image, (x, y), (x + width, y + height), (0, 255, 0), 2)
-
-        # Convert processed image back to base64
-        _, buffer = cv2.imencode('.jpg', image)
-        processed_image = base64.b64encode(buffer).decode('utf-8')
+def read_batch_images():
+    """Return a list of encoded images (or exceptions) from a multipart or JSON batch upload."""
+    if 'images' in request.files:
+        return [f.read() for f in request.files.getlist('images')]
+
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('images'), list):
+        return None
+
+    images = []
+    for image_data in data['images']:
+        try:
+            images.append(decode_base64(image_data))
+        except Exception as e:
+            images.append(e)
+    return images
+
+def submit_batch_image(image_bytes):
+    """(key, cached detections or a Future of them) for one batch entry; raises if it is unusable."""
+    if isinstance(image_bytes, Exception):
+        raise image_bytes
+    key = content_key(image_bytes, DETECTION_PARAMS)
+    detections = result_cache.get(key)
+    if detections is not None:
+        return key, detections
+    image = decode_image(image_bytes, MAX_INFERENCE_SIDE)
+    if image is None:
+        raise ValueError("Invalid image data")
+    return key, face_pool.submit(image)
+
+def batch_result(index, key, item):
+    """Result entry for one batch image; item is a detections list, a Future or the exception it raised."""
+    try:
+        if isinstance(item, Exception):
+            raise item
+        if isinstance(item, list):
+            detections = item
+        else:
+            detections = item.result()
+            cache_detections(key, detections)
+        return {"index": index, "success": True, "detections": detections}
+    except Exception as e:
+        return {"index": index, "error": str(e)}
+
+@app.route('/visual_detection/batch', methods=['POST'])
+def visual_detection_batch():
+    try:
+        images = read_batch_images()
+        if not images:
+            return jsonify({"error": "No images provided"})
+        if len(images) > MAX_BATCH_IMAGES:
+            return jsonify({"error": f"Batch exceeds the {MAX_BATCH_IMAGES} image limit"})
+
+        # Hand every uncached frame to the pool first so workers run them in parallel
+        pending = []
+        for image_bytes in images:
+            try:
+                pending.append(submit_batch_image(image_bytes))
+            except Exception as e:
+                pending.append((None, e))
+
+        # One entry per input image, in input order; failures stay local to their image
+        results = [batch_result(index, key, item) for index, (key, item) in enumerate(pending)]
 
         return jsonify({
             "success": True,
-            "processed_image": processed_image,
-            "detections": detections
+            "results": results
         })
 
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
-        print(f"Error in visual detection: {str(e)}")
+        print(f"Error in batch visual detection: {str(e)}")
         return jsonify({"error": str(e)})
 
+@app.route('/visual_detection/cache', methods=['GET', 'DELETE'])
+def visual_detection_cache():
+    if request.method == 'DELETE':
+        result_cache.clear()
+    return jsonify({"success": True, "cache": result_cache.stats()})
+
 @app.route('/osint', methods=['POST'])
 def osint_analysis():
     try:
@@ -103,151 +440,289 @@ def osint_analysis():
         if not target:
             return jsonify({"error": "Empty target provided"})
 
-        # Add http:// if no protocol specified
-        if not target.startswith(('http://', 'https://')):
-            target = 'http://' + target
-
-        # Parse URL
-        parsed_url = urlparse(target)
-        domain = parsed_url.netloc if parsed_url.netloc else parsed_url.path
-        if not domain:
-            return jsonify({"error": "Invalid domain"})
-
-        # Initialize results dictionary
-        results = {
-            "domain_info": {},
-            "dns_records": {},
-            "headers": {},
-            "ip_info": {}
-        }
-
-        # Get WHOIS information
         try:
-            domain_info = whois.whois(domain)
-            results["domain_info"] = {
-                "registrar": str(domain_info.registrar) if domain_info.registrar else "N/A",
-                "creation_date": str(domain_info.creation_date) if domain_info.creation_date else "N/A",
-                "expiration_date": str(domain_info.expiration_date) if domain_info.expiration_date else "N/A",
-                "name_servers": domain_info.name_servers if isinstance(domain_info.name_servers, list) else [str(domain_info.name_servers)] if domain_info.name_servers else ["N/A"]
-            }
-        except Exception as e:
-            results["domain_info"] = {"error": f"WHOIS lookup failed: {str(e)}"}
-
-        # Get DNS records
-        for record_type in ['A', 'MX', 'NS']:
-            try:
-                records = dns.resolver.resolve(domain, record_type)
-                if record_type == 'MX':
-                    results["dns_records"][record_type] = [str(record.exchange) for record in records]
-                else:
-                    results["dns_records"][record_type] = [str(record) for record in records]
-            except Exception as e:
-                results["dns_records"][record_type] = [f"Error: {str(e)}"]
+            deadline = osint.deadline_option(data.get('deadline'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        # Get HTTP headers
         try:
-            response = requests.head(target, timeout=5, allow_redirects=True)
-            results["headers"] = dict(response.headers)
-        except Exception as e:
-            results["headers"] = {"error": f"Failed to get headers: {str(e)}"}
+            analysis = osint.analyze(target, deadline=deadline)
+        except ValueError as e:
+            return jsonify({"error": str(e)})
+
+        return jsonify({
+            "success": True,
+            **analysis
+        })
+
+    except Exception as e:
+        print(f"Error in OSINT analysis: {str(e)}")
+        return jsonify({"error": str(e)})
+
+def iter_lines(stream):
+    for line in stream:
+        yield line.decode('utf-8', errors='replace') if isinstance(line, bytes) else line
+
+def read_bulk_targets():
+    """Targets from an uploaded file, a plain-text body or a JSON list, read lazily."""
+    if 'targets' in request.files:
+        # Uploaded files are closed once the view returns; the copy is bounded by MAX_CONTENT_LENGTH
+        return iter_lines(io.BytesIO(request.files['targets'].read()))
+    if request.mimetype == 'text/plain':
+        return iter_lines(request.stream)
+
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('targets'), list):
+        return None
+    return (str(target) for target in data['targets'])
+
+@app.route('/osint/bulk', methods=['POST'])
+def osint_bulk():
+    try:
+        targets = read_bulk_targets()
+        if targets is None:
+            return jsonify({"error": "No targets provided"})
 
-        # Get IP information
+        concurrency = request_option('concurrency')
         try:
-            ip = socket.gethostbyname(domain)
-            ip_response = requests.get(f"https://ipapi.co/{ip}/json/", timeout=5).json()
-            results["ip_info"] = {
-                "ip": ip,
-                "country": ip_response.get("country_name", "N/A"),
-                "region": ip_response.get("region", "N/A"),
-                "city": ip_response.get("city", "N/A"),
-                "org": ip_response.get("org", "N/A")
-            }
-        except Exception as e:
-            results["ip_info"] = {"error": f"IP lookup failed: {str(e)}"}
+            # Checked up front: once streaming starts, errors can no longer be reported
+            if concurrency is not None:
+                concurrency = osint.positive_option('concurrency', concurrency, int)
+            deadline = osint.deadline_option(request_option('deadline'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # One JSON document per line, written as each target completes
+        def generate():
+            for result in osint.analyze_many(targets, concurrency, deadline):
+                yield json.dumps(result) + "\n"
 
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    except Exception as e:
+        print(f"Error in bulk OSINT analysis: {str(e)}")
+        return jsonify({"error": str(e)})
+
+@app.route('/osint/cache', methods=['GET', 'DELETE'])
+def osint_cache():
+    if request.method == 'DELETE':
+        osint.clear_caches()
+    return jsonify({"success": True, "cache": osint.cache_stats()})
+
+@app.route('/osint/jobs', methods=['GET', 'POST'])
+def osint_jobs():
+    if request.method == 'GET':
         return jsonify({
             "success": True,
-            "target": target,
-            "results": results
+            "jobs": [job.to_dict(include_result=False) for job in job_manager.list()],
+            **job_manager.stats()
         })
 
+    try:
+        data = request.get_json()
+        if not data or 'target' not in data:
+            return jsonify({"error": "No target provided"})
+
+        target = str(data['target']).strip()
+        if not target:
+            return jsonify({"error": "Empty target provided"})
+
+        requested = str(data.get('type', 'full_analysis'))
+        scan_type = JOB_TYPES.get(requested.lower().replace(' ', '_'))
+        if scan_type is None:
+            return jsonify({"error": f"Unknown scan type: {requested}", "types": list(osint.SCAN_TYPES)})
+
+        try:
+            options = osint.scan_options(data.get('options'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        job = job_manager.submit(scan_type, target, osint.run_scan, scan_type, target, options)
+        return jsonify({"success": True, "job": job.to_dict()}), 202
+
+    except QueueFull:
+        raise
     except Exception as e:
-        print(f"Error in OSINT analysis: {str(e)}")
+        print(f"Error submitting OSINT job: {str(e)}")
         return jsonify({"error": str(e)})
 
+@app.route('/osint/jobs/<job_id>', methods=['GET', 'DELETE'])
+def osint_job(job_id):
+    if request.method == 'DELETE':
+        job = job_manager.cancel(job_id)
+    else:
+        job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    return jsonify({"success": True, "job": job.to_dict()})
+
 @app.route('/device_status', methods=['GET'])
 def device_status():
     try:
-        # System information
-        system_info = {
-            "system": platform.system(),
-            "version": platform.version(),
-            "machine": platform.machine(),
-            "processor": platform.processor()
-        }
-
-        # CPU information
-        cpu_info = {
-            "physical_cores": psutil.cpu_count(logical=False),
-            "total_cores": psutil.cpu_count(logical=True),
-            "cpu_percent": psutil.cpu_percent(interval=1),
-            "frequency": {
-                "current": psutil.cpu_freq().current,
-                "min": psutil.cpu_freq().min,
-                "max": psutil.cpu_freq().max
-            }
-        }
-
-        # Memory information
-        memory = psutil.virtual_memory()
-        memory_info = {
-            "total": memory.total,
-            "available": memory.available,
-            "used": memory.used,
-            "percent": memory.percent
-        }
-
-        # Disk information
-        disk = psutil.disk_usage('/')
-        disk_info = {
-            "total": disk.total,
-            "used": disk.used,
-            "free": disk.free,
-            "percent": disk.percent
-        }
-
-        # Network information
-        network_info = {}
-        for interface, stats in psutil.net_if_stats().items():
-            network_info[interface] = {
-                "isup": stats.isup,
-                "speed": stats.speed
-            }
+        # Latest snapshot from the background sampler (DEVICE_SAMPLE_INTERVAL)
+        return Response(get_sampler().snapshot_json(), mimetype='application/json')
 
-        # Battery information
-        battery = psutil.sensors_battery()
-        battery_info = None
-        if battery:
-            battery_info = {
-                "percent": battery.percent,
-                "power_plugged": battery.power_plugged,
-                "time_left": battery.secsleft if battery.secsleft != -2 else "Calculating..."
-            }
+    except Exception as e:
+        print(f"Error in device status: {str(e)}")
+        return jsonify({"error": str(e)})
+
+@app.route('/metrics', methods=['GET'])
+def metrics_view():
+    # Rendered by the background sampler; a scrape only returns the cached text
+    return Response(get_sampler().metrics_text(), content_type=METRICS_CONTENT_TYPE)
+
+# Live device metrics over Server-Sent Events
+STREAM_MIN_INTERVAL = float(os.environ.get('DEVICE_STREAM_MIN_INTERVAL', 1))
+STREAM_MAX_INTERVAL = 60
+STREAM_KEEPALIVE = 15
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+@app.route('/device_status/stream', methods=['GET'])
+def device_status_stream():
+    try:
+        interval = float(request.args.get('interval', 2))
+        interval = min(max(interval, STREAM_MIN_INTERVAL), STREAM_MAX_INTERVAL)
+        sampler = get_sampler()
+
+        # Static fields once, then only the metrics that changed since the last event
+        def generate():
+            yield f"retry: {int(interval * 1000)}\n\n"
+            yield sse_event('static', {"system": sampler.static["system"], "cpu": sampler.static["cpu"]})
+            sent = {}
+            last_snapshot = None
+            last_event = time.monotonic()
+            while True:
+                snapshot = sampler.snapshot()
+                if snapshot is not last_snapshot:
+                    last_snapshot = snapshot
+                    current = dynamic_fields(snapshot)
+                    changes = diff(sent, current)
+                    sent = current
+                    if changes:
+                        last_event = time.monotonic()
+                        yield sse_event('metrics', changes)
+                if time.monotonic() - last_event >= STREAM_KEEPALIVE:
+                    last_event = time.monotonic()
+                    yield ": keep-alive\n\n"
+                time.sleep(interval)
+
+        return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    except Exception as e:
+        print(f"Error in device status stream: {str(e)}")
+        return jsonify({"error": str(e)})
+
+def series_list(values):
+    # NaN (no sample / no battery) becomes null
+    return [None if value != value else value for value in values.tolist()]
+
+@app.route('/device_status/history', methods=['GET'])
+def device_status_history():
+    try:
+        metrics = request.args.get('metrics')
+        now = time.time()
+        until = float(request.args.get('until', now))
+        since = float(request.args['since']) if 'since' in request.args else until - float(request.args.get('range', 3600))
+        step = request.args.get('step')
+
+        history = get_sampler().history.query(
+            metrics.split(',') if metrics else None, since, until, float(step) if step else None)
 
         return jsonify({
             "success": True,
-            "timestamp": datetime.now().isoformat(),
-            "system": system_info,
-            "cpu": cpu_info,
-            "memory": memory_info,
-            "disk": disk_info,
-            "network": network_info,
-            "battery": battery_info
+            "since": since,
+            "until": until,
+            "tier": history["tier"],
+            "step": history["step"],
+            "timestamps": history["timestamps"].tolist(),
+            "metrics": {
+                name: {stat: series_list(values) for stat, values in stats.items()}
+                for name, stats in history["metrics"].items()
+            }
         })
 
     except Exception as e:
-        print(f"Error in device status: {str(e)}")
+        print(f"Error in device status history: {str(e)}")
         return jsonify({"error": str(e)})
 
+# Engines that warm_up() can preload, and the modules each one needs
+ENGINES = {
+    'vision': ('numpy', 'cv2'),
+    'osint': ('whois', 'dns.resolver', 'requests'),
+    'device': ('psutil',)
+}
+
+def warm_up(engines=None):
+    """Preload the given engines (default: all) before a worker accepts traffic."""
+    if engines is None:
+        engines = list(ENGINES)
+    # Check every name first so a typo fails before anything is loaded
+    for engine in engines:
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
+    for engine in engines:
+        with timed(f"warm_up {engine}"):
+            load(*ENGINES[engine])
+            if engine == 'vision':
+                # Starts the worker processes and builds their MediaPipe graphs
+                with timed("face_pool"):
+                    face_pool.warm_up()
+            elif engine == 'device':
+                with timed("device_sampler"):
+                    get_sampler()
+
+@app.route('/stats', methods=['GET', 'DELETE'])
+def stats_view():
+    if request.method == 'DELETE':
+        instrumentation.reset()
+    return jsonify({"success": True, **instrumentation.stats()})
+
+@app.route('/stats/profiler', methods=['GET', 'POST'])
+def profiler_view():
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            instrumentation.profiler.configure(
+                enabled=data.get('enabled'),
+                threshold_ms=data.get('threshold_ms'),
+                interval_ms=data.get('interval_ms'))
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)})
+    return jsonify({"success": True, "profiler": instrumentation.profiler.status()})
+
+@app.route('/startup_report', methods=['GET'])
+def startup_report_view():
+    return jsonify({
+        "success": True,
+        "app_import_ms": APP_IMPORT_MS,
+        "components": startup_report()
+    })
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AI Assistant web server")
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--warm-up', default=os.environ.get('AI_ASSISTANT_WARMUP', ''),
+                        help="comma separated engines to preload (vision, osint, device or all)")
+    args = parser.parse_args(argv)
+    engines = None if args.warm_up == 'all' else [e.strip() for e in args.warm_up.split(',') if e.strip()]
+    unknown = [engine for engine in engines or [] if engine not in ENGINES]
+    if unknown:
+        parser.error(f"unknown engine(s) for --warm-up: {', '.join(unknown)}")
+
+    # With the debug reloader only the serving child process warms up
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        if args.warm_up:
+            warm_up(engines)
+            print("Startup report (ms):", json.dumps(startup_report()))
+        # Static system info is read once here and metrics are sampled in the background
+        get_sampler()
+
+    app.run(debug=True, port=args.port)
+
+APP_IMPORT_MS = round((time.perf_counter() - IMPORT_STARTED) * 1000, 2)
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    main()
@@ -0,0 +1,185 @@
+"""
+Host and process metrics in the OpenMetrics text exposition format.
+
+collect() reads psutil once and returns metric families; render() turns
+families into the text served at /metrics. The device sampler calls both
+from its background thread, so a scrape only copies a cached string.
+"""
+import os
+import time
+
+from ai_assistant.lazy import lazy_import
+
+psutil = lazy_import('psutil')
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+
+class Family:
+    """One metric family: name, type, help text and its samples."""
+
+    def __init__(self, name, metric_type, help_text, unit=None):
+        self.name = name
+        self.type = metric_type
+        self.help = help_text
+        self.unit = unit
+        self.samples = []
+
+    def add(self, value, suffix='', **labels):
+        if value is not None:
+            self.samples.append((suffix, labels, value))
+        return self
+
+
+def gauge(name, help_text, value=None, unit=None, **labels):
+    family = Family(name, 'gauge', help_text, unit)
+    return family.add(value, **labels)
+
+
+def counter(name, help_text, unit=None):
+    return Family(name, 'counter', help_text, unit)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def render(families):
+    """OpenMetrics text for families, terminated by # EOF."""
+    lines = []
+    for family in families:
+        if not family.samples:
+            continue
+        lines.append(f"# TYPE {family.name} {family.type}")
+        if family.unit:
+            lines.append(f"# UNIT {family.name} {family.unit}")
+        lines.append(f"# HELP {family.name} {escape(family.help)}")
+        for suffix, labels, value in family.samples:
+            label_text = ','.join(f'{key}="{escape(label)}"' for key, label in labels.items())
+            name = family.name + suffix
+            lines.append(f"{name}{{{label_text}}} {format_value(value)}" if label_text
+                         else f"{name} {format_value(value)}")
+    lines.append("# EOF")
+    return '\n'.join(lines) + '\n'
+
+
+def cpu_families(per_cpu):
+    usage = Family('host_cpu_usage_percent', 'gauge', 'CPU utilisation since the previous sample')
+    for cpu, percent in enumerate(per_cpu):
+        usage.add(percent, cpu=str(cpu))
+    freq = psutil.cpu_freq()
+    return [
+        usage,
+        gauge('host_cpu_frequency_mhz', 'Current CPU frequency', freq.current if freq else None),
+        gauge('host_boot_time_seconds', 'Host boot time', psutil.boot_time(), unit='seconds')
+    ]
+
+
+def memory_families():
+    memory = psutil.virtual_memory()
+    swap = psutil.swap_memory()
+    return [
+        gauge('host_memory_total_bytes', 'Total physical memory', memory.total, unit='bytes'),
+        gauge('host_memory_available_bytes', 'Memory available to new processes', memory.available, unit='bytes'),
+        gauge('host_memory_used_bytes', 'Memory in use', memory.used, unit='bytes'),
+        gauge('host_swap_total_bytes', 'Total swap space', swap.total, unit='bytes'),
+        gauge('host_swap_used_bytes', 'Swap space in use', swap.used, unit='bytes')
+    ]
+
+
+def disk_families():
+    total = Family('host_disk_total_bytes', 'gauge', 'Filesystem size', 'bytes')
+    used = Family('host_disk_used_bytes', 'gauge', 'Filesystem space in use', 'bytes')
+    free = Family('host_disk_free_bytes', 'gauge', 'Filesystem space free', 'bytes')
+    for partition in psutil.disk_partitions(all=False):
+        try:
+            usage = psutil.disk_usage(partition.mountpoint)
+        except OSError:
+            continue
+        labels = {'mount': partition.mountpoint, 'device': partition.device, 'fstype': partition.fstype}
+        total.add(usage.total, **labels)
+        used.add(usage.used, **labels)
+        free.add(usage.free, **labels)
+    return [total, used, free]
+
+
+# family name, help, net_io_counters field
+NETWORK_COUNTERS = [
+    ('host_network_sent_bytes', 'Bytes sent', 'bytes_sent'),
+    ('host_network_received_bytes', 'Bytes received', 'bytes_recv'),
+    ('host_network_sent_packets', 'Packets sent', 'packets_sent'),
+    ('host_network_received_packets', 'Packets received', 'packets_recv'),
+    ('host_network_receive_errors', 'Errors while receiving', 'errin'),
+    ('host_network_transmit_errors', 'Errors while sending', 'errout'),
+    ('host_network_receive_drops', 'Incoming packets dropped', 'dropin'),
+    ('host_network_transmit_drops', 'Outgoing packets dropped', 'dropout')
+]
+
+
+def network_families():
+    counters = psutil.net_io_counters(pernic=True)
+    families = []
+    for name, help_text, field in NETWORK_COUNTERS:
+        family = counter(name, help_text, 'bytes' if field.startswith('bytes') else None)
+        for interface, stats in counters.items():
+            family.add(getattr(stats, field), '_total', interface=interface)
+        families.append(family)
+
+    up = Family('host_network_up', 'gauge', 'Whether the interface is up')
+    speed = Family('host_network_speed_mbps', 'gauge', 'Interface speed (0 if unknown)')
+    for interface, stats in psutil.net_if_stats().items():
+        up.add(stats.isup, interface=interface)
+        speed.add(stats.speed, interface=interface)
+    return families + [up, speed]
+
+
+def battery_families():
+    battery = psutil.sensors_battery()
+    if not battery:
+        return []
+    seconds_left = battery.secsleft if battery.secsleft >= 0 else None
+    return [
+        gauge('host_battery_percent', 'Battery charge', battery.percent),
+        gauge('host_battery_power_plugged', 'Whether the charger is connected', battery.power_plugged),
+        gauge('host_battery_time_left_seconds', 'Estimated battery time left', seconds_left, unit='seconds')
+    ]
+
+
+def process_families():
+    process = psutil.Process(os.getpid())
+    with process.oneshot():
+        cpu = process.cpu_times()
+        memory = process.memory_info()
+        threads = process.num_threads()
+        create_time = process.create_time()
+        fds = process.num_fds() if hasattr(process, 'num_fds') else None
+    return [
+        counter('process_cpu_seconds', 'CPU time used by this server', 'seconds').add(cpu.user + cpu.system, '_total'),
+        gauge('process_resident_memory_bytes', 'Resident memory of this server', memory.rss, unit='bytes'),
+        gauge('process_virtual_memory_bytes', 'Virtual memory of this server', memory.vms, unit='bytes'),
+        gauge('process_threads', 'Threads in this server', threads),
+        gauge('process_open_fds', 'Open file descriptors', fds),
+        gauge('process_start_time_seconds', 'Start time of this server', create_time, unit='seconds'),
+        gauge('host_processes', 'Processes running on the host', len(psutil.pids()))
+    ]
+
+
+def collect(per_cpu):
+    """Every host and process family; per_cpu is cpu_percent(percpu=True)."""
+    families = cpu_families(per_cpu)
+    for collector in (memory_families, disk_families, network_families, battery_families, process_families):
+        try:
+            families += collector()
+        except Exception as e:
+            print(f"Error collecting metrics in {collector.__name__}: {str(e)}")
+    families.append(gauge('host_metrics_collected_timestamp_seconds', 'When these metrics were sampled',
+                          time.time(), unit='seconds'))
+    return families
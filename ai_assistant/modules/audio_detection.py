@@ -1,17 +1,40 @@
+import time
 import numpy as np
 import sounddevice as sd
-import queue
-import threading
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QLabel, QPushButton, 
-                           QProgressBar, QComboBox)
+                           QProgressBar, QComboBox, QListWidget)
 from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+from ai_assistant.audio import AudioRingBuffer, SoundAnalyzer, levels
+
+SAMPLE_RATE = 44100
+BLOCK_SIZE = 1024
+UPDATE_INTERVAL_MS = 50
+MAX_EVENTS = 50
+
+# Above this level (0-100, from dBFS over a 60 dB range) the sound is reported as loud
+LOUD_LEVEL = 80
+LOUD_STATE = ("Status: Loud Sound Detected!", "color: red;")
+
+# Current sound class from the analyzer -> status text and style
+SOUND_STATES = {
+    'speech': ("Status: Speech Detected", "color: green;"),
+    'tone': ("Status: Tone Detected", "color: blue;"),
+    'noise': ("Status: Noise Detected", "color: orange;"),
+    'silence': ("Status: Quiet", "color: black;")
+}
 
 class AudioDetectionWidget(QWidget):
     audio_level_update = pyqtSignal(float)
+    sound_event = pyqtSignal(dict)
 
     def __init__(self):
         super().__init__()
-        self.audio_queue = queue.Queue()
+        # About a second of audio; the callback only copies into it
+        self.ring = AudioRingBuffer(SAMPLE_RATE)
+        self.level_window = np.zeros(SAMPLE_RATE, dtype=np.float32)
+        self.read_position = 0
+        self.level_state = None
+        self.analyzer = SoundAnalyzer(SAMPLE_RATE)
         self.stream = None
         self.is_recording = False
         self.initUI()
@@ -37,6 +60,11 @@ class AudioDetectionWidget(QWidget):
         self.status_label = QLabel("Status: Ready")
         layout.addWidget(self.status_label)
 
+        # Sound events, newest first
+        layout.addWidget(QLabel("Sound Events:"))
+        self.events_list = QListWidget()
+        layout.addWidget(self.events_list)
+
         # Control buttons
         self.start_button = QPushButton("Start Audio Detection")
         self.start_button.clicked.connect(self.toggle_audio)
@@ -44,11 +72,11 @@ class AudioDetectionWidget(QWidget):
 
         # Connect signal to update UI
         self.audio_level_update.connect(self.update_level_bar)
+        self.sound_event.connect(self.add_event)
 
-        # Update timer
+        # Update timer, running only while recording
         self.update_timer = QTimer()
-        self.update_timer.timeout.connect(self.process_audio_queue)
-        self.update_timer.start(50)  # 50ms update interval
+        self.update_timer.timeout.connect(self.process_audio)
 
     def update_devices(self):
         self.device_combo.clear()
@@ -60,32 +88,37 @@ class AudioDetectionWidget(QWidget):
     def audio_callback(self, indata, frames, time, status):
         if status:
             print(f"Audio callback status: {status}")
-        volume_norm = np.linalg.norm(indata) * 10
-        self.audio_queue.put(volume_norm)
-
-    def process_audio_queue(self):
-        try:
-            while True:
-                volume = self.audio_queue.get_nowait()
-                self.audio_level_update.emit(volume)
-        except queue.Empty:
-            pass
+        self.ring.write(indata[:, 0])
+
+    def process_audio(self):
+        # One level update per tick, over the samples that arrived since the last one
+        written = self.ring.written
+        if written == self.read_position:
+            return
+        samples = self.ring.latest(written - self.read_position, self.level_window)
+        self.read_position = written
+        rms, peak, dbfs = levels(samples)
+        for event in self.analyzer.process(samples):
+            self.sound_event.emit(event)
+        self.level_bar.setFormat(f"Volume: {dbfs:.0f} dBFS (peak {peak:.2f})")
+        self.audio_level_update.emit(min(100.0, max(0.0, (dbfs + 60) * 100 / 60)))
 
     def update_level_bar(self, value):
-        # Scale the value to 0-100 range
-        scaled_value = min(100, int(value * 5))
-        self.level_bar.setValue(scaled_value)
-        
-        # Update status based on volume
-        if scaled_value > 80:
-            self.status_label.setText("Status: Loud Sound Detected!")
-            self.status_label.setStyleSheet("color: red;")
-        elif scaled_value > 50:
-            self.status_label.setText("Status: Normal Speech Level")
-            self.status_label.setStyleSheet("color: green;")
-        else:
-            self.status_label.setText("Status: Quiet")
-            self.status_label.setStyleSheet("color: black;")
+        self.level_bar.setValue(int(value))
+
+        # Update status only when the sound moves into another state
+        text, style = LOUD_STATE if value > LOUD_LEVEL else SOUND_STATES[self.analyzer.current]
+        if self.level_state != text:
+            self.level_state = text
+            self.status_label.setText(text)
+            self.status_label.setStyleSheet(style)
+
+    def add_event(self, event):
+        started = time.strftime('%H:%M:%S', time.localtime(event['timestamp']))
+        self.events_list.insertItem(0, f"{started}  {event['label']}  {event['duration']:.1f}s  "
+                                       f"(peak {event['peak_dbfs']:.0f} dBFS)")
+        while self.events_list.count() > MAX_EVENTS:
+            self.events_list.takeItem(self.events_list.count() - 1)
 
     def toggle_audio(self):
         if self.is_recording:
@@ -100,10 +133,14 @@ class AudioDetectionWidget(QWidget):
                 device=device_idx,
                 channels=1,
                 callback=self.audio_callback,
-                blocksize=1024,
-                samplerate=44100
+                blocksize=BLOCK_SIZE,
+                samplerate=SAMPLE_RATE
             )
+            self.read_position = self.ring.written
+            self.level_state = None
+            self.analyzer.reset()
             self.stream.start()
+            self.update_timer.start(UPDATE_INTERVAL_MS)
             self.is_recording = True
             self.start_button.setText("Stop Audio Detection")
             self.status_label.setText("Status: Listening...")
@@ -115,10 +152,17 @@ class AudioDetectionWidget(QWidget):
             self.stream.stop()
             self.stream.close()
             self.stream = None
+        self.update_timer.stop()
+        if self.is_recording:
+            for event in self.analyzer.flush():
+                self.sound_event.emit(event)
         self.is_recording = False
         self.start_button.setText("Start Audio Detection")
         self.status_label.setText("Status: Ready")
+        self.status_label.setStyleSheet("")
+        self.level_state = None
         self.level_bar.setValue(0)
+        self.level_bar.setFormat("Volume: %p%")
 
     def closeEvent(self, event):
         self.stop_audio()
@@ -1,9 +1,129 @@
-import psutil
+import atexit
 import platform
-from datetime import datetime
-from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QLabel, QProgressBar, 
+import threading
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QLabel, QProgressBar,
                            QTableWidget, QTableWidgetItem, QTabWidget)
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QEvent, QObject, QThread, QTimer, pyqtSignal
+from ai_assistant.device import DeviceSampler
+from ai_assistant.processes import TOP_PROCESSES, ProcessTable
+
+class DeviceCollector(QObject):
+    """Shared psutil sampler running in its own thread.
+
+    Tabs subscribe while they are visible; with no subscribers the timer
+    stops, so hidden tabs and minimized windows cost nothing.
+    """
+    resources_ready = pyqtSignal(dict)
+    processes_ready = pyqtSignal(list)
+    _wake = pyqtSignal()
+
+    def __init__(self, interval=1000, process_every=5):
+        super().__init__()
+        self.interval = interval  # ms between resource samples
+        self.process_every = process_every  # process table refreshes every N samples
+        self.subscribers = {'resources': 0, 'processes': 0}
+        self._lock = threading.Lock()
+        self._ticks = 0
+        self._processes_due = True
+        self.timer = None
+
+        self.thread = QThread()
+        self.moveToThread(self.thread)
+        self.thread.started.connect(self._setup)
+        self._wake.connect(self._reschedule)
+        self.thread.start()
+
+    def _setup(self):
+        # Runs in the collector thread, so the timer and psutil work live there
+        self.sampler = DeviceSampler()
+        self.processes = ProcessTable()
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.collect)
+        self._reschedule()
+
+    def subscribe(self, kind, active):
+        with self._lock:
+            self.subscribers[kind] = max(self.subscribers[kind] + (1 if active else -1), 0)
+            if active and kind == 'processes':
+                self._processes_due = True
+        self._wake.emit()
+
+    def _reschedule(self):
+        if self.timer is None:
+            return
+        with self._lock:
+            active = any(self.subscribers.values())
+        if active and not self.timer.isActive():
+            self.collect()
+            self.timer.start(self.interval)
+        elif not active:
+            self.timer.stop()
+
+    def collect(self):
+        with self._lock:
+            resources = self.subscribers['resources'] > 0
+            processes = self.subscribers['processes'] > 0 and (
+                self._processes_due or self._ticks % self.process_every == 0)
+            self._processes_due = False
+        self._ticks += 1
+
+        if resources:
+            self.resources_ready.emit(self.sampler.refresh())
+        if processes:
+            self.processes_ready.emit([
+                (str(entry.pid), entry.name, f"{entry.cpu_percent:.1f}%",
+                 f"{entry.memory_percent:.1f}%", entry.status)
+                for entry in self.processes.top(TOP_PROCESSES)
+            ])
+
+    def stop(self):
+        if self.thread.isRunning():
+            self.thread.quit()
+            self.thread.wait()
+
+_collector = None
+
+def get_collector():
+    """Collector shared by every device monitoring tab."""
+    global _collector
+    if _collector is None:
+        _collector = DeviceCollector()
+        atexit.register(_collector.stop)
+    return _collector
+
+class CollectorTab(QWidget):
+    """Tab that receives `kind` updates from the shared collector only while it can be seen."""
+    kind = None
+
+    def __init__(self):
+        super().__init__()
+        self.collector = get_collector()
+        self.subscribed = False
+        self.watched_window = None
+
+    def update_subscription(self):
+        window = self.window()
+        active = self.isVisible() and not window.isMinimized()
+        if active != self.subscribed:
+            self.subscribed = active
+            self.collector.subscribe(self.kind, active)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        # Minimizing does not hide child widgets, so watch the window state too
+        if self.watched_window is not self.window():
+            self.watched_window = self.window()
+            self.watched_window.installEventFilter(self)
+        self.update_subscription()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.update_subscription()
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.WindowStateChange:
+            self.update_subscription()
+        return False
 
 class SystemInfoWidget(QWidget):
     def __init__(self):
@@ -22,13 +142,13 @@ class SystemInfoWidget(QWidget):
         """
         layout.addWidget(QLabel(sysinfo))
 
-class ResourceMonitorWidget(QWidget):
+class ResourceMonitorWidget(CollectorTab):
+    kind = 'resources'
+
     def __init__(self):
         super().__init__()
         self.initUI()
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_stats)
-        self.timer.start(1000)  # Update every second
+        self.collector.resources_ready.connect(self.update_stats)
 
     def initUI(self):
         layout = QVBoxLayout(self)
@@ -48,30 +168,33 @@ class ResourceMonitorWidget(QWidget):
         self.disk_bar = QProgressBar()
         layout.addWidget(self.disk_bar)
 
-    def update_stats(self):
+    def update_stats(self, snapshot):
+        if not self.subscribed:
+            return
+
         # CPU
-        cpu_percent = psutil.cpu_percent()
+        cpu_percent = snapshot["cpu"]["cpu_percent"]
         self.cpu_bar.setValue(int(cpu_percent))
         self.cpu_bar.setFormat(f"CPU: {cpu_percent:.1f}%")
 
         # Memory
-        memory = psutil.virtual_memory()
-        self.memory_bar.setValue(int(memory.percent))
-        self.memory_bar.setFormat(f"Memory: {memory.percent:.1f}%")
+        memory_percent = snapshot["memory"]["percent"]
+        self.memory_bar.setValue(int(memory_percent))
+        self.memory_bar.setFormat(f"Memory: {memory_percent:.1f}%")
 
         # Disk
-        disk = psutil.disk_usage('/')
-        disk_percent = disk.percent
+        disk_percent = snapshot["disk"]["percent"]
         self.disk_bar.setValue(int(disk_percent))
         self.disk_bar.setFormat(f"Disk: {disk_percent:.1f}%")
 
-class ProcessMonitorWidget(QWidget):
+class ProcessMonitorWidget(CollectorTab):
+    kind = 'processes'
+
     def __init__(self):
         super().__init__()
+        self.rows = []  # cell texts currently shown
         self.initUI()
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_processes)
-        self.timer.start(5000)  # Update every 5 seconds
+        self.collector.processes_ready.connect(self.update_processes)
 
     def initUI(self):
         layout = QVBoxLayout(self)
@@ -84,26 +207,23 @@ class ProcessMonitorWidget(QWidget):
         ])
         layout.addWidget(self.process_table)
 
-    def update_processes(self):
-        processes = []
-        for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent', 'status']):
-            try:
-                pinfo = proc.info
-                processes.append(pinfo)
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                pass
-
-        # Sort by CPU usage
-        processes.sort(key=lambda x: x['cpu_percent'], reverse=True)
-        
-        # Update table
-        self.process_table.setRowCount(min(len(processes), 10))  # Show top 10 processes
-        for i, proc in enumerate(processes[:10]):
-            self.process_table.setItem(i, 0, QTableWidgetItem(str(proc['pid'])))
-            self.process_table.setItem(i, 1, QTableWidgetItem(proc['name']))
-            self.process_table.setItem(i, 2, QTableWidgetItem(f"{proc['cpu_percent']:.1f}%"))
-            self.process_table.setItem(i, 3, QTableWidgetItem(f"{proc['memory_percent']:.1f}%"))
-            self.process_table.setItem(i, 4, QTableWidgetItem(proc['status']))
+    def update_processes(self, rows):
+        # Rows of top processes by CPU usage, collected off the GUI thread
+
+        # Update table, touching only the cells whose text changed
+        if len(rows) != len(self.rows):
+            self.process_table.setRowCount(len(rows))
+        for i, row in enumerate(rows):
+            previous = self.rows[i] if i < len(self.rows) else ()
+            for column, text in enumerate(row):
+                if column < len(previous) and previous[column] == text:
+                    continue
+                item = self.process_table.item(i, column)
+                if item is None:
+                    self.process_table.setItem(i, column, QTableWidgetItem(text))
+                else:
+                    item.setText(text)
+        self.rows = rows
 
 class DeviceMonitoringWidget(QWidget):
     def __init__(self):
@@ -115,18 +235,18 @@ class DeviceMonitoringWidget(QWidget):
 
         # Create tab widget
         tabs = QTabWidget()
-        
+
         # Add system info tab
         tabs.addTab(SystemInfoWidget(), "System Info")
-        
+
         # Add resource monitor tab
         tabs.addTab(ResourceMonitorWidget(), "Resources")
-        
+
         # Add process monitor tab
         tabs.addTab(ProcessMonitorWidget(), "Processes")
 
         layout.addWidget(tabs)
 
     def closeEvent(self, event):
-        # Clean up any resources
+        # Tabs unsubscribe from the shared collector when they are hidden
         super().closeEvent(event)
@@ -1,12 +1,10 @@
-import requests
 from bs4 import BeautifulSoup
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
                            QPushButton, QLineEdit, QTextEdit, QComboBox)
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from PyQt5.QtGui import QTextCursor
-import json
-import os
-from datetime import datetime
+from ai_assistant import http_client
+from ai_assistant.history import get_store
 
 class SearchWorker(QThread):
     finished = pyqtSignal(list)
@@ -33,7 +31,7 @@ class SearchWorker(QThread):
         # Using DuckDuckGo's HTML
         url = f"https://html.duckduckgo.com/html/?q={self.query}"
         headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(url, headers=headers)
+        response = http_client.get(url, headers=headers)
         soup = BeautifulSoup(response.text, 'html.parser')
         
         results = []
@@ -57,7 +55,7 @@ class SearchWorker(QThread):
             "srsearch": self.query,
             "utf8": 1
         }
-        response = requests.get(url, params=params)
+        response = http_client.get(url, params=params)
         data = response.json()
         
         results = []
@@ -76,7 +74,9 @@ class SearchWorker(QThread):
 class InternetSearchWidget(QWidget):
     def __init__(self):
         super().__init__()
+        self.history = get_store()
         self.search_history = []
+        self.current_search = None
         self.load_history()
         self.initUI()
 
@@ -125,8 +125,8 @@ class InternetSearchWidget(QWidget):
         self.results_display.clear()
         self.results_display.append(f"Searching for: {query}\n")
 
-        # Add to history
-        self.add_to_history(query)
+        # Recorded in history together with its results once the search ends
+        self.current_search = (query, self.search_type_combo.currentText())
 
         # Create and start search worker
         self.search_worker = SearchWorker(query, self.search_type_combo.currentText())
@@ -136,6 +136,7 @@ class InternetSearchWidget(QWidget):
 
     def handle_results(self, results):
         self.results_display.clear()
+        self.add_to_history(results)
         if not results:
             self.results_display.append("No results found.")
             return
@@ -151,15 +152,15 @@ class InternetSearchWidget(QWidget):
     def handle_error(self, error_message):
         self.results_display.append(f"\nError: {error_message}")
         self.search_button.setEnabled(True)
+        self.add_to_history({"error": error_message})
 
-    def add_to_history(self, query):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.search_history.append({
-            'query': query,
-            'timestamp': timestamp,
-            'engine': self.search_type_combo.currentText()
-        })
-        self.save_history()
+    def add_to_history(self, results=None):
+        if self.current_search is None:
+            return
+        query, engine = self.current_search
+        self.current_search = None
+        self.search_history.append(self.history.add_search(query, engine, results))
+        del self.search_history[:-100]
         self.update_history_display()
 
     def update_history_display(self):
@@ -170,17 +171,11 @@ class InternetSearchWidget(QWidget):
             )
 
     def save_history(self):
-        history_file = os.path.join(os.path.expanduser("~"), "search_history.json")
-        with open(history_file, 'w') as f:
-            json.dump(self.search_history[-100:], f)  # Keep last 100 searches
+        self.history.flush()
 
     def load_history(self):
-        history_file = os.path.join(os.path.expanduser("~"), "search_history.json")
-        try:
-            with open(history_file, 'r') as f:
-                self.search_history = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            self.search_history = []
+        # Oldest first, like the list new searches are appended to
+        self.search_history = self.history.searches(limit=100)[::-1]
 
     def closeEvent(self, event):
         self.save_history()
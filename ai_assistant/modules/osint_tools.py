@@ -1,103 +1,35 @@
-import requests
-import socket
-import whois
-import dns.resolver
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
                            QPushButton, QLineEdit, QTextEdit, QTabWidget,
-                           QComboBox, QProgressBar)
+                           QComboBox, QProgressBar, QCheckBox)
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
 import json
-import os
-from datetime import datetime
+from ai_assistant import osint
+from ai_assistant.history import get_store
 
 class OSINTWorker(QThread):
     finished = pyqtSignal(dict)
     progress = pyqtSignal(int)
     error = pyqtSignal(str)
 
-    def __init__(self, target, scan_type):
+    def __init__(self, target, scan_type, options=None):
         super().__init__()
         self.target = target
         self.scan_type = scan_type
+        self.options = options or {}
 
     def run(self):
         try:
-            results = {}
-            if self.scan_type == "Domain Info":
-                results = self.domain_info()
-            elif self.scan_type == "DNS Records":
-                results = self.dns_records()
-            elif self.scan_type == "Port Scan":
-                results = self.port_scan()
-            elif self.scan_type == "Email Info":
-                results = self.email_info()
-            
+            results = osint.run_scan(self.scan_type, self.target, self.options, self.progress.emit)
             self.finished.emit(results)
         except Exception as e:
             self.error.emit(str(e))
 
-    def domain_info(self):
-        self.progress.emit(20)
-        try:
-            w = whois.whois(self.target)
-            self.progress.emit(100)
-            return {
-                "registrar": str(w.registrar),
-                "creation_date": str(w.creation_date),
-                "expiration_date": str(w.expiration_date),
-                "name_servers": w.name_servers,
-                "status": w.status,
-                "emails": w.emails
-            }
-        except Exception as e:
-            raise Exception(f"Error getting domain info: {str(e)}")
-
-    def dns_records(self):
-        records = {}
-        record_types = ['A', 'AAAA', 'MX', 'NS', 'TXT']
-        progress_step = 100 // len(record_types)
-        
-        for i, record_type in enumerate(record_types):
-            try:
-                answers = dns.resolver.resolve(self.target, record_type)
-                records[record_type] = [str(rdata) for rdata in answers]
-            except Exception as e:
-                records[record_type] = [f"Error: {str(e)}"]
-            self.progress.emit((i + 1) * progress_step)
-        
-        return records
-
-    def port_scan(self):
-        common_ports = [21, 22, 23, 25, 53, 80, 110, 143, 443, 465, 587, 993, 995, 3306, 3389, 5432, 8080]
-        results = {}
-        progress_step = 100 // len(common_ports)
-
-        try:
-            ip = socket.gethostbyname(self.target)
-            for i, port in enumerate(common_ports):
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(1)
-                result = sock.connect_ex((ip, port))
-                results[port] = "Open" if result == 0 else "Closed"
-                sock.close()
-                self.progress.emit((i + 1) * progress_step)
-        except Exception as e:
-            raise Exception(f"Error during port scan: {str(e)}")
-
-        return results
-
-    def email_info(self):
-        # Note: This is a placeholder for email OSINT capabilities
-        # In a real implementation, you would want to use appropriate APIs
-        # and follow legal and ethical guidelines
-        return {
-            "message": "Email OSINT functionality requires additional APIs and careful consideration of privacy and legal implications."
-        }
-
 class OSINTWidget(QWidget):
     def __init__(self):
         super().__init__()
+        self.history = get_store()
         self.scan_history = []
+        self.current_scan = None
         self.load_history()
         self.initUI()
 
@@ -129,6 +61,14 @@ class OSINTWidget(QWidget):
         ])
         input_layout.addWidget(self.scan_type_combo)
 
+        self.ports_input = QLineEdit()
+        self.ports_input.setPlaceholderText("Ports (e.g. 22,80,8000-8100)")
+        input_layout.addWidget(self.ports_input)
+
+        self.extra_records_check = QCheckBox("SOA/CAA/SRV")
+        self.extra_records_check.setToolTip("Also query SOA, CAA and SRV records in DNS scans")
+        input_layout.addWidget(self.extra_records_check)
+
         self.scan_button = QPushButton("Start Scan")
         self.scan_button.clicked.connect(self.start_scan)
         input_layout.addWidget(self.scan_button)
@@ -161,16 +101,24 @@ class OSINTWidget(QWidget):
         if not target:
             return
 
+        options = {'extra_records': self.extra_records_check.isChecked()}
+        if self.ports_input.text().strip():
+            try:
+                options['ports'] = osint.parse_ports(self.ports_input.text())
+            except ValueError as e:
+                self.handle_error(str(e))
+                return
+
         self.scan_button.setEnabled(False)
         self.progress_bar.setValue(0)
         self.results_display.clear()
         self.results_display.append(f"Starting scan for: {target}\n")
 
-        # Add to history
-        self.add_to_history(target)
+        # Recorded in history together with its results once the scan ends
+        self.current_scan = (target, self.scan_type_combo.currentText())
 
         # Create and start OSINT worker
-        self.osint_worker = OSINTWorker(target, self.scan_type_combo.currentText())
+        self.osint_worker = OSINTWorker(target, self.scan_type_combo.currentText(), options)
         self.osint_worker.finished.connect(self.handle_results)
         self.osint_worker.progress.connect(self.progress_bar.setValue)
         self.osint_worker.error.connect(self.handle_error)
@@ -181,20 +129,21 @@ class OSINTWidget(QWidget):
         self.results_display.append("Scan Results:\n")
         self.results_display.append(json.dumps(results, indent=2))
         self.scan_button.setEnabled(True)
+        self.add_to_history(results)
 
     def handle_error(self, error_message):
         self.results_display.append(f"\nError: {error_message}")
         self.scan_button.setEnabled(True)
         self.progress_bar.setValue(0)
+        self.add_to_history({"error": error_message})
 
-    def add_to_history(self, target):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.scan_history.append({
-            'target': target,
-            'timestamp': timestamp,
-            'type': self.scan_type_combo.currentText()
-        })
-        self.save_history()
+    def add_to_history(self, results=None):
+        if self.current_scan is None:
+            return
+        target, scan_type = self.current_scan
+        self.current_scan = None
+        self.scan_history.append(self.history.add_scan(target, scan_type, results))
+        del self.scan_history[:-100]
         self.update_history_display()
 
     def update_history_display(self):
@@ -205,17 +154,11 @@ class OSINTWidget(QWidget):
             )
 
     def save_history(self):
-        history_file = os.path.join(os.path.expanduser("~"), "osint_history.json")
-        with open(history_file, 'w') as f:
-            json.dump(self.scan_history[-100:], f)  # Keep last 100 scans
+        self.history.flush()
 
     def load_history(self):
-        history_file = os.path.join(os.path.expanduser("~"), "osint_history.json")
-        try:
-            with open(history_file, 'r') as f:
-                self.scan_history = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            self.scan_history = []
+        # Oldest first, like the list new scans are appended to
+        self.scan_history = self.history.scans(limit=100)[::-1]
 
     def closeEvent(self, event):
         self.save_history()
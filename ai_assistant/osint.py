@@ -0,0 +1,633 @@
+"""
+OSINT lookups shared by the /osint endpoint and the desktop OSINT tools.
+
+analyze() runs the independent stages (WHOIS, one DNS query per record type,
+HTTP headers, IP geolocation) concurrently. Every stage has its own timeout
+and the whole analysis has a deadline; stages that miss it are reported as
+timed out while the rest of the results are still returned. The lookups
+themselves are bounded by the same timeouts, and each kind of stage runs in
+its own thread pool, so a slow WHOIS server cannot starve the DNS stages.
+
+DNS answers, WHOIS records and IP geolocation are cached: DNS for the record
+TTL, the others for a configurable period. Failed lookups are cached for a
+shorter negative TTL.
+
+IP geolocation is answered from the local geoip index when one is built; the
+ipapi.co API is only a fallback (disable it with GEOIP_REMOTE_FALLBACK=0).
+"""
+import asyncio
+import ipaddress
+import os
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from urllib.parse import urlparse
+
+from ai_assistant import geoip, http_client, instrumentation
+from ai_assistant.cache import TTLCache
+from ai_assistant.lazy import lazy_import
+
+whois = lazy_import('whois')
+dns_resolver = lazy_import('dns.resolver')
+
+# Seconds allowed per stage, and for the whole analysis
+STAGE_TIMEOUTS = {
+    'whois': float(os.environ.get('OSINT_WHOIS_TIMEOUT', 8)),
+    'dns': float(os.environ.get('OSINT_DNS_TIMEOUT', 3)),
+    'headers': float(os.environ.get('OSINT_HTTP_TIMEOUT', 5)),
+    'ip_info': float(os.environ.get('OSINT_HTTP_TIMEOUT', 5))
+}
+DEADLINE = float(os.environ.get('OSINT_DEADLINE', 10))
+DNS_RECORD_TYPES = ['A', 'MX', 'NS']
+SCAN_RECORD_TYPES = ['A', 'AAAA', 'MX', 'NS', 'TXT']
+EXTRA_RECORD_TYPES = ['SOA', 'CAA', 'SRV']
+
+# Lookup caches (seconds)
+WHOIS_TTL = float(os.environ.get('OSINT_WHOIS_TTL', 24 * 3600))
+GEO_TTL = float(os.environ.get('OSINT_GEO_TTL', 24 * 3600))
+NEGATIVE_TTL = float(os.environ.get('OSINT_NEGATIVE_TTL', 60))
+CACHE_ENTRIES = int(os.environ.get('OSINT_CACHE_ENTRIES', 10000))
+GEOIP_REMOTE_FALLBACK = os.environ.get('GEOIP_REMOTE_FALLBACK', '1') != '0'
+
+dns_cache = TTLCache(CACHE_ENTRIES)
+whois_cache = TTLCache(CACHE_ENTRIES)
+geo_cache = TTLCache(CACHE_ENTRIES)
+
+# Bulk analyses wait on stage futures, so they get their own pool
+BULK_CONCURRENCY = int(os.environ.get('OSINT_BULK_CONCURRENCY', 8))
+
+# Analyses whose stages can all run at once: a full bulk run plus interactive requests
+STAGE_SLOTS = BULK_CONCURRENCY + int(os.environ.get('OSINT_INTERACTIVE_SLOTS', 8))
+STAGES_PER_ANALYSIS = {'whois': 1, 'dns': len(DNS_RECORD_TYPES), 'headers': 1, 'ip_info': 1}
+
+# Threads per kind of stage; stages stuck on one service only queue behind each other
+STAGE_WORKERS = {kind: int(os.environ.get(f'OSINT_{kind.upper()}_WORKERS', count * STAGE_SLOTS))
+                 for kind, count in STAGES_PER_ANALYSIS.items()}
+_stage_executors = {kind: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'osint-{kind}')
+                    for kind, workers in STAGE_WORKERS.items()}
+
+_bulk_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('OSINT_BULK_WORKERS', 32)),
+                                    thread_name_prefix='osint-bulk')
+
+
+def normalize_target(target):
+    """Return (url, domain) for a user supplied target; domain is empty if invalid."""
+    target = target.strip()
+    # Add http:// if no protocol specified
+    if not target.startswith(('http://', 'https://')):
+        target = 'http://' + target
+    parsed_url = urlparse(target)
+    domain = parsed_url.netloc if parsed_url.netloc else parsed_url.path
+    return target, domain
+
+
+# TCP port checks
+DEFAULT_PORTS = [21, 22, 23, 25, 53, 80, 110, 143, 443, 465, 587, 993, 995, 3306, 3389, 5432, 8080]
+PORT_SCAN_CONCURRENCY = int(os.environ.get('PORT_SCAN_CONCURRENCY', 200))
+PORT_SCAN_TIMEOUT = float(os.environ.get('PORT_SCAN_TIMEOUT', 1))
+
+# Upper bounds for scan options supplied by API clients
+PORT_SCAN_MAX_CONCURRENCY = int(os.environ.get('PORT_SCAN_MAX_CONCURRENCY', 500))
+PORT_SCAN_MAX_TIMEOUT = float(os.environ.get('PORT_SCAN_MAX_TIMEOUT', 10))
+PORT_SCAN_MAX_PORTS = int(os.environ.get('PORT_SCAN_MAX_PORTS', 4096))
+
+
+def parse_ports(spec):
+    """Parse '22,80,8000-8100' into a sorted list of unique ports."""
+    ports = set()
+    for part in spec.replace(' ', '').split(','):
+        if not part:
+            continue
+        if '-' in part:
+            first, last = (int(p) for p in part.split('-', 1))
+        else:
+            first = last = int(part)
+        if not 1 <= first <= last <= 65535:
+            raise ValueError(f"Invalid port range: {part}")
+        ports.update(range(first, last + 1))
+    return sorted(ports)
+
+
+def positive_option(name, value, kind):
+    """value converted with kind; raises ValueError unless it is a positive number."""
+    try:
+        if isinstance(value, bool):
+            raise TypeError(name)
+        value = kind(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"{name} must be a number") from None
+    if not value > 0:
+        raise ValueError(f"{name} must be positive")
+    return value
+
+
+def deadline_option(value):
+    """A client's deadline in seconds, capped at DEADLINE (DEADLINE if not given).
+
+    Callers may ask for a tighter deadline, never a longer one. Raises
+    ValueError unless it is a positive number.
+    """
+    if value is None:
+        return DEADLINE
+    return min(positive_option('deadline', value, float), DEADLINE)
+
+
+def scan_options(options):
+    """Validate scan options from an API client, clamped to the server's limits.
+
+    Raises ValueError for anything that is not usable.
+    """
+    if options is None:
+        return {}
+    if not isinstance(options, dict):
+        raise ValueError("options must be an object")
+    options = dict(options)
+
+    ports = options.get('ports')
+    if isinstance(ports, str):
+        ports = parse_ports(ports)
+    if ports:
+        if not isinstance(ports, list):
+            raise ValueError("ports must be a list or a port specification")
+        ports = sorted({positive_option('port', port, int) for port in ports})
+        if ports[-1] > 65535:
+            raise ValueError(f"Invalid port: {ports[-1]}")
+        if len(ports) > PORT_SCAN_MAX_PORTS:
+            raise ValueError(f"At most {PORT_SCAN_MAX_PORTS} ports can be scanned at once")
+        options['ports'] = ports
+
+    if options.get('concurrency') is not None:
+        options['concurrency'] = min(positive_option('concurrency', options['concurrency'], int), PORT_SCAN_MAX_CONCURRENCY)
+    if options.get('timeout') is not None:
+        options['timeout'] = min(positive_option('timeout', options['timeout'], float), PORT_SCAN_MAX_TIMEOUT)
+    if options.get('deadline') is not None:
+        options['deadline'] = deadline_option(options['deadline'])
+    return options
+
+
+async def _scan_ports(hosts, ports, concurrency, timeout, on_result):
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    results = {}
+    total = len(hosts) * len(ports)
+    done = 0
+
+    def report(host, port, status):
+        nonlocal done
+        done += 1
+        results[host][port] = status
+        if on_result:
+            on_result(host, port, status, done, total)
+
+    async def check(host, address, port):
+        async with semaphore:
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection(address, port), timeout)
+                writer.close()
+                status = "Open"
+            except asyncio.TimeoutError:
+                status = "Filtered"
+            except OSError:
+                status = "Closed"
+        report(host, port, status)
+
+    async def scan_host(host):
+        results[host] = {}
+        try:
+            infos = await loop.getaddrinfo(host, None, family=socket.AF_INET, type=socket.SOCK_STREAM)
+            address = infos[0][4][0]
+        except OSError as e:
+            for port in ports:
+                report(host, port, f"Error: {e}")
+            return
+        await asyncio.gather(*(check(host, address, port) for port in ports))
+
+    await asyncio.gather(*(scan_host(host) for host in hosts))
+    # Ports in ascending order regardless of completion order
+    return {host: dict(sorted(statuses.items())) for host, statuses in results.items()}
+
+
+def scan_ports(hosts, ports=None, concurrency=None, timeout=None, on_result=None):
+    """TCP connect check of every host/port pair, at most `concurrency` at a time.
+
+    Returns {host: {port: 'Open' | 'Closed' | 'Filtered'}}. on_result(host,
+    port, status, done, total) is called as each check completes, so a whole
+    scan takes roughly one timeout window per `concurrency` ports.
+    """
+    return asyncio.run(_scan_ports(
+        list(hosts),
+        list(ports or DEFAULT_PORTS),
+        concurrency or PORT_SCAN_CONCURRENCY,
+        timeout or PORT_SCAN_TIMEOUT,
+        on_result))
+
+
+def domain_key(target):
+    """Normalized domain used to spot duplicate targets."""
+    _, domain = normalize_target(target)
+    domain = domain.rsplit('@', 1)[-1].lower().rstrip('.')
+    return domain
+
+
+def _cached(cache, key):
+    """Return (hit, value) and re-raise a cached failure."""
+    entry = cache.get(key)
+    if entry is None:
+        return False, None
+    ok, value = entry
+    if not ok:
+        raise value.with_traceback(None)
+    return True, value
+
+
+WHOIS_FIELDS = ('registrar', 'creation_date', 'updated_date', 'expiration_date')
+
+
+def _whois_empty(record):
+    """True for an answer without registration data, e.g. a rate-limited or unregistered lookup."""
+    return not any(record.get(field) for field in WHOIS_FIELDS)
+
+
+def lookup_whois(domain):
+    """Raw WHOIS record for domain, cached for WHOIS_TTL (NEGATIVE_TTL if it has no data)."""
+    key = domain.lower()
+    hit, record = _cached(whois_cache, key)
+    if hit:
+        return record
+    try:
+        record = whois.whois(domain, timeout=STAGE_TIMEOUTS['whois'])
+    except Exception as e:
+        whois_cache.put(key, (False, e), NEGATIVE_TTL)
+        raise
+    whois_cache.put(key, (True, record), NEGATIVE_TTL if _whois_empty(record) else WHOIS_TTL)
+    return record
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def configure_resolver(nameservers=None, port=53):
+    """Replace the shared resolver, e.g. to point it at specific nameservers."""
+    global _resolver
+    resolver = dns_resolver.Resolver(configure=not nameservers)
+    if nameservers:
+        resolver.nameservers = list(nameservers)
+        resolver.port = port
+    with _resolver_lock:
+        _resolver = resolver
+    dns_cache.clear()
+    return resolver
+
+
+def get_resolver():
+    """The long-lived resolver shared by every lookup (system configuration by default)."""
+    with _resolver_lock:
+        resolver = _resolver
+    return resolver if resolver is not None else configure_resolver()
+
+
+def resolve(domain, record_type, timeout=None):
+    """DNS answer for domain/record_type, cached for the record TTL."""
+    key = (domain.lower().rstrip('.'), record_type)
+    hit, answer = _cached(dns_cache, key)
+    if hit:
+        return answer
+    try:
+        answer = get_resolver().resolve(domain, record_type, lifetime=timeout or STAGE_TIMEOUTS['dns'])
+    except (dns_resolver.NXDOMAIN, dns_resolver.NoAnswer) as e:
+        # Only authoritative negatives are cached; timeouts are worth retrying
+        dns_cache.put(key, (False, e), NEGATIVE_TTL)
+        raise
+    dns_cache.put(key, (True, answer), answer.rrset.ttl)
+    return answer
+
+
+def resolve_records(domain, record_types=None, timeout=None, on_result=None):
+    """Resolve several record types for domain in parallel.
+
+    Returns {record_type: [rdata, ...]} with failures as ['Error: ...'].
+    Every query has its own timeout, so the whole lookup takes about as long
+    as the slowest query. on_result(record_type, done, total) fires as each
+    query completes.
+    """
+    record_types = list(record_types or SCAN_RECORD_TYPES)
+    timeout = timeout or STAGE_TIMEOUTS['dns']
+    futures = {_stage_executors['dns'].submit(resolve, domain, record_type, timeout): record_type
+               for record_type in record_types}
+
+    records = {}
+    for done, future in enumerate(as_completed(futures), 1):
+        record_type = futures[future]
+        try:
+            records[record_type] = [str(rdata) for rdata in future.result()]
+        except Exception as e:
+            records[record_type] = [f"Error: {str(e)}"]
+        if on_result:
+            on_result(record_type, done, len(record_types))
+
+    return {record_type: records[record_type] for record_type in record_types}
+
+
+def geolocate(ip, timeout=None):
+    """Local geoip record for ip, else the ipapi.co record cached for GEO_TTL
+    (error answers for NEGATIVE_TTL)."""
+    record = geoip.lookup(ip)
+    if record is not None:
+        return record
+    if not GEOIP_REMOTE_FALLBACK:
+        return {"ip": ip, "error": True, "reason": "Not in local GeoIP database"}
+    hit, record = _cached(geo_cache, ip)
+    if hit:
+        return record
+    record = http_client.get(f"https://ipapi.co/{ip}/json/", timeout=timeout or STAGE_TIMEOUTS['ip_info']).json()
+    geo_cache.put(ip, (True, record), NEGATIVE_TTL if record.get("error") else GEO_TTL)
+    return record
+
+
+def cache_stats():
+    return {
+        "dns": dns_cache.stats(),
+        "whois": whois_cache.stats(),
+        "geo": geo_cache.stats()
+    }
+
+
+def clear_caches():
+    for cache in (dns_cache, whois_cache, geo_cache):
+        cache.clear()
+
+
+def whois_info(domain):
+    domain_info = lookup_whois(domain)
+    return {
+        "registrar": str(domain_info.registrar) if domain_info.registrar else "N/A",
+        "creation_date": str(domain_info.creation_date) if domain_info.creation_date else "N/A",
+        "expiration_date": str(domain_info.expiration_date) if domain_info.expiration_date else "N/A",
+        "name_servers": domain_info.name_servers if isinstance(domain_info.name_servers, list) else [str(domain_info.name_servers)] if domain_info.name_servers else ["N/A"]
+    }
+
+
+def dns_records(domain, record_type, timeout=None):
+    records = resolve(domain, record_type, timeout)
+    if record_type == 'MX':
+        return [str(record.exchange) for record in records]
+    return [str(record) for record in records]
+
+
+def http_headers(url, timeout=None):
+    response = http_client.head(url, timeout=timeout or STAGE_TIMEOUTS['headers'], allow_redirects=True)
+    return dict(response.headers)
+
+
+def resolve_ip(domain):
+    """First IPv4 address of domain, through the shared resolver so it is cached and time limited."""
+    try:
+        return str(ipaddress.ip_address(domain))
+    except ValueError:
+        return str(resolve(domain, 'A')[0])
+
+
+def ip_info(domain, timeout=None):
+    ip = resolve_ip(domain)
+    ip_response = geolocate(ip, timeout)
+    return {
+        "ip": ip,
+        "country": ip_response.get("country_name", "N/A"),
+        "region": ip_response.get("region", "N/A"),
+        "city": ip_response.get("city", "N/A"),
+        "org": ip_response.get("org", "N/A")
+    }
+
+
+class _Stage:
+    """One stage of an analysis; `started` is set when a worker picks it up."""
+
+    def __init__(self, timeout_key, func, args):
+        self.timeout_key = timeout_key
+        self.func = func
+        self.args = args
+        self.started = None
+
+    def run(self):
+        self.started = time.perf_counter()
+        try:
+            return self.func(*self.args), None, time.perf_counter() - self.started
+        except Exception as e:
+            return None, e, time.perf_counter() - self.started
+
+    def result(self, future, deadline):
+        """Wait for the stage until its timeout, counted from when it started running, or the deadline."""
+        timeout = STAGE_TIMEOUTS[self.timeout_key]
+        while True:
+            now = time.perf_counter()
+            # While the stage is still queued its clock has not started
+            end = min((self.started or now) + timeout, deadline)
+            if now >= end:
+                # Stages that finished while earlier ones were collected still count
+                return future.result(timeout=0)
+            try:
+                return future.result(timeout=end - now)
+            except FutureTimeout:
+                continue
+
+
+def analyze(target, deadline=None, on_stage=None):
+    """Run every OSINT stage for target concurrently and collect what finishes in time.
+
+    on_stage(name, done, total) is called as each stage is collected.
+    """
+    url, domain = normalize_target(target)
+    if not domain:
+        raise ValueError("Invalid domain")
+
+    started = time.perf_counter()
+    deadline = started + (deadline if deadline is not None else DEADLINE)
+
+    stages = {'whois': _Stage('whois', whois_info, (domain,))}
+    for record_type in DNS_RECORD_TYPES:
+        stages[f"dns_{record_type}"] = _Stage('dns', dns_records, (domain, record_type))
+    stages['headers'] = _Stage('headers', http_headers, (url,))
+    stages['ip_info'] = _Stage('ip_info', ip_info, (domain,))
+
+    futures = {name: _stage_executors[stage.timeout_key].submit(stage.run)
+               for name, stage in stages.items()}
+
+    outcomes = {}
+    stage_report = {}
+    for name, stage in stages.items():
+        try:
+            value, error, elapsed = stage.result(futures[name], deadline)
+        except FutureTimeout:
+            # A queued stage is dropped; a running one ends at its own network timeout
+            futures[name].cancel()
+            elapsed = time.perf_counter() - (stage.started or started)
+            outcomes[name] = (None, TimeoutError(f"timed out after {elapsed:.1f}s"))
+            stage_report[name] = {"status": "timeout", "elapsed_ms": round(elapsed * 1000, 1)}
+        else:
+            outcomes[name] = (value, error)
+            stage_report[name] = {"status": "error" if error else "ok", "elapsed_ms": round(elapsed * 1000, 1)}
+        instrumentation.record_stage(f"osint.{name}", elapsed)
+        if on_stage:
+            on_stage(name, len(stage_report), len(stages))
+
+    results = {
+        "domain_info": {},
+        "dns_records": {},
+        "headers": {},
+        "ip_info": {}
+    }
+
+    value, error = outcomes['whois']
+    results["domain_info"] = {"error": f"WHOIS lookup failed: {str(error)}"} if error else value
+
+    for record_type in DNS_RECORD_TYPES:
+        value, error = outcomes[f"dns_{record_type}"]
+        results["dns_records"][record_type] = [f"Error: {str(error)}"] if error else value
+
+    value, error = outcomes['headers']
+    results["headers"] = {"error": f"Failed to get headers: {str(error)}"} if error else value
+
+    value, error = outcomes['ip_info']
+    results["ip_info"] = {"error": f"IP lookup failed: {str(error)}"} if error else value
+
+    return {
+        "target": url,
+        "results": results,
+        "stages": stage_report,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+def _analyze_entry(target, deadline):
+    try:
+        return {"success": True, **analyze(target, deadline=deadline)}
+    except Exception as e:
+        return {"target": target, "error": str(e)}
+
+
+def analyze_many(targets, concurrency=None, deadline=None):
+    """Analyze an iterable of targets, yielding each result as soon as it finishes.
+
+    At most `concurrency` targets are in flight and the input is consumed
+    lazily, so apart from the set of seen domains memory does not grow with
+    the length of the list. Targets that normalize to an already seen domain
+    are skipped. A final summary entry reports the counts.
+    """
+    concurrency = max(1, min(concurrency or BULK_CONCURRENCY, BULK_CONCURRENCY))
+    targets = iter(targets)
+    seen = set()
+    pending = set()
+    counts = {"submitted": 0, "duplicates": 0, "invalid": 0}
+
+    def fill():
+        for target in targets:
+            target = target.strip()
+            if not target:
+                continue
+            key = domain_key(target)
+            if not key:
+                counts["invalid"] += 1
+                yield {"target": target, "error": "Invalid domain"}
+                continue
+            if key in seen:
+                counts["duplicates"] += 1
+                continue
+            seen.add(key)
+            counts["submitted"] += 1
+            pending.add(_bulk_executor.submit(_analyze_entry, target, deadline))
+            if len(pending) >= concurrency:
+                return
+
+    while True:
+        yield from fill()
+        if not pending:
+            break
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.discard(future)
+            yield future.result()
+
+    yield {"summary": counts}
+
+
+# Scans offered by the desktop OSINT tools and the /osint/jobs API
+def domain_scan(target, options, progress):
+    progress(20)
+    try:
+        w = lookup_whois(target)
+        progress(100)
+        return {
+            "registrar": str(w.registrar),
+            "creation_date": str(w.creation_date),
+            "expiration_date": str(w.expiration_date),
+            "name_servers": w.name_servers,
+            "status": w.status,
+            "emails": w.emails
+        }
+    except Exception as e:
+        raise Exception(f"Error getting domain info: {str(e)}")
+
+
+def dns_scan(target, options, progress):
+    record_types = list(SCAN_RECORD_TYPES)
+    if options.get('extra_records'):
+        record_types += EXTRA_RECORD_TYPES
+
+    def on_result(record_type, done, total):
+        progress(done * 100 // total)
+
+    return resolve_records(target, record_types, on_result=on_result)
+
+
+def port_scan(target, options, progress):
+    # Several hosts may be given, separated by commas or spaces
+    hosts = target.replace(',', ' ').split()
+    ports = options.get('ports') or DEFAULT_PORTS
+
+    def on_result(host, port, status, done, total):
+        progress(done * 100 // total)
+
+    try:
+        results = scan_ports(
+            hosts, ports,
+            concurrency=options.get('concurrency'),
+            timeout=options.get('timeout'),
+            on_result=on_result)
+    except Exception as e:
+        raise Exception(f"Error during port scan: {str(e)}")
+
+    return results[hosts[0]] if len(hosts) == 1 else results
+
+
+def email_scan(target, options, progress):
+    # Note: This is a placeholder for email OSINT capabilities
+    # In a real implementation, you would want to use appropriate APIs
+    # and follow legal and ethical guidelines
+    return {
+        "message": "Email OSINT functionality requires additional APIs and careful consideration of privacy and legal implications."
+    }
+
+
+def analysis_scan(target, options, progress):
+    deadline = min(float(options.get('deadline', DEADLINE)), DEADLINE)
+    return analyze(target, deadline, on_stage=lambda name, done, total: progress(done * 100 // total))
+
+
+# Scan type -> scan(target, options, progress)
+SCAN_TYPES = {
+    "Domain Info": domain_scan,
+    "DNS Records": dns_scan,
+    "Port Scan": port_scan,
+    "Email Info": email_scan,
+    "Full Analysis": analysis_scan
+}
+
+
+def run_scan(scan_type, target, options=None, progress=None):
+    """Run one of SCAN_TYPES; progress(percent) is called as it advances."""
+    if scan_type not in SCAN_TYPES:
+        raise ValueError(f"Unknown scan type: {scan_type}")
+    return SCAN_TYPES[scan_type](target, options or {}, progress or (lambda percent: None))
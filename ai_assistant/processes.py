@@ -0,0 +1,90 @@
+"""
+Incremental process table shared by the desktop process monitor.
+
+psutil.Process objects are kept per PID between refreshes, so cpu_percent()
+measures the time since the previous refresh instead of returning 0 for a
+brand new object. An entry is replaced when is_running() finds that its
+PID now belongs to a process with a different create time (PID reuse).
+Per-process reads are batched with oneshot() and the busiest processes are
+picked with a heap, not a full sort.
+"""
+import heapq
+import threading
+
+from ai_assistant.lazy import lazy_import
+
+psutil = lazy_import('psutil')
+
+TOP_PROCESSES = 10
+
+
+class ProcessEntry:
+    __slots__ = ('process', 'create_time', 'name', 'cpu_percent', 'memory_percent', 'rss', 'status')
+
+    def __init__(self, process):
+        self.process = process
+        self.create_time = process.create_time()
+        self.name = process.name()
+        self.cpu_percent = 0.0
+        self.memory_percent = 0.0
+        self.rss = 0
+        self.status = ''
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+
+class ProcessTable:
+    """Per-PID cache of psutil.Process objects refreshed in place."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _add(self, pid):
+        entry = ProcessEntry(psutil.Process(pid))
+        # First cpu_percent() call only sets the baseline
+        entry.process.cpu_percent(None)
+        self._entries[pid] = entry
+        return entry
+
+    @staticmethod
+    def _update(entry, total_memory):
+        """Read entry's counters; False if its PID now belongs to another process."""
+        process = entry.process
+        # Compares against a fresh read of the PID's create time
+        if not process.is_running():
+            return False
+        with process.oneshot():
+            entry.cpu_percent = process.cpu_percent(None)
+            entry.rss = process.memory_info().rss
+            entry.status = process.status()
+        entry.memory_percent = entry.rss * 100.0 / total_memory
+        return True
+
+    def refresh(self):
+        """Update every process and return the live entries."""
+        with self._lock:
+            total_memory = psutil.virtual_memory().total
+            pids = psutil.pids()
+            for pid in self._entries.keys() - set(pids):
+                del self._entries[pid]
+
+            for pid in pids:
+                try:
+                    entry = self._entries.get(pid) or self._add(pid)
+                    if not self._update(entry, total_memory):
+                        self._update(self._add(pid), total_memory)
+                except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                    self._entries.pop(pid, None)
+                except psutil.AccessDenied:
+                    pass
+            return list(self._entries.values())
+
+    def top(self, count=TOP_PROCESSES, key='cpu_percent'):
+        """Refresh and return the `count` entries with the largest `key`."""
+        return heapq.nlargest(count, self.refresh(), key=lambda entry: getattr(entry, key))
@@ -41,29 +41,39 @@ async function handleVisualDetection() {
         resultData.style.color = '#ffffff';
         resultImage.style.display = 'none';
 
-        const base64Image = await fileToBase64(fileInput.files[0]);
-        
-        const response = await fetch('/visual_detection', {
+        // Send the file as a raw body and get the annotated JPEG back as bytes
+        const file = fileInput.files[0];
+        const response = await fetch('/visual_detection?response=image', {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json',
+                'Content-Type': file.type || 'application/octet-stream',
             },
-            body: JSON.stringify({ image: base64Image }),
+            body: file,
         });
 
+        if (response.status === 413) {
+            throw new Error('Image is too large');
+        }
+
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
 
-        const data = await response.json();
-        
-        if (data.error) {
+        // Errors still come back as JSON
+        if (!response.headers.get('Content-Type').startsWith('image/')) {
+            const data = await response.json();
             throw new Error(data.error);
         }
 
-        resultImage.src = 'data:image/jpeg;base64,' + data.processed_image;
+        const detections = JSON.parse(response.headers.get('X-Detections') || '[]');
+        const imageBlob = await response.blob();
+
+        if (resultImage.src.startsWith('blob:')) {
+            URL.revokeObjectURL(resultImage.src);
+        }
+        resultImage.src = URL.createObjectURL(imageBlob);
         resultImage.style.display = 'block';
-        resultData.textContent = JSON.stringify(data.detections, null, 2);
+        resultData.textContent = JSON.stringify(detections, null, 2);
         resultData.style.color = '#4CAF50';
     } catch (error) {
         showError('visual-data', error.message);
@@ -72,6 +82,117 @@ async function handleVisualDetection() {
 }
 
 // Device Status
+function renderDeviceStatus(data) {
+    const resultData = document.getElementById('device-status');
+
+    // Format sizes to human-readable format
+    const formatBytes = (bytes) => {
+        const sizes = ['B', 'KB', 'MB', 'GB', 'TB'];
+        if (bytes === 0) return '0 B';
+        const i = parseInt(Math.floor(Math.log(bytes) / Math.log(1024)));
+        return Math.round(bytes / Math.pow(1024, i), 2) + ' ' + sizes[i];
+    };
+
+    // Format the data for display
+    const formattedData = {
+        System: {
+            OS: `${data.system.system} ${data.system.version}`,
+            Machine: data.system.machine,
+            Processor: data.system.processor
+        },
+        CPU: {
+            'Physical Cores': data.cpu.physical_cores,
+            'Total Cores': data.cpu.total_cores,
+            'CPU Usage': `${data.cpu.cpu_percent}%`,
+            'CPU Frequency': `${Math.round(data.cpu.frequency.current)} MHz`
+        },
+        Memory: {
+            'Total': formatBytes(data.memory.total),
+            'Used': formatBytes(data.memory.used),
+            'Available': formatBytes(data.memory.available),
+            'Usage': `${data.memory.percent}%`
+        },
+        Disk: {
+            'Total': formatBytes(data.disk.total),
+            'Used': formatBytes(data.disk.used),
+            'Free': formatBytes(data.disk.free),
+            'Usage': `${data.disk.percent}%`
+        }
+    };
+
+    // Add battery info if available
+    if (data.battery) {
+        formattedData.Battery = {
+            'Level': `${data.battery.percent}%`,
+            'Power Status': data.battery.power_plugged ? 'Plugged In' : 'On Battery',
+            'Time Left': typeof data.battery.time_left === 'number' 
+                ? `${Math.round(data.battery.time_left / 60)} minutes` 
+                : data.battery.time_left
+        };
+    }
+
+    // Create a formatted string
+    let output = '';
+    for (const [section, items] of Object.entries(formattedData)) {
+        output += `${section}:\n`;
+        for (const [key, value] of Object.entries(items)) {
+            output += `  ${key}: ${value}\n`;
+        }
+        output += '\n';
+    }
+
+    resultData.textContent = output;
+    resultData.style.color = '#4CAF50';
+}
+
+// Live device status over Server-Sent Events: static fields arrive once, then only changed metrics
+let deviceStream = null;
+
+function mergeDeep(target, changes) {
+    for (const [key, value] of Object.entries(changes)) {
+        if (value && typeof value === 'object' && !Array.isArray(value)
+                && target[key] && typeof target[key] === 'object') {
+            mergeDeep(target[key], value);
+        } else if (value === null) {
+            delete target[key];
+        } else {
+            target[key] = value;
+        }
+    }
+    return target;
+}
+
+function toggleDeviceStream() {
+    const button = document.getElementById('device-live');
+
+    if (deviceStream) {
+        deviceStream.close();
+        deviceStream = null;
+        button.textContent = 'Live';
+        return;
+    }
+
+    const state = {};
+    deviceStream = new EventSource('/device_status/stream?interval=2');
+    button.textContent = 'Stop Live';
+
+    deviceStream.addEventListener('static', (event) => {
+        mergeDeep(state, JSON.parse(event.data));
+    });
+    deviceStream.addEventListener('metrics', (event) => {
+        mergeDeep(state, JSON.parse(event.data));
+        renderDeviceStatus(state);
+    });
+    deviceStream.onerror = () => {
+        // EventSource reconnects on its own; a new connection resends the static fields
+        if (deviceStream.readyState === EventSource.CLOSED) {
+            showError('device-status', 'Live device status disconnected');
+            deviceStream = null;
+            button.textContent = 'Live';
+        }
+    };
+}
+
 async function checkDeviceStatus() {
     const resultData = document.getElementById('device-status');
     
@@ -91,64 +212,7 @@ async function checkDeviceStatus() {
             throw new Error(data.error);
         }
 
-        // Format sizes to human-readable format
-        const formatBytes = (bytes) => {
-            const sizes = ['B', 'KB', 'MB', 'GB', 'TB'];
-            if (bytes === 0) return '0 B';
-            const i = parseInt(Math.floor(Math.log(bytes) / Math.log(1024)));
-            return Math.round(bytes / Math.pow(1024, i), 2) + ' ' + sizes[i];
-        };
-
-        // Format the data for display
-        const formattedData = {
-            System: {
-                OS: `${data.system.system} ${data.system.version}`,
-                Machine: data.system.machine,
-                Processor: data.system.processor
-            },
-            CPU: {
-                'Physical Cores': data.cpu.physical_cores,
-                'Total Cores': data.cpu.total_cores,
-                'CPU Usage': `${data.cpu.cpu_percent}%`,
-                'CPU Frequency': `${Math.round(data.cpu.frequency.current)} MHz`
-            },
-            Memory: {
-                'Total': formatBytes(data.memory.total),
-                'Used': formatBytes(data.memory.used),
-                'Available': formatBytes(data.memory.available),
-                'Usage': `${data.memory.percent}%`
-            },
-            Disk: {
-                'Total': formatBytes(data.disk.total),
-                'Used': formatBytes(data.disk.used),
-                'Free': formatBytes(data.disk.free),
-                'Usage': `${data.disk.percent}%`
-            }
-        };
-
-        // Add battery info if available
-        if (data.battery) {
-            formattedData.Battery = {
-                'Level': `${data.battery.percent}%`,
-                'Power Status': data.battery.power_plugged ? 'Plugged In' : 'On Battery',
-                'Time Left': typeof data.battery.time_left === 'number' 
-                    ? `${Math.round(data.battery.time_left / 60)} minutes` 
-                    : data.battery.time_left
-            };
-        }
-
-        // Create a formatted string
-        let output = '';
-        for (const [section, items] of Object.entries(formattedData)) {
-            output += `${section}:\n`;
-            for (const [key, value] of Object.entries(items)) {
-                output += `  ${key}: ${value}\n`;
-            }
-            output += '\n';
-        }
-
-        resultData.textContent = output;
-        resultData.style.color = '#4CAF50';
+        renderDeviceStatus(data);
     } catch (error) {
         showError('device-status', error.message);
     }
@@ -192,13 +256,3 @@ async function handleOSINT() {
         showError('osint-data', error.message);
     }
 }
-
-// Utility function to convert File to base64
-function fileToBase64(file) {
-    return new Promise((resolve, reject) => {
-        const reader = new FileReader();
-        reader.readAsDataURL(file);
-        reader.onload = () => resolve(reader.result);
-        reader.onerror = error => reject(error);
-    });
-}
\ No newline at end of file
@@ -0,0 +1,173 @@
+"""
+Fixed-size, multi-resolution time-series store for numeric metrics.
+
+Samples go into a raw ring buffer and are folded into downsampled tiers
+(per-bucket min/avg/max) as they arrive. Every tier is a set of
+preallocated NumPy arrays, so memory use is fixed at construction and a
+range query is a couple of searchsorted calls plus vectorized reductions.
+"""
+import threading
+
+from ai_assistant.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+
+class Tier:
+    """Ring buffer of buckets `step` seconds wide (step 0 keeps raw samples)."""
+
+    def __init__(self, name, step, capacity, width):
+        self.name = name
+        self.step = step
+        self.capacity = capacity
+        self.times = np.full(capacity, np.nan)
+        self.min = np.full((capacity, width), np.nan)
+        self.max = np.full((capacity, width), np.nan)
+        self.sum = np.zeros((capacity, width))
+        self.count = np.zeros((capacity, width), dtype=np.int64)
+        self.head = 0
+        self.size = 0
+
+    def append(self, timestamp, minimum, maximum, total, count):
+        i = self.head
+        self.times[i] = timestamp
+        self.min[i] = minimum
+        self.max[i] = maximum
+        self.sum[i] = total
+        self.count[i] = count
+        self.head = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def order(self):
+        """Slot indices from oldest to newest."""
+        if self.size < self.capacity:
+            return np.arange(self.size)
+        return (np.arange(self.capacity) + self.head) % self.capacity
+
+    def oldest(self):
+        if not self.size:
+            return None
+        return self.times[0 if self.size < self.capacity else self.head]
+
+
+class TimeSeriesStore:
+    """Metrics sampled together, kept raw and in min/avg/max tiers.
+
+    tiers is a list of (name, step seconds, capacity) from finest to
+    coarsest; the first entry should have step 0 and holds raw samples.
+    """
+
+    def __init__(self, metrics, tiers):
+        self.metrics = list(metrics)
+        self._index = {name: i for i, name in enumerate(self.metrics)}
+        width = len(self.metrics)
+        self.tiers = [Tier(name, step, capacity, width) for name, step, capacity in tiers]
+        # Bucket currently being filled for each downsampled tier: [bucket, min, max, sum, count]
+        self._open = [None] * len(self.tiers)
+        self._lock = threading.Lock()
+
+    def nbytes(self):
+        return sum(tier.times.nbytes + tier.min.nbytes + tier.max.nbytes + tier.sum.nbytes + tier.count.nbytes
+                   for tier in self.tiers)
+
+    def record(self, timestamp, values):
+        """Add one sample; values maps metric name to a number (missing/None is NaN)."""
+        row = np.array([np.nan if values.get(name) is None else float(values[name]) for name in self.metrics])
+        present = ~np.isnan(row)
+        filled = np.where(present, row, 0.0)
+        count = present.astype(np.int64)
+
+        with self._lock:
+            for i, tier in enumerate(self.tiers):
+                if not tier.step:
+                    tier.append(timestamp, row, row, filled, count)
+                    continue
+                bucket = timestamp // tier.step * tier.step
+                current = self._open[i]
+                if current is not None and current[0] != bucket:
+                    tier.append(*current)
+                    current = None
+                if current is None:
+                    self._open[i] = [bucket, row.copy(), row.copy(), filled.copy(), count.copy()]
+                else:
+                    current[1] = np.fmin(current[1], row)
+                    current[2] = np.fmax(current[2], row)
+                    current[3] += filled
+                    current[4] += count
+
+    def _select(self, tier_index, since, until):
+        """Chronological (times, min, max, sum, count) of a tier within [since, until]."""
+        tier = self.tiers[tier_index]
+        order = tier.order()
+        times = tier.times[order]
+        # Buckets are stamped with their start; keep those that overlap [since, until]
+        if since is not None:
+            since = since - tier.step if tier.step else since
+            start = np.searchsorted(times, since, side='right' if tier.step else 'left')
+        else:
+            start = 0
+        stop = np.searchsorted(times, until, side='right') if until is not None else len(times)
+        rows = order[start:stop]
+        columns = [tier.times[rows], tier.min[rows], tier.max[rows], tier.sum[rows], tier.count[rows]]
+
+        # Include the bucket still being filled
+        current = self._open[tier_index]
+        if current is not None and (since is None or current[0] > since) and (until is None or current[0] <= until):
+            columns = [np.concatenate([column, value[None, :] if column.ndim == 2 else [value]])
+                       for column, value in zip(columns, current)]
+        return columns
+
+    def query(self, metrics=None, since=None, until=None, step=None):
+        """Samples of metrics between since and until (epoch seconds).
+
+        Uses the finest tier whose retention reaches back to since and, when
+        step is larger than that tier's resolution, merges its buckets into
+        step-second buckets. Returns {"tier", "step", "timestamps",
+        "metrics": {name: {"min", "avg", "max"}}} with NumPy arrays.
+        """
+        metrics = list(metrics or self.metrics)
+        unknown = [name for name in metrics if name not in self._index]
+        if unknown:
+            raise ValueError(f"Unknown metrics: {', '.join(unknown)}")
+        columns_index = [self._index[name] for name in metrics]
+
+        with self._lock:
+            # A tier that has never wrapped still holds everything recorded so far
+            chosen = len(self.tiers) - 1
+            for i, tier in enumerate(self.tiers):
+                oldest = tier.oldest()
+                if since is None or tier.size < tier.capacity or oldest <= since:
+                    chosen = i
+                    break
+            times, minimum, maximum, total, count = self._select(chosen, since, until)
+
+        tier = self.tiers[chosen]
+        minimum = minimum[:, columns_index]
+        maximum = maximum[:, columns_index]
+        total = total[:, columns_index]
+        count = count[:, columns_index]
+
+        resolution = tier.step
+        if step and step > tier.step and len(times):
+            # Merge consecutive buckets that fall into the same step-wide window
+            buckets = times // step * step
+            starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+            times = buckets[starts]
+            minimum = np.fmin.reduceat(minimum, starts, axis=0)
+            maximum = np.fmax.reduceat(maximum, starts, axis=0)
+            total = np.add.reduceat(total, starts, axis=0)
+            count = np.add.reduceat(count, starts, axis=0)
+            resolution = step
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            average = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+
+        return {
+            "tier": tier.name,
+            "step": resolution,
+            "timestamps": times,
+            "metrics": {
+                name: {"min": minimum[:, i], "avg": average[:, i], "max": maximum[:, i]}
+                for i, name in enumerate(metrics)
+            }
+        }
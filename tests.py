@@ -1,14 +1,65 @@
 import sys
 import unittest
-from PyQt5.QtWidgets import QApplication
+from PyQt5.QtWidgets import QApplication, QTabWidget
 from ai_assistant.modules.visual_detection import VisualDetectionWidget
 from ai_assistant.modules.audio_detection import AudioDetectionWidget
-from ai_assistant.modules.device_monitoring import DeviceMonitoringWidget
+from ai_assistant.modules.device_monitoring import (DeviceMonitoringWidget, ProcessMonitorWidget,
+                                                    ResourceMonitorWidget, get_collector)
 from ai_assistant.modules.internet_search import InternetSearchWidget
 from ai_assistant.modules.osint_tools import OSINTWidget
+import base64
+import http.server
+import io
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import cv2
+import dns.message
+import numpy as np
+import dns.rrset
+from ai_assistant import geoip, http_client, osint
+from ai_assistant import face_pool as face_pool_module
+from ai_assistant import main as api
+from ai_assistant.face_pool import FaceDetectionPool, PoolBusy
+from ai_assistant.cache import LRUCache, TTLCache, content_key
+from ai_assistant import device
+from ai_assistant.device import DeviceSampler
+from ai_assistant import history
+from ai_assistant.history import HistoryStore
+from ai_assistant import instrumentation
+from ai_assistant.lazy import startup_report
+from ai_assistant import audio
+from ai_assistant.audio import AudioRingBuffer, SoundAnalyzer, levels
+from ai_assistant.jobs import JobManager, QueueFull
+from ai_assistant import metrics
+from ai_assistant.processes import ProcessTable
+from ai_assistant.timeseries import TimeSeriesStore
 
 app = QApplication(sys.argv)
 
+_history_dir = None
+
+
+def setUpModule():
+    # Widgets share history.get_store(); keep it out of the real home directory
+    global _history_dir
+    _history_dir = tempfile.TemporaryDirectory()
+    history._store = HistoryStore(os.path.join(_history_dir.name, 'history.db'))
+
+
+def tearDownModule():
+    store, history._store = history._store, None
+    if store is not None:
+        store.close()
+    _history_dir.cleanup()
+
 class TestModules(unittest.TestCase):
     def setUp(self):
         self.modules = {
@@ -49,5 +100,1315 @@ class TestModules(unittest.TestCase):
         self.assertIsNotNone(widget.scan_button)
         self.assertIsNotNone(widget.results_display)
 
+class TestResultCache(unittest.TestCase):
+    def test_content_key(self):
+        self.assertEqual(content_key(b'abc', 0.5, '.jpg'), content_key(b'abc', 0.5, '.jpg'))
+        self.assertNotEqual(content_key(b'abc', 0.5, '.jpg'), content_key(b'abc', 0.5, '.png'))
+        self.assertNotEqual(content_key(b'abc', 0.5), content_key(b'abd', 0.5))
+
+    def test_lru_eviction_by_bytes(self):
+        cache = LRUCache(max_bytes=100)
+        cache.put('a', 1, 40)
+        cache.put('b', 2, 40)
+        self.assertEqual(cache.get('a'), 1)  # 'b' is now least recently used
+        cache.put('c', 3, 40)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+        stats = cache.stats()
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(stats['bytes'], 80)
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['evictions'], 1)
+
+    def test_oversized_value_not_cached(self):
+        cache = LRUCache(max_bytes=10)
+        cache.put('a', 1, 11)
+        self.assertIsNone(cache.get('a'))
+
+    def test_oversized_value_replaces_old_one(self):
+        cache = LRUCache(max_bytes=10)
+        cache.put('a', 1, 6)
+        cache.put('a', 2, 11)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['bytes'], 0)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+class FakeFaceDetector:
+    # Stands in for the MediaPipe graph: one face covering the centre of any frame, fails on black ones
+    def process(self, image_rgb):
+        if not image_rgb.any():
+            raise RuntimeError("detector failed")
+        box = SimpleNamespace(xmin=0.25, ymin=0.25, width=0.5, height=0.5)
+        detection = SimpleNamespace(score=[0.9], location_data=SimpleNamespace(relative_bounding_box=box))
+        return SimpleNamespace(detections=[detection])
+
+def sample_frame(width=320, height=240):
+    x = np.linspace(0, 255, width, dtype=np.uint8)
+    y = np.linspace(0, 255, height, dtype=np.uint8)
+    return np.dstack([np.tile(x, (height, 1)), np.tile(y[:, None], (1, width)),
+                      np.full((height, width), 128, np.uint8)])
+
+def encoded_frame(extension='.jpg', params=(), **size):
+    return cv2.imencode(extension, sample_frame(**size), list(params))[1].tobytes()
+
+class VisualDetectionTestCase(unittest.TestCase):
+    """Runs the Flask views against an in-process pool with a fake detector."""
+
+    def setUp(self):
+        self.saved_pool = api.face_pool
+        self.saved_detector = face_pool_module._detector
+        api.face_pool = FaceDetectionPool(processes=0, queue_depth=4)
+        face_pool_module._detector = FakeFaceDetector()
+        api.result_cache.clear()
+        self.client = api.app.test_client()
+        self.jpeg = encoded_frame()
+
+    def tearDown(self):
+        api.face_pool = self.saved_pool
+        face_pool_module._detector = self.saved_detector
+        api.result_cache.clear()
+
+    def assertOneFace(self, detections):
+        self.assertEqual(len(detections), 1)
+        self.assertAlmostEqual(detections[0]["confidence"], 0.9)
+        self.assertEqual(detections[0]["bbox"], {"xmin": 0.25, "ymin": 0.25, "width": 0.5, "height": 0.5})
+
+class TestVisualDetectionUploads(VisualDetectionTestCase):
+    def test_raw_body(self):
+        response = self.client.post('/visual_detection?response=detections', data=self.jpeg,
+                                    content_type='image/jpeg')
+        self.assertOneFace(response.get_json()["detections"])
+
+        response = self.client.post('/visual_detection?response=detections', data=self.jpeg,
+                                    content_type='application/octet-stream')
+        self.assertOneFace(response.get_json()["detections"])
+
+    def test_multipart(self):
+        response = self.client.post('/visual_detection?response=detections',
+                                    data={"image": (io.BytesIO(self.jpeg), 'frame.jpg')},
+                                    content_type='multipart/form-data')
+        self.assertOneFace(response.get_json()["detections"])
+
+    def test_base64_json(self):
+        encoded = base64.b64encode(self.jpeg).decode('ascii')
+        for image in (encoded, 'data:image/jpeg;base64,' + encoded):
+            response = self.client.post('/visual_detection', json={"image": image, "response": "detections"})
+            self.assertOneFace(response.get_json()["detections"])
+
+        response = self.client.post('/visual_detection', json={"image": "not base64!"})
+        self.assertIn("error", response.get_json())
+
+    def test_missing_and_invalid_image(self):
+        self.assertEqual(self.client.post('/visual_detection', json={}).get_json(),
+                         {"error": "No image data provided"})
+        response = self.client.post('/visual_detection', data=b'not an image', content_type='image/jpeg')
+        self.assertEqual(response.get_json(), {"error": "Invalid image data"})
+
+    def test_upload_size_limit(self):
+        saved = api.app.config['MAX_CONTENT_LENGTH']
+        api.app.config['MAX_CONTENT_LENGTH'] = len(self.jpeg) - 1
+        try:
+            response = self.client.post('/visual_detection', data=self.jpeg, content_type='image/jpeg')
+        finally:
+            api.app.config['MAX_CONTENT_LENGTH'] = saved
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("byte limit", response.get_json()["error"])
+
+    def test_repeat_upload_served_from_cache(self):
+        first = self.client.post('/visual_detection', data=self.jpeg, content_type='image/jpeg').get_json()
+        hits = api.result_cache.stats()["hits"]
+        second = self.client.post('/visual_detection', data=self.jpeg, content_type='image/jpeg').get_json()
+        self.assertEqual(first, second)
+        # Detections and the encoded image both come from the cache
+        self.assertEqual(api.result_cache.stats()["hits"], hits + 2)
+
+class TestVisualDetectionBatch(VisualDetectionTestCase):
+    def test_errors_stay_with_their_image(self):
+        black = cv2.imencode('.png', np.zeros((32, 32, 3), np.uint8))[1].tobytes()
+        png = encoded_frame('.png')
+        files = [(io.BytesIO(data), f'{i}.img') for i, data in enumerate([self.jpeg, b'garbage', black, png])]
+        response = self.client.post('/visual_detection/batch', data={"images": files},
+                                    content_type='multipart/form-data')
+        results = response.get_json()["results"]
+
+        self.assertEqual([result["index"] for result in results], [0, 1, 2, 3])
+        self.assertOneFace(results[0]["detections"])
+        self.assertEqual(results[1], {"index": 1, "error": "Invalid image data"})
+        self.assertEqual(results[2], {"index": 2, "error": "detector failed"})
+        self.assertOneFace(results[3]["detections"])
+
+    def test_json_batch_mixes_cached_and_new(self):
+        png = encoded_frame('.png')
+        # Cache the second image's detections first
+        self.client.post('/visual_detection?response=detections', data=png, content_type='image/png')
+        images = [base64.b64encode(self.jpeg).decode('ascii'), base64.b64encode(png).decode('ascii'), '%%%']
+        results = self.client.post('/visual_detection/batch', json={"images": images}).get_json()["results"]
+
+        self.assertEqual([result["index"] for result in results], [0, 1, 2])
+        self.assertTrue(results[0]["success"] and results[1]["success"])
+        self.assertOneFace(results[1]["detections"])
+        self.assertIn("error", results[2])
+
+    def test_batch_limits(self):
+        self.assertEqual(self.client.post('/visual_detection/batch', json={"images": []}).get_json(),
+                         {"error": "No images provided"})
+        images = [base64.b64encode(self.jpeg).decode('ascii')] * (api.MAX_BATCH_IMAGES + 1)
+        response = self.client.post('/visual_detection/batch', json={"images": images})
+        self.assertIn("image limit", response.get_json()["error"])
+
+class TestVisualDetectionModes(VisualDetectionTestCase):
+    def post(self, query='', **kwargs):
+        return self.client.post('/visual_detection' + query, data=self.jpeg, content_type='image/jpeg', **kwargs)
+
+    def decode(self, data):
+        return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+    def test_json_mode(self):
+        body = self.post().get_json()
+        self.assertEqual(body["image_format"], "jpeg")
+        self.assertOneFace(body["detections"])
+        self.assertEqual(self.decode(base64.b64decode(body["processed_image"])).shape, (240, 320, 3))
+
+    def test_image_mode(self):
+        response = self.post('?response=image')
+        self.assertEqual(response.mimetype, 'image/jpeg')
+        self.assertOneFace(json.loads(response.headers['X-Detections']))
+        self.assertEqual(self.decode(response.data).shape, (240, 320, 3))
+
+    def test_detections_mode(self):
+        body = self.post('?response=detections').get_json()
+        self.assertEqual(set(body), {"success", "detections"})
+        self.assertOneFace(body["detections"])
+
+    def test_formats(self):
+        magic = {'jpeg': b'\xff\xd8', 'jpg': b'\xff\xd8', 'png': b'\x89PNG', 'webp': b'RIFF'}
+        for image_format, prefix in magic.items():
+            response = self.post(f'?response=image&format={image_format}')
+            self.assertTrue(response.data.startswith(prefix), image_format)
+        self.assertEqual(self.post('?format=PNG').get_json()["image_format"], "png")
+
+    def test_quality_and_max_side(self):
+        low = self.post('?response=image&quality=10').data
+        high = self.post('?response=image&quality=95').data
+        self.assertLess(len(low), len(high))
+        self.assertEqual(self.decode(self.post('?response=image&max_side=100').data).shape, (75, 100, 3))
+
+    def test_annotate(self):
+        plain = self.decode(self.post('?response=image&format=png&annotate=false').data)
+        annotated = self.decode(self.post('?response=image&format=png').data)
+        original = self.decode(self.jpeg)
+        self.assertTrue(np.array_equal(plain, original))
+        # The box is drawn in green from (80, 60)
+        self.assertEqual(annotated[60, 80].tolist(), [0, 255, 0])
+
+    def test_invalid_values(self):
+        invalid = {
+            'response=xml': "Unknown response mode: xml",
+            'format=gif': "Unsupported output format: gif",
+            'quality=0': "Quality must be between 1 and 100",
+            'quality=101': "Quality must be between 1 and 100",
+            'quality=high': None,
+            'max_side=-1': "max_side must not be negative",
+            'max_side=big': None
+        }
+        for query, message in invalid.items():
+            body = self.post('?' + query).get_json()
+            self.assertIn("error", body, query)
+            if message:
+                self.assertEqual(body["error"], message)
+
+class TestFaceDetectionPool(unittest.TestCase):
+    def setUp(self):
+        self.saved_detector = face_pool_module._detector
+
+    def tearDown(self):
+        face_pool_module._detector = self.saved_detector
+
+    def shared_blocks(self):
+        return {name for name in os.listdir('/dev/shm') if name.startswith('psm_')} if os.path.isdir('/dev/shm') else set()
+
+    def test_inline_pool(self):
+        face_pool_module._detector = FakeFaceDetector()
+        pool = FaceDetectionPool(processes=0, queue_depth=1)
+        # More calls than slots: each call gives its slot back
+        for _ in range(4):
+            detections = pool.detect(sample_frame())
+        self.assertEqual(detections[0]["bbox"]["width"], 0.5)
+        future = pool.submit(np.zeros((16, 16, 3), np.uint8))
+        with self.assertRaises(RuntimeError):
+            future.result()
+        self.assertEqual(pool._slots._value, 2)
+        pool.close()
+
+    def test_pool_busy(self):
+        pool = FaceDetectionPool(processes=0, queue_depth=0)
+        pool._slots.acquire()
+        try:
+            with self.assertRaises(PoolBusy):
+                pool.submit(sample_frame())
+
+            saved, api.face_pool = api.face_pool, pool
+            try:
+                response = api.app.test_client().post('/visual_detection', data=encoded_frame(),
+                                                      content_type='image/jpeg')
+            finally:
+                api.face_pool = saved
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.get_json(), {"error": "Face detection queue is full"})
+        finally:
+            pool._slots.release()
+
+    def test_worker_process_shared_memory(self):
+        before = self.shared_blocks()
+        instrumentation.reset()
+        pool = FaceDetectionPool(processes=1, queue_depth=2)
+        try:
+            futures = [pool.submit(sample_frame()) for _ in range(3)]
+            self.assertEqual([future.result(timeout=120) for future in futures], [[], [], []])
+            self.assertEqual(instrumentation.stats()["stages"]["vision.mediapipe_process"]["count"], 3)
+        finally:
+            executor = pool._executor
+            workers = list(executor._processes.values()) if executor is not None else []
+            pool.close()
+
+        # Every frame's block was unlinked, the slots are free and the worker is gone
+        self.assertEqual(self.shared_blocks() - before, set())
+        self.assertEqual(pool._slots._value, 3)
+        self.assertIsNone(pool._executor)
+        self.assertTrue(workers)
+        self.assertFalse(any(worker.is_alive() for worker in workers))
+
+    def test_idle_worker_killed(self):
+        pool = FaceDetectionPool(processes=1, queue_depth=1)
+        try:
+            self.assertEqual(pool.detect(sample_frame(), timeout=120), [])
+            executor = pool._executor
+            for worker in list(executor._processes.values()):
+                worker.kill()
+            deadline = time.monotonic() + 10
+            while not executor._broken and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertTrue(executor._broken)
+            self.assertEqual(pool.detect(sample_frame(), timeout=120), [])
+            self.assertIsNot(pool._executor, executor)
+        finally:
+            pool.close()
+        self.assertEqual(pool._slots._value, 2)
+
+class TestImageDecoding(unittest.TestCase):
+    def test_probe_png(self):
+        png = encoded_frame('.png')
+        self.assertEqual(api.probe_image_size(png), (320, 240))
+        self.assertIsNone(api.probe_image_size(png[:20]))
+
+    def test_probe_jpeg(self):
+        baseline = encoded_frame()
+        progressive = encoded_frame(params=(cv2.IMWRITE_JPEG_PROGRESSIVE, 1))
+        self.assertIn(b'\xff\xc0', baseline)
+        self.assertIn(b'\xff\xc2', progressive)
+        self.assertEqual(api.probe_image_size(baseline), (320, 240))
+        self.assertEqual(api.probe_image_size(progressive), (320, 240))
+
+        # Cut off before the start-of-frame segment
+        sof = baseline.index(b'\xff\xc0')
+        self.assertIsNone(api.probe_image_size(baseline[:sof + 4]))
+
+    def test_probe_garbage(self):
+        for data in (b'', b'garbage', b'\xff\xd8' + b'\x00' * 64, b'\xff\xd8\xff\xe0\xff\xff' + b'\x00' * 16):
+            self.assertIsNone(api.probe_image_size(data), data)
+
+    def test_reduced_decode_choice(self):
+        jpeg = encoded_frame(width=2000, height=1600)
+        self.assertEqual(api.decode_flags(jpeg), cv2.IMREAD_COLOR)
+        self.assertEqual(api.decode_flags(jpeg, 3000), cv2.IMREAD_COLOR)
+        self.assertEqual(api.decode_flags(jpeg, 1000), cv2.IMREAD_REDUCED_COLOR_2)
+        self.assertEqual(api.decode_flags(jpeg, 500), cv2.IMREAD_REDUCED_COLOR_4)
+        self.assertEqual(api.decode_flags(jpeg, 250), cv2.IMREAD_REDUCED_COLOR_8)
+        # Unknown size: full decode, shrunk afterwards
+        self.assertEqual(api.decode_flags(b'garbage', 500), cv2.IMREAD_COLOR)
+
+    def test_decode_image(self):
+        jpeg = encoded_frame(width=2000, height=1600)
+        self.assertEqual(api.decode_image(jpeg).shape, (1600, 2000, 3))
+        self.assertEqual(api.decode_image(jpeg, 600).shape, (480, 600, 3))
+        self.assertEqual(api.decode_image(encoded_frame('.png'), 160).shape, (120, 160, 3))
+        self.assertIsNone(api.decode_image(b'garbage', 600))
+        self.assertIsNone(api.decode_image(jpeg[:100], 600))
+
+class TestStartup(unittest.TestCase):
+    def test_import_leaves_engines_unloaded(self):
+        heavy = ['cv2', 'mediapipe', 'psutil', 'whois', 'dns', 'requests']
+        script = ("import sys, ai_assistant.main; "
+                  f"print(','.join(name for name in {heavy!r} if name in sys.modules))")
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        self.assertEqual(output.strip(), '')
+
+    def test_warm_up_rejects_unknown_engines(self):
+        with self.assertRaises(ValueError):
+            api.warm_up(['vision', 'gpu'])
+        self.assertNotIn('warm_up vision', startup_report())
+        with self.assertRaises(SystemExit):
+            api.main(['--warm-up', 'vision,gpu'])
+
+    def test_warm_up_fills_startup_report(self):
+        api.warm_up(['osint', 'device'])
+        report = startup_report()
+        for component in ('warm_up osint', 'warm_up device', 'device_sampler'):
+            self.assertIn(component, report)
+            self.assertGreaterEqual(report[component], 0)
+
+        body = api.app.test_client().get('/startup_report').get_json()
+        self.assertEqual(body["components"], startup_report())
+        self.assertGreater(body["app_import_ms"], 0)
+
+class TestTTLCache(unittest.TestCase):
+    def test_entries_expire(self):
+        cache = TTLCache(max_entries=10)
+        cache.put('short', 1, 0.05)
+        cache.put('long', 2, 60)
+        self.assertEqual(cache.get('short'), 1)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('short'))
+        self.assertEqual(cache.get('long'), 2)
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_bounded_size(self):
+        cache = TTLCache(max_entries=2)
+        for key in ('a', 'b', 'c'):
+            cache.put(key, key, 60)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('c'), 'c')
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_zero_ttl_not_stored(self):
+        cache = TTLCache(max_entries=2)
+        cache.put('a', 1, 0)
+        self.assertIsNone(cache.get('a'))
+
+class TestPortScan(unittest.TestCase):
+    def setUp(self):
+        self.listeners = []
+        for _ in range(2):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.bind(('127.0.0.1', 0))
+            sock.listen()
+            self.listeners.append(sock)
+        self.open_ports = [sock.getsockname()[1] for sock in self.listeners]
+
+        # Bind and release a port so nothing is listening on it
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(('127.0.0.1', 0))
+        self.closed_port = sock.getsockname()[1]
+        sock.close()
+
+    def tearDown(self):
+        for sock in self.listeners:
+            sock.close()
+
+    def test_parse_ports(self):
+        self.assertEqual(osint.parse_ports('80, 22,8000-8002,80'), [22, 80, 8000, 8001, 8002])
+        with self.assertRaises(ValueError):
+            osint.parse_ports('0-10')
+
+    def test_scan_local_listeners(self):
+        progress = []
+        ports = self.open_ports + [self.closed_port]
+        results = osint.scan_ports(
+            ['127.0.0.1', 'localhost'], ports, concurrency=4, timeout=0.5,
+            on_result=lambda host, port, status, done, total: progress.append((done, total)))
+
+        for host in ('127.0.0.1', 'localhost'):
+            for port in self.open_ports:
+                self.assertEqual(results[host][port], 'Open')
+            self.assertEqual(results[host][self.closed_port], 'Closed')
+        self.assertEqual(len(progress), 6)
+        self.assertEqual(progress[-1], (6, 6))
+
+class StubDNSHandler(socketserver.BaseRequestHandler):
+    # Canned answers for example.test; every query is delayed to expose serial lookups
+    answers = {
+        'A': ['192.0.2.1'],
+        'AAAA': ['2001:db8::1'],
+        'MX': ['10 mail.example.test.'],
+        'NS': ['ns1.example.test.'],
+        'TXT': ['"v=spf1 -all"']
+    }
+    delay = 0.3
+
+    def handle(self):
+        data, sock = self.request
+        query = dns.message.from_wire(data)
+        question = query.question[0]
+        response = dns.message.make_response(query)
+        record_type = dns.rdatatype.to_text(question.rdtype)
+        if record_type in self.answers:
+            response.answer.append(dns.rrset.from_text_list(
+                question.name, 300, 'IN', record_type, self.answers[record_type]))
+        time.sleep(self.delay)
+        sock.sendto(response.to_wire(), self.client_address)
+
+class TestDNSRecords(unittest.TestCase):
+    def setUp(self):
+        self.server = socketserver.ThreadingUDPServer(('127.0.0.1', 0), StubDNSHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        osint.configure_resolver(['127.0.0.1'], port=self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        osint.dns_cache.clear()
+        osint._resolver = None
+
+    def test_parallel_resolution(self):
+        progress = []
+        start = time.perf_counter()
+        records = osint.resolve_records('example.test', timeout=2,
+                                        on_result=lambda record_type, done, total: progress.append(done))
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(list(records), osint.SCAN_RECORD_TYPES)
+        self.assertEqual(records['A'], ['192.0.2.1'])
+        self.assertEqual(records['MX'], ['10 mail.example.test.'])
+        self.assertEqual(records['TXT'], ['"v=spf1 -all"'])
+        self.assertEqual(progress, [1, 2, 3, 4, 5])
+        # Five queries at 0.3s each finish in about one round trip, not five
+        self.assertLess(elapsed, 1.0)
+
+    def test_missing_types_and_cache(self):
+        records = osint.resolve_records('example.test', ['A', 'CAA'], timeout=2)
+        self.assertTrue(records['CAA'][0].startswith('Error:'))
+
+        start = time.perf_counter()
+        self.assertEqual(osint.resolve_records('example.test', ['A'], timeout=2)['A'], ['192.0.2.1'])
+        self.assertLess(time.perf_counter() - start, 0.1)
+
+    def test_ip_through_shared_resolver(self):
+        self.assertEqual(osint.resolve_ip('example.test'), '192.0.2.1')
+        self.assertIsNotNone(osint.dns_cache.get(('example.test', 'A')))
+
+class TestOSINTAnalyze(unittest.TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.hanging = set()
+        self.saved = {name: getattr(osint, name) for name in ('whois_info', 'dns_records', 'http_headers', 'ip_info')}
+        self.saved_timeouts = dict(osint.STAGE_TIMEOUTS)
+        osint.whois_info = lambda domain: self.stage('whois', {"registrar": "Example"})
+        osint.dns_records = lambda domain, record_type: self.stage('dns', ['192.0.2.1'])
+        osint.http_headers = lambda url: self.stage('headers', {"Server": "stub"})
+        osint.ip_info = lambda domain: self.stage('ip_info', {"ip": "192.0.2.1"})
+        osint.STAGE_TIMEOUTS.update(whois=0.2, headers=0.2)
+
+    def tearDown(self):
+        self.release.set()
+        for name, func in self.saved.items():
+            setattr(osint, name, func)
+        osint.STAGE_TIMEOUTS.update(self.saved_timeouts)
+
+    def stage(self, kind, value):
+        if kind in self.hanging:
+            self.release.wait(10)
+        return value
+
+    def test_hanging_stage_partial_result(self):
+        self.hanging.add('headers')
+        start = time.perf_counter()
+        result = osint.analyze('example.test', deadline=2)
+        self.assertLess(time.perf_counter() - start, 1.0)
+
+        self.assertEqual(result["stages"]["headers"]["status"], "timeout")
+        self.assertTrue(result["results"]["headers"]["error"].startswith("Failed to get headers"))
+        for name in ('whois', 'dns_A', 'dns_MX', 'dns_NS', 'ip_info'):
+            self.assertEqual(result["stages"][name]["status"], "ok", name)
+        self.assertEqual(result["results"]["dns_records"]["A"], ['192.0.2.1'])
+        self.assertEqual(result["results"]["domain_info"], {"registrar": "Example"})
+
+    def test_hung_whois_does_not_starve_other_stages(self):
+        self.hanging.add('whois')
+        # More hung lookups than there are WHOIS threads
+        for _ in range(osint.STAGE_WORKERS['whois'] + 2):
+            result = osint.analyze('example.test', deadline=0.5)
+        self.assertEqual(result["stages"]["whois"]["status"], "timeout")
+        for name in ('dns_A', 'dns_MX', 'dns_NS', 'headers', 'ip_info'):
+            self.assertEqual(result["stages"][name]["status"], "ok", name)
+
+    def test_whois_timeout_passed_through(self):
+        calls = []
+
+        class StubWhois:
+            @staticmethod
+            def whois(domain, timeout=None):
+                calls.append((domain, timeout))
+                return {"domain": domain}
+
+        saved, osint.whois = osint.whois, StubWhois
+        try:
+            osint.whois_cache.clear()
+            osint.lookup_whois('example.test')
+        finally:
+            osint.whois = saved
+            osint.whois_cache.clear()
+        self.assertEqual(calls, [('example.test', osint.STAGE_TIMEOUTS['whois'])])
+
+    def test_empty_whois_cached_briefly(self):
+        answers = {'empty.test': {"domain_name": None, "registrar": None, "creation_date": None},
+                   'example.test': {"registrar": "Example", "creation_date": None}}
+        calls = []
+
+        class StubWhois:
+            @staticmethod
+            def whois(domain, timeout=None):
+                calls.append(domain)
+                return answers[domain]
+
+        saved = osint.whois, osint.NEGATIVE_TTL
+        osint.whois, osint.NEGATIVE_TTL = StubWhois, 0
+        try:
+            osint.whois_cache.clear()
+            for _ in range(2):
+                osint.lookup_whois('empty.test')
+                osint.lookup_whois('example.test')
+        finally:
+            osint.whois, osint.NEGATIVE_TTL = saved
+            osint.whois_cache.clear()
+        self.assertEqual(calls.count('empty.test'), 2)
+        self.assertEqual(calls.count('example.test'), 1)
+
+    def test_resolve_ip_literal(self):
+        self.assertEqual(osint.resolve_ip('192.0.2.7'), '192.0.2.7')
+
+    def test_stage_clock_starts_when_running(self):
+        busy = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(busy.shutdown)
+        busy.submit(time.sleep, 0.4)
+        stage = osint._Stage('headers', lambda: 'done', ())
+        future = busy.submit(stage.run)
+        # Queued for twice the 0.2s stage timeout, then runs instantly
+        value, error, elapsed = stage.result(future, time.perf_counter() + 2)
+        self.assertEqual(value, 'done')
+        self.assertIsNone(error)
+
+class TestOSINTBulk(unittest.TestCase):
+    def setUp(self):
+        self.saved_analyze = osint.analyze
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        osint.analyze = self.fake_analyze
+
+    def tearDown(self):
+        osint.analyze = self.saved_analyze
+
+    def fake_analyze(self, target, deadline=None):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.05)
+        with self.lock:
+            self.in_flight -= 1
+        return {"target": target, "results": {}}
+
+    def test_dedupe_and_invalid(self):
+        targets = ['example.test', 'EXAMPLE.test', 'https://example.test/path', '', 'http://',
+                   'other.test', 'user@other.test', 'third.test']
+        results = list(osint.analyze_many(targets))
+        self.assertEqual(results[-1], {"summary": {"submitted": 3, "duplicates": 3, "invalid": 1}})
+        self.assertIn({"target": 'http://', "error": "Invalid domain"}, results)
+        analyzed = sorted(result["target"] for result in results if result.get("success"))
+        self.assertEqual(analyzed, ['example.test', 'other.test', 'third.test'])
+
+    def test_bounded_concurrency(self):
+        targets = (f"host{i}.test" for i in range(20))
+        results = list(osint.analyze_many(targets, concurrency=3))
+        self.assertEqual(len(results), 21)
+        self.assertEqual(self.max_in_flight, 3)
+
+    def test_ndjson_stream(self):
+        client = api.app.test_client()
+        response = client.post('/osint/bulk', json={"targets": ['a.test', 'b.test', 'a.test']})
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(sorted(line["target"] for line in lines[:-1]), ['a.test', 'b.test'])
+        self.assertEqual(lines[-1]["summary"]["duplicates"], 1)
+
+        response = client.post('/osint/bulk', data='c.test\n\nd.test\n', content_type='text/plain')
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual(json.loads(lines[-1])["summary"]["submitted"], 2)
+
+    def test_invalid_concurrency_rejected(self):
+        client = api.app.test_client()
+        for concurrency in ('abc', '0', '-2'):
+            response = client.post(f'/osint/bulk?concurrency={concurrency}', json={"targets": ['a.test']})
+            self.assertEqual(response.status_code, 400, concurrency)
+            self.assertIn("concurrency", response.get_json()["error"])
+        response = client.post('/osint/bulk?concurrency=2', json={"targets": ['a.test']})
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+
+    def test_invalid_deadline_rejected(self):
+        client = api.app.test_client()
+        for deadline in (-5, 0, 'soon'):
+            response = client.post('/osint', json={"target": 'a.test', "deadline": deadline})
+            self.assertEqual(response.status_code, 400, deadline)
+            response = client.post('/osint/bulk', json={"targets": ['a.test'], "deadline": deadline})
+            self.assertEqual(response.status_code, 400, deadline)
+            self.assertIn("deadline", response.get_json()["error"])
+        self.assertEqual(osint.deadline_option(None), osint.DEADLINE)
+        self.assertEqual(osint.deadline_option(osint.DEADLINE * 10), osint.DEADLINE)
+
+class StubHTTPHandler(http.server.BaseHTTPRequestHandler):
+    # /flaky fails with 503 `failures` times, /slow answers after half a second
+    protocol_version = 'HTTP/1.1'
+    requests = []
+    client_ports = []
+    failures = 0
+
+    def do_GET(self):
+        StubHTTPHandler.requests.append(self.path)
+        StubHTTPHandler.client_ports.append(self.client_address[1])
+        if self.path == '/slow':
+            time.sleep(0.5)
+        if self.path == '/flaky' and StubHTTPHandler.failures:
+            StubHTTPHandler.failures -= 1
+            self.send_response(503)
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+class TestHTTPClient(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StubHTTPHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        StubHTTPHandler.requests = []
+        StubHTTPHandler.client_ports = []
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_retry_on_5xx(self):
+        StubHTTPHandler.failures = 1
+        response = http_client.get(self.base + '/flaky')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(StubHTTPHandler.requests, ['/flaky', '/flaky'])
+
+    def test_timeout(self):
+        start = time.perf_counter()
+        with self.assertRaises(http_client.requests.exceptions.RequestException):
+            http_client.get(self.base + '/slow', timeout=0.2)
+        # Read timeouts are retried, but each attempt is cut off at the timeout
+        self.assertLess(time.perf_counter() - start, 0.2 * (http_client.RETRIES + 1) + 1)
+
+    def test_unreachable_host_fails_fast(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(('127.0.0.1', 0))
+        closed_port = sock.getsockname()[1]
+        sock.close()
+        start = time.perf_counter()
+        with self.assertRaises(http_client.requests.exceptions.ConnectionError):
+            http_client.get(f"http://127.0.0.1:{closed_port}/", timeout=1)
+        # No backoff sleeps between connection attempts
+        self.assertLess(time.perf_counter() - start, http_client.BACKOFF)
+
+    def test_session_per_thread(self):
+        main_session = http_client.session()
+        self.assertIs(http_client.session(), main_session)
+        sessions = []
+        thread = threading.Thread(target=lambda: sessions.append(http_client.session()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(sessions[0], main_session)
+        # Both sessions draw on the same connection pool
+        self.assertIs(sessions[0].get_adapter(self.base), main_session.get_adapter(self.base))
+
+        # Keep-alive: the second request reuses the first one's connection
+        http_client.get(self.base + '/one')
+        http_client.get(self.base + '/two')
+        self.assertEqual(len(set(StubHTTPHandler.client_ports)), 1)
+
+class TestHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'history.db')
+        self.store = HistoryStore(self.path, batch_size=3)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def count_rows(self, table):
+        other = HistoryStore(self.path)
+        try:
+            return other._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        finally:
+            other.close()
+
+    def test_batched_writes(self):
+        self.store.add_scan('a.com', 'DNS Records', {'A': ['192.0.2.1']})
+        self.store.add_scan('b.com', 'Port Scan')
+        self.assertEqual(self.count_rows('scans'), 0)
+        self.store.add_scan('c.com', 'Domain Info')
+        self.assertEqual(self.count_rows('scans'), 3)
+
+    def test_queries(self):
+        self.store.add_scan('a.com', 'DNS Records', {'A': ['192.0.2.1']}, timestamp='2024-01-01 10:00:00')
+        self.store.add_scan('a.com', 'Port Scan', timestamp='2024-01-02 10:00:00')
+        self.store.add_scan('b.com', 'DNS Records', timestamp='2024-01-03 10:00:00')
+        self.store.add_search('python', 'Wikipedia', [{'title': 'Python'}])
+
+        scans = self.store.scans(target='a.com')
+        self.assertEqual([scan['type'] for scan in scans], ['Port Scan', 'DNS Records'])
+        self.assertEqual(scans[1]['results'], {'A': ['192.0.2.1']})
+        self.assertEqual(len(self.store.scans(since='2024-01-02 00:00:00')), 2)
+        self.assertEqual(len(self.store.scans(scan_type='DNS Records', until='2024-01-02 00:00:00')), 1)
+        self.assertEqual(self.store.searches(engine='Wikipedia')[0]['results'], [{'title': 'Python'}])
+
+    def test_wal_mode(self):
+        mode = self.store._conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, 'wal')
+
+class TestGeoIP(unittest.TestCase):
+    CSV = (
+        "start_ip,end_ip,country,region,city,org\n"
+        "1.0.0.0,1.0.0.255,Australia,Queensland,Brisbane,APNIC\n"
+        "8.8.8.0,8.8.8.255,United States,California,Mountain View,Google\n"
+        "10.0.0.0/8,Private\n"
+        "2001:4860::,2001:4860:ffff:ffff:ffff:ffff:ffff:ffff,United States,California,Mountain View,Google\n"
+        "2a00::/16,Europe\n"
+    )
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        csv_path = os.path.join(self.tmpdir.name, 'ranges.csv')
+        with open(csv_path, 'w') as f:
+            f.write(self.CSV)
+        self.path = os.path.join(self.tmpdir.name, 'geoip.bin')
+        self.assertEqual(geoip.build(csv_path, self.path), (3, 2, []))
+        geoip.configure(self.path)
+
+    def rebuild(self, text):
+        csv_path = os.path.join(self.tmpdir.name, 'other.csv')
+        with open(csv_path, 'w') as f:
+            f.write(text)
+        result = geoip.build(csv_path, self.path)
+        geoip.configure(self.path)
+        return result
+
+    def tearDown(self):
+        geoip.configure(None)
+        self.tmpdir.cleanup()
+
+    def test_ipv4_lookup(self):
+        self.assertEqual(geoip.lookup('8.8.8.8')['city'], 'Mountain View')
+        self.assertEqual(geoip.lookup('1.0.0.255')['org'], 'APNIC')
+        self.assertEqual(geoip.lookup('10.20.30.40')['country_name'], 'Private')
+        self.assertIsNone(geoip.lookup('1.0.1.0'))
+        self.assertIsNone(geoip.lookup('0.0.0.1'))
+
+    def test_ipv6_lookup(self):
+        self.assertEqual(geoip.lookup('2001:4860:4860::8888')['org'], 'Google')
+        self.assertEqual(geoip.lookup('2a00:1::1')['country_name'], 'Europe')
+        self.assertEqual(geoip.lookup('::ffff:8.8.8.8')['ip'], '8.8.8.8')
+        self.assertIsNone(geoip.lookup('2001:4861::1'))
+        self.assertIsNone(geoip.lookup('::1'))
+
+    def test_geolocate_prefers_local_index(self):
+        osint.geo_cache.clear()
+        self.assertEqual(osint.geolocate('8.8.8.4')['org'], 'Google')
+        self.assertEqual(osint.geo_cache.stats()['misses'], 0)
+
+    def test_malformed_rows_reported(self):
+        v4, v6, bad_rows = self.rebuild(
+            "1.0.0.0,1.0.0.255,Australia\n"
+            "not-an-ip,1.0.1.255,Nowhere\n"
+            "8.8.8.0\n"
+            "9.9.9.9,9.9.9.0,Reversed\n"
+            "8.8.8.0/24,United States\n"
+        )
+        self.assertEqual((v4, v6), (2, 0))
+        self.assertEqual([line for line, _ in bad_rows], [2, 3, 4])
+
+    def test_nested_ranges_flattened(self):
+        v4, _, _ = self.rebuild(
+            "10.0.0.0/8,Private\n"
+            "10.1.0.0/16,Lab\n"
+            "10.1.2.0/24,Rack\n"
+            "10.200.0.0,10.255.255.255,Overlap\n"
+        )
+        self.assertEqual(v4, 6)
+        self.assertEqual(geoip.lookup('10.0.0.1')['country_name'], 'Private')
+        self.assertEqual(geoip.lookup('10.1.0.1')['country_name'], 'Lab')
+        self.assertEqual(geoip.lookup('10.1.2.3')['country_name'], 'Rack')
+        self.assertEqual(geoip.lookup('10.1.3.1')['country_name'], 'Lab')
+        self.assertEqual(geoip.lookup('10.2.0.1')['country_name'], 'Private')
+        self.assertEqual(geoip.lookup('10.255.0.1')['country_name'], 'Overlap')
+        self.assertIsNone(geoip.lookup('11.0.0.1'))
+
+    def test_replace_failure_reported(self):
+        csv_path = os.path.join(self.tmpdir.name, 'other.csv')
+        with open(csv_path, 'w') as f:
+            f.write("8.8.8.0/24,Elsewhere\n")
+
+        def locked(src, dst):
+            raise PermissionError(13, "The process cannot access the file", dst)
+
+        saved, os.replace = os.replace, locked
+        try:
+            with self.assertRaises(PermissionError) as raised:
+                geoip.build(csv_path, self.path)
+            self.assertIn("stop the server", str(raised.exception))
+            with self.assertRaises(SystemExit) as exited:
+                geoip.main(['build', csv_path, '-o', self.path])
+        finally:
+            os.replace = saved
+        self.assertIn(f"Could not build {self.path}", str(exited.exception.code))
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+        self.assertEqual(geoip.lookup('8.8.8.8')['org'], 'Google')
+
+    def test_file_check_throttled(self):
+        self.assertEqual(geoip.lookup('8.8.8.8')['org'], 'Google')
+        csv_path = os.path.join(self.tmpdir.name, 'other.csv')
+        with open(csv_path, 'w') as f:
+            f.write("8.8.8.0/24,Elsewhere\n")
+        geoip.build(csv_path, self.path)
+        original = geoip.CHECK_INTERVAL
+        try:
+            geoip.CHECK_INTERVAL = 3600
+            self.assertEqual(geoip.lookup('8.8.8.8')['org'], 'Google')
+            geoip.CHECK_INTERVAL = 0
+            self.assertEqual(geoip.lookup('8.8.8.8')['country_name'], 'Elsewhere')
+        finally:
+            geoip.CHECK_INTERVAL = original
+
+class TestJobManager(unittest.TestCase):
+    def setUp(self):
+        self.manager = JobManager(workers=1, queue_depth=1)
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+
+    def blocking_scan(self, value, progress):
+        progress(50)
+        while not self.release.wait(0.01):
+            progress(50)
+        return {"value": value}
+
+    def wait_for(self, job, *statuses):
+        deadline = time.monotonic() + 5
+        while job.status not in statuses and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIn(job.status, statuses)
+
+    def test_result_and_progress(self):
+        job = self.manager.submit('test', 'a', self.blocking_scan, 1)
+        self.wait_for(job, 'running')
+        self.assertEqual(self.manager.get(job.id).progress, 50)
+        self.release.set()
+        self.wait_for(job, 'done')
+        self.assertEqual(job.to_dict()['result'], {"value": 1})
+        self.assertEqual(job.progress, 100)
+
+    def test_queue_depth_limit(self):
+        running = self.manager.submit('test', 'a', self.blocking_scan, 1)
+        queued = self.manager.submit('test', 'b', self.blocking_scan, 2)
+        with self.assertRaises(QueueFull):
+            self.manager.submit('test', 'c', self.blocking_scan, 3)
+
+        self.assertEqual(self.manager.cancel(queued.id).status, 'cancelled')
+        self.manager.cancel(running.id)
+        self.wait_for(running, 'cancelled')
+        self.assertNotIn('result', running.to_dict())
+        self.assertEqual(self.manager.stats()['counts']['cancelled'], 2)
+
+    def test_failed_job(self):
+        def failing_scan(progress):
+            raise ValueError("boom")
+
+        job = self.manager.submit('test', 'a', failing_scan)
+        self.wait_for(job, 'failed')
+        self.assertEqual(job.error, "boom")
+
+class TestScanOptions(unittest.TestCase):
+    def test_limits_clamped(self):
+        options = osint.scan_options({"ports": "20-25", "concurrency": 10 ** 9, "timeout": "600"})
+        self.assertEqual(options["ports"], [20, 21, 22, 23, 24, 25])
+        self.assertEqual(options["concurrency"], osint.PORT_SCAN_MAX_CONCURRENCY)
+        self.assertEqual(options["timeout"], osint.PORT_SCAN_MAX_TIMEOUT)
+        self.assertEqual(osint.scan_options({"ports": [443, 80, 80]})["ports"], [80, 443])
+        self.assertEqual(osint.scan_options(None), {})
+
+    def test_invalid_options_rejected(self):
+        client = api.app.test_client()
+        invalid = [{"timeout": "soon"}, {"timeout": 0}, {"concurrency": -5}, {"concurrency": "many"},
+                   {"ports": "1-65535"}, {"ports": [70000]}, {"ports": ["http"]}, ["ports"]]
+        before = len(api.job_manager.list())
+        for options in invalid:
+            response = client.post('/osint/jobs', json={"target": "127.0.0.1", "type": "port_scan",
+                                                        "options": options})
+            self.assertEqual(response.status_code, 400, options)
+            self.assertIn("error", response.get_json())
+        self.assertEqual(len(api.job_manager.list()), before)
+
+class TestDeviceSampler(unittest.TestCase):
+    def test_background_snapshots(self):
+        sampler = DeviceSampler(interval=0.05)
+        first = sampler.snapshot()
+        self.assertEqual(set(first), {"success", "timestamp", "system", "cpu", "memory", "disk", "network", "battery"})
+        self.assertIn("current", first["cpu"]["frequency"])
+
+        sampler.start()
+        try:
+            deadline = time.monotonic() + 5
+            while sampler.snapshot() is first and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertIsNot(sampler.snapshot(), first)
+        finally:
+            sampler.stop()
+
+        # Serialized once per snapshot
+        self.assertIs(sampler.snapshot_json(), sampler.snapshot_json())
+        self.assertIs(sampler.snapshot()["system"], sampler.static["system"])
+
+    def test_first_sample_spans_cpu_window(self):
+        sampler = DeviceSampler(interval=60)
+        start = time.monotonic()
+        sampler.snapshot()
+        self.assertGreaterEqual(time.monotonic() - start, device.MIN_CPU_WINDOW * 0.9)
+        # Later samples are already a window apart
+        sampler._cpu_since -= device.MIN_CPU_WINDOW
+        start = time.monotonic()
+        sampler.refresh()
+        self.assertLess(time.monotonic() - start, device.MIN_CPU_WINDOW)
+
+    def test_json_matches_latest_snapshot(self):
+        sampler = DeviceSampler(interval=60)
+        sampler.refresh()
+        sample = sampler.snapshot
+
+        def racing_snapshot():
+            stale = sample()
+            # A new sample lands between the reader's snapshot() and the serialization
+            time.sleep(0.01)
+            sampler.refresh()
+            return stale
+
+        sampler.snapshot = racing_snapshot
+        served = json.loads(sampler.snapshot_json())
+        sampler.snapshot = sample
+        self.assertEqual(served["timestamp"], sampler.snapshot()["timestamp"])
+        self.assertIs(sampler.snapshot_json(), sampler.snapshot_json())
+
+    def test_stream_deltas(self):
+        sampler = DeviceSampler()
+        dynamic = device.dynamic_fields(sampler.snapshot())
+        self.assertNotIn("system", dynamic)
+        self.assertEqual(set(dynamic["cpu"]), {"cpu_percent", "frequency"})
+
+        old = {"cpu": {"cpu_percent": 5.0, "frequency": {"current": 2000}}, "battery": {"percent": 80}, "network": {"lo": {}}}
+        new = {"cpu": {"cpu_percent": 7.5, "frequency": {"current": 2000}}, "battery": None, "network": {"lo": {}}}
+        self.assertEqual(device.diff(old, new), {"cpu": {"cpu_percent": 7.5}, "battery": None})
+        self.assertEqual(device.diff({}, new), new)
+        self.assertEqual(device.diff(new, new), {})
+
+class TestTimeSeriesStore(unittest.TestCase):
+    def setUp(self):
+        self.store = TimeSeriesStore(['cpu', 'battery'], [('raw', 0, 5), ('1m', 60, 10)])
+        self.size = self.store.nbytes()
+        for second in range(120):
+            self.store.record(float(second), {'cpu': second, 'battery': None})
+
+    def test_constant_memory(self):
+        self.assertEqual(self.store.nbytes(), self.size)
+        self.assertEqual(self.store.tiers[0].size, 5)
+
+    def test_raw_range(self):
+        result = self.store.query(['cpu'], since=116, until=119)
+        self.assertEqual(result['tier'], 'raw')
+        self.assertEqual(result['timestamps'].tolist(), [116.0, 117.0, 118.0, 119.0])
+        self.assertEqual(result['metrics']['cpu']['avg'].tolist(), [116.0, 117.0, 118.0, 119.0])
+
+        stepped = self.store.query(['cpu'], since=116, until=119, step=2)
+        self.assertEqual(stepped['timestamps'].tolist(), [116.0, 118.0])
+        self.assertEqual(stepped['metrics']['cpu']['max'].tolist(), [117.0, 119.0])
+
+    def test_downsampled_tier(self):
+        # The raw ring has wrapped, so older ranges come from the minute tier
+        result = self.store.query(since=0, until=119)
+        self.assertEqual(result['tier'], '1m')
+        self.assertEqual(result['timestamps'].tolist(), [0.0, 60.0])
+        cpu = result['metrics']['cpu']
+        self.assertEqual(cpu['min'].tolist(), [0.0, 60.0])
+        self.assertEqual(cpu['avg'].tolist(), [29.5, 89.5])
+        self.assertEqual(cpu['max'].tolist(), [59.0, 119.0])
+        self.assertTrue(all(value != value for value in result['metrics']['battery']['avg'].tolist()))
+
+    def test_unknown_metric(self):
+        with self.assertRaises(ValueError):
+            self.store.query(['gpu'])
+
+class TestProcessTable(unittest.TestCase):
+    def test_persistent_entries(self):
+        table = ProcessTable()
+        first = {entry.pid: entry for entry in table.refresh()}
+        self.assertIn(os.getpid(), first)
+
+        # Burn some CPU so the second refresh measures it against the first
+        end = time.process_time() + 0.2
+        while time.process_time() < end:
+            pass
+        second = {entry.pid: entry for entry in table.refresh()}
+        self.assertIs(second[os.getpid()], first[os.getpid()])
+        self.assertGreater(second[os.getpid()].cpu_percent, 0)
+
+        top = table.top(3)
+        self.assertLessEqual(len(top), 3)
+        self.assertEqual([entry.cpu_percent for entry in top],
+                         sorted((entry.cpu_percent for entry in top), reverse=True))
+
+    def test_pid_reuse(self):
+        table = ProcessTable()
+        table.refresh()
+        entry = table._entries[os.getpid()]
+        # Make the kept Process look like an earlier process that had this PID
+        entry.process._ident = (os.getpid(), entry.create_time - 1000)
+        refreshed = {entry.pid: entry for entry in table.refresh()}
+        self.assertIsNot(refreshed[os.getpid()], entry)
+        self.assertIsNot(refreshed[os.getpid()].process, entry.process)
+
+    def test_process_objects_kept(self):
+        table = ProcessTable()
+        table.refresh()
+        process = table._entries[os.getpid()].process
+        table.refresh()
+        self.assertIs(table._entries[os.getpid()].process, process)
+
+    def test_widget_updates_cells_in_place(self):
+        widget = ProcessMonitorWidget()
+        rows = [('1', 'init', '0.0%', '0.1%', 'sleeping'), ('2', 'python', '5.0%', '1.0%', 'running')]
+        widget.update_processes(rows)
+        item = widget.process_table.item(1, 2)
+        widget.update_processes([rows[0], ('2', 'python', '7.5%', '1.0%', 'running')])
+        self.assertIs(widget.process_table.item(1, 2), item)
+        self.assertEqual(item.text(), '7.5%')
+        widget.update_processes(rows[:1])
+        self.assertEqual(widget.process_table.rowCount(), 1)
+
+
+class TestDeviceCollector(unittest.TestCase):
+    def wait_until(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            app.processEvents()
+            time.sleep(0.01)
+        return condition()
+
+    def test_collects_only_while_visible(self):
+        collector = get_collector()
+        widget = ProcessMonitorWidget()
+        resources = ResourceMonitorWidget()
+        self.assertEqual(collector.subscribers, {'resources': 0, 'processes': 0})
+
+        widget.show()
+        self.assertTrue(widget.subscribed)
+        # Rows are collected in the collector thread and delivered through a signal
+        self.assertTrue(self.wait_until(lambda: widget.rows))
+        self.assertNotEqual(collector.thread, app.thread())
+
+        widget.hide()
+        self.assertFalse(widget.subscribed)
+        self.assertTrue(self.wait_until(lambda: not collector.timer.isActive()))
+        self.assertFalse(resources.subscribed)
+
+class TestMetrics(unittest.TestCase):
+    def test_render(self):
+        sent = metrics.counter('host_network_sent_bytes', 'Bytes sent', 'bytes')
+        sent.add(1024, '_total', interface='eth"0')
+        text = metrics.render([
+            sent,
+            metrics.gauge('host_network_up', 'Whether the interface is up', True, interface='lo'),
+            metrics.gauge('host_battery_percent', 'Battery charge', None)
+        ])
+        self.assertEqual(text, (
+            '# TYPE host_network_sent_bytes counter\n'
+            '# UNIT host_network_sent_bytes bytes\n'
+            '# HELP host_network_sent_bytes Bytes sent\n'
+            'host_network_sent_bytes_total{interface="eth\\"0"} 1024\n'
+            '# TYPE host_network_up gauge\n'
+            '# HELP host_network_up Whether the interface is up\n'
+            'host_network_up{interface="lo"} 1\n'
+            '# EOF\n'
+        ))
+
+    def test_sampler_exposition(self):
+        sampler = DeviceSampler()
+        text = sampler.metrics_text()
+        self.assertTrue(text.endswith('# EOF\n'))
+        self.assertIn('host_cpu_usage_percent{cpu="0"}', text)
+        self.assertIn('host_memory_total_bytes ', text)
+        self.assertIn('process_resident_memory_bytes ', text)
+        # Cached until the next sample
+        self.assertIs(sampler.metrics_text(), text)
+        sampler.refresh()
+        self.assertIsNot(sampler.metrics_text(), text)
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        instrumentation.reset()
+
+    def test_histogram(self):
+        histogram = instrumentation.Histogram()
+        for ms in range(1, 101):
+            histogram.observe(ms)
+        summary = histogram.summary()
+        self.assertEqual(summary['count'], 100)
+        self.assertEqual(summary['mean_ms'], 50.5)
+        self.assertEqual(summary['max_ms'], 100)
+        self.assertTrue(25 <= summary['p50_ms'] <= 50)
+        self.assertTrue(50 <= summary['p95_ms'] <= 100)
+        self.assertTrue(summary['p50_ms'] <= summary['p95_ms'] <= summary['p99_ms'] <= summary['max_ms'])
+        self.assertEqual(sum(summary['buckets'].values()), 100)
+
+    def test_quantiles_not_above_max(self):
+        for samples in ([0.06], [27], [3, 3.2, 3.1], [0.5, 700, 12000]):
+            histogram = instrumentation.Histogram()
+            for ms in samples:
+                histogram.observe(ms)
+            summary = histogram.summary()
+            self.assertTrue(summary['p50_ms'] <= summary['p95_ms'] <= summary['p99_ms'] <= summary['max_ms'],
+                            (samples, summary))
+
+    def test_request_stages(self):
+        timings = instrumentation.start_request('GET /test')
+        with instrumentation.stage('test.work'):
+            time.sleep(0.01)
+        instrumentation.finish_request(timings)
+        instrumentation.record_stage('test.work', 0.02)
+
+        self.assertEqual([name for name, _ in timings.stages], ['test.work'])
+        stats = instrumentation.stats()
+        self.assertEqual(stats['endpoints']['GET /test']['count'], 1)
+        self.assertEqual(stats['stages']['test.work']['count'], 2)
+
+    def test_slow_request_profile(self):
+        profiler = instrumentation.profiler
+        with tempfile.TemporaryDirectory() as directory:
+            profiler.directory = directory
+            profiler.configure(enabled=True, threshold_ms=20, interval_ms=1)
+            try:
+                fast = instrumentation.start_request('GET /fast')
+                instrumentation.finish_request(fast)
+                slow = instrumentation.start_request('GET /slow')
+                end = time.perf_counter() + 0.1
+                while time.perf_counter() < end:
+                    pass
+                instrumentation.finish_request(slow)
+            finally:
+                profiler.configure(enabled=False)
+
+            dump = profiler.dumps[-1]
+            self.assertEqual(dump['endpoint'], 'GET /slow')
+            self.assertGreater(dump['samples'], 0)
+            with open(dump['path']) as f:
+                self.assertIn('test_slow_request_profile', f.read())
+            self.assertFalse(any(d['endpoint'] == 'GET /fast' for d in profiler.dumps))
+
+class TestAudioMetering(unittest.TestCase):
+    def test_ring_buffer(self):
+        ring = AudioRingBuffer(8)
+        ring.write(np.arange(5, dtype=np.float32))
+        self.assertEqual(ring.latest(3).tolist(), [2, 3, 4])
+        ring.write(np.arange(5, 11, dtype=np.float32))
+        self.assertEqual(ring.latest(8).tolist(), [3, 4, 5, 6, 7, 8, 9, 10])
+        ring.write(np.arange(20, 40, dtype=np.float32))
+        out = np.zeros(8, dtype=np.float32)
+        self.assertEqual(ring.latest(100, out).tolist(), list(range(32, 40)))
+        self.assertEqual(ring.written, 31)
+
+    def test_levels(self):
+        sine = np.sin(2 * np.pi * 440 * np.arange(44100) / 44100).astype(np.float32)
+        rms, peak, dbfs = levels(sine)
+        self.assertAlmostEqual(rms, 2 ** -0.5, places=3)
+        self.assertAlmostEqual(peak, 1.0, places=3)
+        self.assertAlmostEqual(dbfs, -3.01, places=1)
+        self.assertEqual(levels(np.zeros(16, dtype=np.float32))[2], -120.0)
+
+    def test_one_update_per_tick(self):
+        widget = AudioDetectionWidget()
+        updates = []
+        widget.audio_level_update.connect(updates.append)
+        block = (0.5 * np.ones((1024, 1))).astype(np.float32)
+        for _ in range(4):
+            widget.audio_callback(block, 1024, None, None)
+        widget.process_audio()
+        widget.process_audio()
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(widget.level_state, "Status: Loud Sound Detected!")
+
+class TestSoundAnalyzer(unittest.TestCase):
+    def setUp(self):
+        self.signals = {name: signal.astype(np.float32)
+                        for name, signal in audio.synthetic_signals(44100, 2).items()}
+
+    def test_features(self):
+        extractor = audio.FeatureExtractor(44100)
+        frames = audio.frame_signal(self.signals['tone'])
+        self.assertEqual(frames.shape, (1 + (88200 - 1024) // 512, 1024))
+        features = extractor.features(frames)
+        self.assertAlmostEqual(float(np.median(features["centroid"])), 1000, delta=50)
+        self.assertLess(float(features["flatness"].max()), 0.05)
+        self.assertAlmostEqual(float(np.median(features["zcr"])), 2000 / 44100, delta=0.005)
+        self.assertTrue(np.allclose(features["bands"].sum(axis=1), 1, atol=1e-3))
+        noise = extractor.features(audio.frame_signal(self.signals['noise']))
+        self.assertGreater(float(noise["flatness"].min()), 0.3)
+        self.assertGreater(float(np.median(noise["zcr"])), 0.4)
+
+    def test_frame_labels(self):
+        extractor = audio.FeatureExtractor(44100)
+        for name, signal in self.signals.items():
+            labels = audio.classify(extractor.features(audio.frame_signal(signal)))
+            share = np.mean(labels == audio.SOUND_CLASSES.index(name))
+            self.assertGreater(share, 0.9, name)
+
+    def test_events_across_chunks(self):
+        signal = np.concatenate([self.signals['silence'], self.signals['tone'],
+                                 self.signals['silence'], self.signals['noise']])
+        analyzer = SoundAnalyzer(44100)
+        analyzer.reset(start_time=100.0)
+        events = []
+        for offset in range(0, len(signal), 2205):
+            events += analyzer.process(signal[offset:offset + 2205])
+        self.assertEqual(analyzer.current, 'noise')
+        events += analyzer.flush()
+        self.assertEqual([event["label"] for event in events], ['tone', 'noise'])
+        self.assertAlmostEqual(events[0]["offset"], 2.0, delta=0.05)
+        self.assertAlmostEqual(events[0]["duration"], 2.0, delta=0.05)
+        self.assertAlmostEqual(events[1]["timestamp"], 106.0, delta=0.05)
+
+    def test_reused_input_buffer(self):
+        tone = self.signals['tone']
+        analyzer = SoundAnalyzer(44100)
+        # Shorter than a frame, so it is all kept for the next call
+        chunk = tone[:700].copy()
+        analyzer.process(chunk)
+        # The caller refills the same buffer for its next read
+        chunk[:] = tone[700:1400]
+        self.assertTrue(np.array_equal(analyzer.pending, tone[:700]))
+        analyzer.process(chunk)
+        self.assertEqual(analyzer.frames_seen, 1)
+        self.assertTrue(np.array_equal(analyzer.pending, tone[512:1400]))
+
+    def test_faster_than_real_time(self):
+        results = audio.benchmark(seconds=2)
+        for name, result in results.items():
+            self.assertGreater(result["realtime_factor"], 5, name)
+
 if __name__ == '__main__':
     unittest.main()